@@ -0,0 +1,165 @@
+import math
+import os
+import zlib
+from collections import namedtuple
+
+from mrjob.compat import jobconf_from_env
+from mrjob.step import MRStep
+
+'''
+Planner for tree (multi-level) aggregation of mergeable partials.
+
+The one pass jobs used to send every record to one of a hard-coded 10
+random bins, reduce each bin to a partial, and merge the partials in a
+final reducer. Instead the planner picks the shape of the tree from
+the size of the input and the parallelism of the cluster:
+
+- each map task combines its records into one partial per bin, so the
+  number of partials to merge is about the number of map tasks,
+  input size / split size
+- if a single reducer can merge that many (at most --fan-in), there is
+  no intermediate level at all: one step, with the combiners doing the
+  partial aggregation
+- otherwise the first level has enough bins that each merges at most
+  fan-in partials (but no more bins than --parallelism), and levels of
+  1 / fan-in as many bins are added until the last one has at most
+  fan-in bins, which the final reducer merges
+
+Bins are assigned deterministically, by map task id (the default) or by
+a CRC-32 hash of the record, so reruns on the same input reproduce the
+same partials and results.
+
+The plan is made in the driver, where the input paths are known, and
+handed to the tasks in the steps' jobconf, so every task builds the
+same steps.
+'''
+
+PLAN_SETTING = "my.job.settings.aggregation.plan"
+
+DEFAULT_FAN_IN = 10
+DEFAULT_SPLIT_BYTES = 64 * 1024 * 1024
+
+# levels: number of bins at each intermediate reduce level, first first
+Plan = namedtuple("Plan", "fan_in levels partition")
+
+
+def plan_aggregation(input_bytes, parallelism, fan_in=DEFAULT_FAN_IN,
+                     split_bytes=DEFAULT_SPLIT_BYTES, partition="task"):
+    tasks = max(1, int(math.ceil(float(input_bytes) / split_bytes)))
+
+    levels = []
+    bins = min(parallelism, int(math.ceil(float(tasks) / fan_in)))
+
+    while tasks > fan_in and bins > 1:
+        levels.append(bins)
+        if bins <= fan_in:
+            break
+        tasks = bins
+        bins = int(math.ceil(float(bins) / fan_in))
+
+    return Plan(fan_in, levels, partition)
+
+
+# A plan as a jobconf value, and back
+def encode_plan(plan):
+    return "%d/%s/%s" % (plan.fan_in, ",".join(map(str, plan.levels)),
+                         plan.partition)
+
+def decode_plan(text):
+    fan_in, levels, partition = text.split("/")
+    return Plan(int(fan_in), [int(b) for b in levels.split(",") if b],
+                partition)
+
+
+def add_aggregation_args(job):
+    job.add_passthru_arg(
+        '--fan-in', type=int, default=DEFAULT_FAN_IN,
+        help='Most partials merged by one reducer of the aggregation tree')
+    job.add_passthru_arg(
+        '--parallelism', type=int, default=None,
+        help='Reduce tasks the cluster runs at once, the most bins of a '
+             'level (default: number of CPUs)')
+    job.add_passthru_arg(
+        '--split-bytes', type=int, default=DEFAULT_SPLIT_BYTES,
+        help='Input bytes per map task, for estimating the number of '
+             'partials')
+    job.add_passthru_arg(
+        '--partition', default='task', choices=['task', 'record'],
+        help='Assign records to bins by map task id, or by a hash of '
+             'the record')
+
+
+# Bytes of input, counting unknown (e.g. remote) paths as one split each
+def input_bytes(paths, split_bytes):
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        else:
+            total += split_bytes
+    return total
+
+
+'''
+The job's aggregation plan: read from the jobconf in a task, or made
+from the input paths and options in the driver.
+'''
+def job_plan(job):
+    text = jobconf_from_env(PLAN_SETTING)
+    if text:
+        return decode_plan(text)
+
+    o = job.options
+    parallelism = o.parallelism or os.cpu_count() or 1
+
+    return plan_aggregation(input_bytes(o.args, o.split_bytes), parallelism,
+                            o.fan_in, o.split_bytes, o.partition)
+
+
+# The first level bin of a record
+def record_bin(plan, record):
+    if not plan.levels:
+        return 0
+
+    if plan.partition == "record":
+        return zlib.crc32(str(record).encode('utf-8')) % plan.levels[0]
+
+    task = jobconf_from_env("mapreduce.task.partition")
+    return int(task or 0) % plan.levels[0]
+
+
+'''
+Steps of a tree aggregation.
+
+source holds the MRStep keyword arguments of the step producing
+(record_bin(), partial) pairs, from its mapper or (e.g. after a join)
+its reducer. merge turns an iterable of partials into one partial, and
+final(partial) yields the job's output from the merged total.
+'''
+def tree_steps(plan, source, merge, final):
+    jobconf = {PLAN_SETTING: encode_plan(plan)}
+
+    def combiner(key, values):
+        yield key, merge(values)
+
+    # Merge a bin's partials into its bin of the next level
+    def regroup(key, values):
+        yield int(key) // plan.fan_in, merge(values)
+
+    def reducer(key, values):
+        for pair in final(merge(values)):
+            yield pair
+
+    reducers = [regroup] * len(plan.levels) + [reducer]
+
+    steps = []
+    if 'reducer' in source:
+        steps.append(MRStep(jobconf=jobconf, **source))
+    else:
+        source = dict(source, combiner=combiner, reducer=reducers.pop(0))
+        steps.append(MRStep(jobconf=jobconf, **source))
+
+    for r in reducers:
+        steps.append(MRStep(combiner=combiner, reducer=r, jobconf=jobconf))
+
+    return steps
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import mrjob
+
+from countColleges import MRCollegeCount
+from electricityVariance_OnePass import MRElecVar as MRElecVarOnePass
+from electricityVariance_TwoPass_Mean import MRElecMean
+from electricityVariance_TwoPass_Variance import MRElecVar as MRElecVarTwoPass
+from instrumentation import shuffle_bytes as counted_shuffle_bytes
+from generateData import (DATASETS, FILE_NAMES, KeySampler, write_dataset,
+                          DEFAULT_KEYS)
+from parallelRunner import ParallelRunner
+from pipeline import (Node, Pipeline, q3_nodes, q4_nodes, q5_nodes, q6_nodes,
+                      extract_elec_mean, extract_state_summary)
+from summarizeStates import MRSummarize
+
+'''
+Benchmark every job across runners and input sizes.
+
+For each size, synthetic states, electricity and college files of that
+many rows are generated (see generateData.py, and its --keys, --skew,
+--coverage and --seed options) into --data-dir, and reused by later
+runs with the same settings. Then each case (a job, or a chain of jobs
+run by pipeline.py) is run on each runner in a fresh process, and its
+wall time, rows read per second (over every job of the case), bytes
+shuffled from the mappers to the reducers and the peak RSS of its
+largest process are recorded, the best of --repeat runs. The parallel
+runner counts the bytes it shuffles itself; on the inline and local
+runners they are counted by the jobs' instrumentation (see
+instrumentation.py), in one more run with --instrument, so the
+counting doesn't slow down the timed runs.
+
+The report is JSON, written to --output. Given a --baseline report,
+each result is compared with the baseline's result of the same case,
+runner and size, and the benchmark exits with status 1 if any of them
+got slower, or used more memory or shuffle, by more than --tolerance.
+
+Usage:
+python benchmark.py --sizes 100000,1000000 --runners inline,parallel
+python benchmark.py --output new.json --baseline old.json
+'''
+
+DEFAULT_SIZES = "10000,100000"
+DEFAULT_RUNNERS = "inline,local,parallel"
+
+def ignore_output(output):
+    return None
+
+def variance_onepass_nodes(data):
+    return [Node("variance", MRElecVarOnePass, [data["electricity"]],
+                 ignore_output)]
+
+def variance_twopass_nodes(data):
+    return [
+        Node("elecMean", MRElecMean, [data["electricity"]],
+             extract_elec_mean),
+        Node("variance", MRElecVarTwoPass, [data["electricity"]],
+             ignore_output, depends=["elecMean"],
+             jobconf=lambda r: {"my.job.settings.mean": r["elecMean"].mean}),
+    ]
+
+# Each case's pipeline nodes, given the paths of the generated files
+CASES = {
+    "summarize": lambda data: [
+        Node("summarize", MRSummarize, [data["states"]],
+             extract_state_summary)],
+    "variance_onepass": variance_onepass_nodes,
+    "variance_twopass": variance_twopass_nodes,
+    "regression": lambda data: q3_nodes(data["states"]),
+    "rsquared": lambda data: q4_nodes(data["electricity"], data["states"]),
+    "count": lambda data: [
+        Node("count", MRCollegeCount, [data["colleges"]], ignore_output)],
+    "sample": lambda data: q5_nodes(data["colleges"]),
+    "stratified_sample": lambda data: q6_nodes(data["colleges"]),
+}
+
+CASE_ORDER = ["summarize", "variance_onepass", "variance_twopass",
+              "regression", "rsquared", "count", "sample",
+              "stratified_sample"]
+
+# Measures that count against a result when they go up or down
+HIGHER_IS_BETTER = ["rows_per_second"]
+LOWER_IS_BETTER = ["shuffle_bytes", "peak_rss_bytes"]
+
+
+'''
+Bytes the runner shuffled to the reducers, over every step: the
+parallel runner's count, or the instrumentation counters of a job run
+with --instrument (None without).
+'''
+def shuffle_bytes(runner, instrument):
+    if isinstance(runner, ParallelRunner):
+        return sum(runner.shuffle_bytes)
+    if instrument:
+        return counted_shuffle_bytes(runner.counters())
+    return None
+
+
+'''
+A pipeline node that also records the rows it read and the bytes its
+job shuffled.
+'''
+class MeasuredNode(object):
+
+    def __init__(self, node, instrument=False):
+        self.node = node
+        self.name = node.name
+        self.depends = node.depends
+        self.instrument = instrument
+
+        self.rows = 0
+        self.shuffle_bytes = None
+
+    # Always run, never from the cache
+    def run(self, results, runner, cache=None):
+        node = self.node
+        args = node.args(results, runner)
+        if self.instrument:
+            # options go before the inputs
+            args = args[:len(args) - len(node.inputs)] + ['--instrument'] \
+                + node.inputs
+        job = node.job_class(args=args)
+
+        with node.make_runner(job, args, runner) as r:
+            r.run()
+            output = list(job.parse_output(r.cat_output()))
+            self.shuffle_bytes = shuffle_bytes(r, self.instrument)
+
+        self.rows = sum(count_rows(path) for path in node.inputs)
+
+        return output, node.extract(output)
+
+
+def count_rows(path):
+    with open(path, 'rb') as f:
+        return sum(chunk.count(b'\n')
+                   for chunk in iter(lambda: f.read(1 << 20), b''))
+
+
+# Run one case once, in this process, returning its measurements
+def run_case(case, runner, data, instrument=False):
+    nodes = [MeasuredNode(node, instrument) for node in CASES[case](data)]
+
+    start = time.time()
+    Pipeline(nodes, runner=runner).run()
+    wall = time.time() - start
+
+    rows = sum(node.rows for node in nodes)
+
+    return {
+        "wall_seconds": wall,
+        "rows": rows,
+        "rows_per_second": rows / wall if wall > 0 else None,
+        "shuffle_bytes": sum(node.shuffle_bytes for node in nodes)
+                         if all(node.shuffle_bytes is not None
+                                for node in nodes) else None,
+    }
+
+
+'''
+Peak RSS in bytes of this process or any of its finished child
+processes (e.g. the local runner's tasks, or the parallel runner's
+workers). This process's own peak comes from /proc where there is one,
+since ru_maxrss also counts the memory of the process that started it.
+'''
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    own = int(line.split()[1]) * 1024
+    except IOError:
+        pass
+
+    return max(own, children)
+
+
+# Run one case in a child process, so each case's peak RSS is its own
+def run_child(case, runner, data_dir, instrument=False):
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__),
+         '--child', case, runner, data_dir]
+        + (['--instrument'] if instrument else []))
+
+    return json.loads(output.decode('utf-8'))
+
+
+'''
+Generate (or reuse) the data files of one size, returning their paths
+by dataset.
+'''
+def prepare_data(options, rows):
+    settings = "rows=%d keys=%d skew=%g coverage=%g seed=%d" % (
+        rows, options.keys, options.skew, options.coverage, options.seed)
+
+    directory = os.path.join(options.data_dir, str(rows))
+    stamp = os.path.join(directory, "SETTINGS")
+    paths = dict((dataset, os.path.join(directory, FILE_NAMES[dataset]))
+                 for dataset in DATASETS)
+
+    if os.path.exists(stamp):
+        with open(stamp) as f:
+            if f.read() == settings:
+                return paths
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    for dataset in DATASETS:
+        write_dataset(paths[dataset], dataset, rows, options)
+
+    with open(stamp, 'w') as f:
+        f.write(settings)
+
+    return paths
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        commit = commit.decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "date": datetime.datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "mrjob": mrjob.__version__,
+        "platform": platform.platform(),
+        "cpus": multiprocessing.cpu_count(),
+    }
+
+
+def result_key(result):
+    return (result["case"], result["runner"], result["size"])
+
+'''
+Compare results with a baseline report. Returns the comparison lines
+and whether any measure regressed by more than the tolerance.
+'''
+def compare(results, baseline, tolerance):
+    old = dict((result_key(r), r) for r in baseline["results"])
+
+    lines = []
+    regressed = False
+
+    for result in results:
+        previous = old.get(result_key(result))
+        if previous is None:
+            continue
+
+        for measure in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            before, after = previous.get(measure), result.get(measure)
+            if not before or after is None:
+                continue
+
+            change = after / before - 1
+            if measure in HIGHER_IS_BETTER:
+                worse = change < -tolerance
+            else:
+                worse = change > tolerance
+
+            regressed = regressed or worse
+            lines.append("%-18s %-8s %10d %-16s %+7.1f%%%s" % (
+                result["case"], result["runner"], result["size"], measure,
+                100 * change, "  REGRESSION" if worse else ""))
+
+    return lines, regressed
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark every job")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help="Comma separated numbers of rows")
+    parser.add_argument('--runners', default=DEFAULT_RUNNERS,
+                        help="Comma separated runners (inline, local, "
+                             "parallel)")
+    parser.add_argument('--cases', default=",".join(CASE_ORDER),
+                        help="Comma separated cases to run")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Runs of each case, keeping the fastest")
+    parser.add_argument('--data-dir', default="benchmark-data",
+                        help="Directory of the generated data")
+    parser.add_argument('--output', default="benchmark.json",
+                        help="Path of the JSON report")
+    parser.add_argument('--baseline', default=None,
+                        help="JSON report to compare the results with")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Relative change counted as a regression")
+    parser.add_argument('--keys', type=int, default=DEFAULT_KEYS)
+    parser.add_argument('--skew', type=float, default=0.0)
+    parser.add_argument('--coverage', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+
+    options = parser.parse_args(argv)
+
+    # options generateData.write_dataset expects
+    options.null_rate = None
+    options.sampler = KeySampler(options.keys, options.skew)
+
+    for case in options.cases.split(","):
+        if case not in CASES:
+            parser.error("Unknown case %s" % case)
+
+    return options
+
+def main(argv):
+    if argv[:1] == ['--child']:
+        case, runner, data_dir = argv[1:4]
+        data = dict((dataset, os.path.join(data_dir, FILE_NAMES[dataset]))
+                    for dataset in DATASETS)
+        result = run_case(case, runner, data, argv[4:] == ['--instrument'])
+        result["peak_rss_bytes"] = peak_rss()
+        print(json.dumps(result))
+        return 0
+
+    options = parse_args(argv)
+    results = []
+
+    for size in [int(s) for s in options.sizes.split(",")]:
+        data = prepare_data(options, size)
+        data_dir = os.path.dirname(data["states"])
+
+        for case in options.cases.split(","):
+            for runner in options.runners.split(","):
+                runs = [run_child(case, runner, data_dir)
+                        for _ in range(options.repeat)]
+                best = min(runs, key=lambda r: r["wall_seconds"])
+
+                if best["shuffle_bytes"] is None:
+                    best["shuffle_bytes"] = run_child(
+                        case, runner, data_dir,
+                        instrument=True)["shuffle_bytes"]
+
+                result = {"case": case, "runner": runner, "size": size}
+                result.update(best)
+                results.append(result)
+
+                print("%-18s %-8s %10d %8.2fs %12.0f rows/s %12d B shuffled "
+                      "%8.1f MB RSS" % (
+                          case, runner, size, best["wall_seconds"],
+                          best["rows_per_second"], best["shuffle_bytes"],
+                          best["peak_rss_bytes"] / 1e6))
+
+    report = {
+        "environment": environment(),
+        "settings": {"keys": options.keys, "skew": options.skew,
+                     "coverage": options.coverage, "seed": options.seed,
+                     "repeat": options.repeat},
+        "results": results,
+    }
+
+    with open(options.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+
+        lines, regressed = compare(results, baseline, options.tolerance)
+
+        print("")
+        print("Compared with %s:" % options.baseline)
+        for line in lines:
+            print(line)
+
+        if regressed:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import random
+import sys
+import timeit
+
+from electricityVariance_Moments import MRElecMoments
+from stateRegression_OnePass import MRStateRegrOnePass
+from summarizeStates import MRSummarize
+
+'''
+Benchmark the per-line mapper path against the vectorized block path
+of the variance, summary and regression jobs.
+
+Builds synthetic Electricity.csv / states_clean.csv style lines in
+memory, then times one map task of each job (mapper_init, mapper and
+mapper_final, through MRJob.map_pairs) in a single process, and prints
+rows per second per core for each mode.
+
+Usage:
+python benchmarkBlocks.py [number of rows] [block size]
+'''
+
+def electricity_lines(n, rng):
+    return ["State%d,%.2f" % (i, rng.lognormvariate(2, 0.3))
+            for i in range(n)]
+
+def state_lines(n, rng):
+    return ["State%d,St.%d,S%d,%d,%d" % (i, i, i,
+                                         rng.randint(50, 600000),
+                                         rng.randint(400000, 30000000))
+            for i in range(n)]
+
+# Rows per second for one map task of job_class over lines
+def rows_per_second(job_class, args, lines, repeat=3):
+    job = job_class(args=args)
+
+    def run():
+        for _ in job.map_pairs((None, line) for line in lines):
+            pass
+
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+
+    return len(lines) / best
+
+
+def main(argv):
+    n = int(argv[0]) if len(argv) > 0 else 200000
+    block_size = argv[1] if len(argv) > 1 else "10000"
+
+    rng = random.Random(0)
+    prices = electricity_lines(n, rng)
+    states = state_lines(n, rng)
+
+    cases = [
+        ("variance", MRElecMoments, prices, []),
+        ("summary", MRSummarize, states, []),
+        ("summary (in-mapper combine)", MRSummarize, states,
+         ["--in-mapper-combine"]),
+        ("regression", MRStateRegrOnePass, states, []),
+    ]
+
+    print("%-30s %15s %15s %8s" % ("job", "line rows/s", "block rows/s",
+                                   "speedup"))
+
+    for name, job_class, lines, args in cases:
+        per_line = rows_per_second(job_class, args, lines)
+        block = rows_per_second(job_class,
+                                args + ["--block-size", block_size], lines)
+
+        print("%-30s %15.0f %15.0f %7.1fx" % (name, per_line, block,
+                                              block / per_line))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
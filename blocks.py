@@ -0,0 +1,91 @@
+import csv
+
+import numpy as np
+
+'''
+Block (vectorized) processing of input lines.
+
+In block mode a mapper buffers its raw input lines, and every
+--block-size lines parses the whole block into NumPy columns in one
+go and folds it into its partial statistics with vectorized operations
+(see Moments.from_array, Summary.add_block, CoMoments.from_arrays),
+emitting one partial per block instead of touching every row in
+Python. The combiner and reducer merge block partials exactly as they
+merge per-line partials.
+
+A BlockBuffer collects the lines; parse_block() turns a list of lines
+into one array per requested column.
+'''
+
+DEFAULT_BLOCK_SIZE = 10000
+
+
+class BlockBuffer(object):
+
+    def __init__(self, size):
+        self.size = size
+        self.lines = []
+
+    # Add a line; returns True once the block is full
+    def add(self, line):
+        self.lines.append(line)
+        return len(self.lines) >= self.size
+
+    # Hand back the buffered lines and start a new block
+    def take(self):
+        lines = self.lines
+        self.lines = []
+        return lines
+
+    def __len__(self):
+        return len(self.lines)
+
+
+'''
+Parse a block of lines into one column per requested name.
+
+Unless a line contains a quote, the block is joined and split on
+commas in one call, and each column is a strided slice of the fields.
+Integer columns without blanks come back as int64 arrays, other
+numeric columns as float64 arrays with blank fields of nullable
+columns as NaN. String columns come back as lists.
+'''
+def parse_block(schema, names, lines):
+    nFields = len(schema.columns)
+
+    # every line is checked on its own: a short line and a long one
+    # would add up to the right number of fields, and shift the columns
+    if any('"' in line for line in lines):
+        rows = list(csv.reader(lines))
+        malformed = any(len(row) != nFields for row in rows)
+        fields = [field for row in rows for field in row]
+    else:
+        malformed = any(line.count(',') != nFields - 1 for line in lines)
+        fields = ",".join(lines).split(",")
+
+    if malformed:
+        for line in lines:
+            schema.parser([])(line) # raises on the malformed line
+        raise ValueError("Malformed %s block" % schema.name)
+
+    columns = []
+    for name in names:
+        i = schema.index(name)
+        column = schema.column(name)
+        values = fields[i::nFields]
+
+        if column.type is str:
+            columns.append(values)
+            continue
+
+        if "" in values:
+            if not column.nullable:
+                raise ValueError("Blank %s in %s block" % (name, schema.name))
+            values = [v if v != "" else "nan" for v in values]
+        elif column.type is int:
+            columns.append(np.array(list(map(int, values)), dtype=np.int64))
+            continue
+
+        columns.append(np.array(list(map(float, values)), dtype=np.float64))
+
+    return columns
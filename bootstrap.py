@@ -0,0 +1,295 @@
+import numpy as np
+
+from seeds import task_seed
+
+'''
+Mergeable Poisson bootstrap accumulators, for confidence intervals
+from a single pass of the data.
+
+The bootstrap resamples the data with replacement and recomputes a
+statistic on every resample. In the Poisson bootstrap each row is
+instead given an independent Poisson(1) weight in every replicate (the
+number of times it would have been drawn), so every mapper can weight
+its own rows without knowing how many rows there are in total, and
+the weighted accumulators of the replicates merge just like the plain
+ones (Chan et al.), with weights summed in place of counts.
+
+BootstrapMoments keeps the weighted count, mean and M2 of one variable
+for each of B replicates, and BootstrapCoMoments the weighted count,
+means and co-moments of a pair, as NumPy arrays of length B side by
+side. Rows are buffered and folded in blocks: one (rows x B) matrix of
+Poisson draws and a few matrix products per block, so B = 1000
+replicates cost about as much as a scan of the data, not 1000 jobs.
+
+The percentiles of the replicates' statistics give the confidence
+interval, see interval().
+
+Accumulators travel between MapReduce steps as plain lists, see
+to_list() and from_list().
+'''
+
+DEFAULT_REPLICATES = 1000
+DEFAULT_CONFIDENCE = 0.95
+
+# Rows folded in at a time
+BLOCK_ROWS = 1024
+
+
+# Random generator of a task's weights, from the base seed and the
+# task's input split (see seeds.py)
+def task_rng(seed):
+    return np.random.default_rng(task_seed(seed))
+
+'''
+The central confidence interval [low, high] of a statistic from its
+replicates, by the percentile method. Replicates without a value (no
+rows drawn, or a zero variance) are left out.
+'''
+def interval(values, confidence=DEFAULT_CONFIDENCE):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return [None, None]
+
+    tail = 100 * (1 - confidence) / 2
+    low, high = np.percentile(values, [tail, 100 - tail])
+    return [float(low), float(high)]
+
+# Divide, giving nan where the divisor is 0
+def divide(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b > 0, a / np.where(b > 0, b, 1), np.nan)
+
+
+class BootstrapMoments(object):
+
+    def __init__(self, replicates, rng=None):
+        self.replicates = replicates
+        self.rng = rng
+
+        self.n = np.zeros(replicates)
+        self.mean = np.zeros(replicates)
+        self.M2 = np.zeros(replicates)
+
+        self.pending = []
+
+    # Add a single observation, folded in with the next block
+    def add(self, x):
+        self.pending.append(x)
+        if len(self.pending) >= BLOCK_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            x, self.pending = self.pending, []
+            self.add_array(x)
+
+    # Add an array of observations, each with its own Poisson weights
+    def add_array(self, x):
+        x = np.asarray(x, dtype=np.float64)
+
+        for start in range(0, len(x), BLOCK_ROWS):
+            block = x[start:start + BLOCK_ROWS]
+            w = self.rng.poisson(1.0, (len(block), self.replicates))
+            self.merge(self.weighted(block, w.astype(np.float64)))
+
+    # Accumulator of a block of rows weighted by w (rows x replicates)
+    @classmethod
+    def weighted(cls, x, w):
+        m = cls(w.shape[1])
+
+        # deviations from the block mean, for accuracy
+        center = x.mean()
+        d = x - center
+
+        m.n = w.sum(axis=0)
+        shift = divide(d @ w, m.n)
+        m.mean = np.where(m.n > 0, center + shift, 0.0)
+        m.M2 = np.where(m.n > 0, (d * d) @ w - m.n * shift * shift, 0.0)
+
+        return m
+
+    # Fold another accumulator into this one, replicate by replicate
+    def merge(self, other):
+        other.flush()
+
+        n = self.n + other.n
+        delta = other.mean - self.mean
+
+        self.M2 = self.M2 + other.M2 + np.nan_to_num(
+            divide(delta * delta * self.n * other.n, n))
+        self.mean = self.mean + np.nan_to_num(divide(delta * other.n, n))
+        self.n = n
+
+        return self
+
+    # Each replicate's variance, dividing by the weight total (ddof=0)
+    def variances(self):
+        return divide(self.M2, self.n)
+
+    # Confidence intervals of the mean and variance, labelled for job
+    # output
+    def intervals(self, confidence=DEFAULT_CONFIDENCE):
+        means = np.where(self.n > 0, self.mean, np.nan)
+
+        return {
+            "Mean CI": interval(means, confidence),
+            "Variance CI": interval(self.variances(), confidence),
+            "Replicates": self.replicates,
+            "Confidence": confidence,
+        }
+
+    def to_list(self):
+        self.flush()
+        return [self.replicates, self.n.tolist(), self.mean.tolist(),
+                self.M2.tolist()]
+
+    @classmethod
+    def from_list(cls, values):
+        m = cls(values[0])
+
+        m.n, m.mean, m.M2 = [np.array(v, dtype=np.float64)
+                             for v in values[1:]]
+
+        return m
+
+    # Merge an iterable of serialized accumulators into one accumulator
+    @classmethod
+    def merge_all(cls, values):
+        total = None
+
+        for v in values:
+            m = cls.from_list(v)
+            total = m if total is None else total.merge(m)
+
+        return total
+
+
+class BootstrapCoMoments(object):
+
+    def __init__(self, replicates, rng=None):
+        self.replicates = replicates
+        self.rng = rng
+
+        self.n = np.zeros(replicates)
+        self.mean_x = np.zeros(replicates)
+        self.mean_y = np.zeros(replicates)
+        self.C_xx = np.zeros(replicates)
+        self.C_xy = np.zeros(replicates)
+        self.C_yy = np.zeros(replicates)
+
+        self.pending = []
+
+    # Add a single (x, y) observation, folded in with the next block
+    def add(self, x, y):
+        self.pending.append((x, y))
+        if len(self.pending) >= BLOCK_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            rows, self.pending = self.pending, []
+            x, y = zip(*rows)
+            self.add_arrays(x, y)
+
+    # Add arrays of observations, each with its own Poisson weights
+    def add_arrays(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        for start in range(0, len(x), BLOCK_ROWS):
+            stop = start + BLOCK_ROWS
+            w = self.rng.poisson(1.0, (len(x[start:stop]), self.replicates))
+            self.merge(self.weighted(x[start:stop], y[start:stop],
+                                     w.astype(np.float64)))
+
+    # Accumulator of a block of rows weighted by w (rows x replicates)
+    @classmethod
+    def weighted(cls, x, y, w):
+        c = cls(w.shape[1])
+
+        # deviations from the block means, for accuracy
+        cx, cy = x.mean(), y.mean()
+        dx, dy = x - cx, y - cy
+
+        c.n = w.sum(axis=0)
+        sx = divide(dx @ w, c.n)
+        sy = divide(dy @ w, c.n)
+
+        empty = c.n == 0
+        c.mean_x = np.where(empty, 0.0, cx + sx)
+        c.mean_y = np.where(empty, 0.0, cy + sy)
+        c.C_xx = np.where(empty, 0.0, (dx * dx) @ w - c.n * sx * sx)
+        c.C_xy = np.where(empty, 0.0, (dx * dy) @ w - c.n * sx * sy)
+        c.C_yy = np.where(empty, 0.0, (dy * dy) @ w - c.n * sy * sy)
+
+        return c
+
+    # Fold another accumulator into this one, replicate by replicate
+    def merge(self, other):
+        other.flush()
+
+        n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        scale = np.nan_to_num(divide(self.n * other.n, n))
+
+        self.C_xx = self.C_xx + other.C_xx + dx * dx * scale
+        self.C_xy = self.C_xy + other.C_xy + dx * dy * scale
+        self.C_yy = self.C_yy + other.C_yy + dy * dy * scale
+
+        self.mean_x = self.mean_x + np.nan_to_num(divide(dx * other.n, n))
+        self.mean_y = self.mean_y + np.nan_to_num(divide(dy * other.n, n))
+        self.n = n
+
+        return self
+
+    # Each replicate's slope, intercept and R^2 (nan where undefined)
+    def slopes(self):
+        return divide(self.C_xy, self.C_xx)
+
+    def intercepts(self):
+        return self.mean_y - self.slopes() * self.mean_x
+
+    def r_squared(self):
+        ss_res = np.maximum(self.C_yy - self.C_xy * self.slopes(), 0.0)
+        return 1 - divide(ss_res, self.C_yy)
+
+    # Confidence intervals of the regression statistics, labelled for
+    # job output
+    def intervals(self, confidence=DEFAULT_CONFIDENCE):
+        labels = ["Slope CI", "Intercept CI", "R^2 CI"]
+        vals = [interval(v, confidence) for v in
+                (self.slopes(), self.intercepts(), self.r_squared())]
+
+        d = dict(zip(labels, vals))
+        d["Replicates"] = self.replicates
+        d["Confidence"] = confidence
+
+        return d
+
+    def to_list(self):
+        self.flush()
+        return [self.replicates] + [v.tolist() for v in (
+            self.n, self.mean_x, self.mean_y, self.C_xx, self.C_xy,
+            self.C_yy)]
+
+    @classmethod
+    def from_list(cls, values):
+        c = cls(values[0])
+
+        (c.n, c.mean_x, c.mean_y, c.C_xx, c.C_xy, c.C_yy) = [
+            np.array(v, dtype=np.float64) for v in values[1:]]
+
+        return c
+
+    # Merge an iterable of serialized accumulators into one accumulator
+    @classmethod
+    def merge_all(cls, values):
+        total = None
+
+        for v in values:
+            c = cls.from_list(v)
+            total = c if total is None else total.merge(c)
+
+        return total
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from fingerprint import file_fingerprint, option_files
+from parallelRunner import ParallelRunner, load_job_class
+from seeds import DELTA_SETTING
+
+'''
+Run a job incrementally, from a checkpoint of its merged accumulators.
+
+Jobs whose reducer merges mergeable partials (summarizeStates.py,
+electricityVariance_Moments.py, stateRegression_OnePass.py,
+elecRegr_OnePass.py with --states, countColleges.py) take --emit-state,
+which makes the reducer output the merged accumulators (counts,
+moments, co-moments, min / max, counts per category, sketches) instead
+of the statistics read off them.
+
+The checkpoint is a JSON file of that state, and of the bytes of each
+input it covers: a prefix of each file, with the fingerprint of the
+prefix. On the next run over the same inputs only what is new is
+read: whole new files, and the bytes appended to files already
+covered. The job is run on those with --emit-state, its state merged
+into the checkpoint's with the job's combiner, and the statistics are
+read off the merged state by the job's reducer, so the output is that
+of a run over every input, for a run over only the new rows.
+
+Each run over new bytes is numbered (its delta index), and the job is
+told the number (see seeds.py), so randomized accumulators (bootstrap
+weights, sketches) draw afresh for the new rows rather than repeating
+the draws of the rows already in the checkpoint.
+
+Merged state can't be un-merged, so the job is run on every input
+again (and the checkpoint replaced) when a covered input changed
+rather than grew, was truncated or is no longer given, when a file the
+job reads alongside its input (like --states) changed, when the job
+options changed, or with --rebuild.
+
+Usage:
+python checkpoint.py [-r inline|local|parallel] [--rebuild] CHECKPOINT \
+    JOB.py [job options] INPUT...
+python checkpoint.py prices.ckpt electricityVariance_Moments.py \
+    Electricity.csv
+'''
+
+VERSION = 1
+
+# Bytes copied at a time out of the grown part of an input
+COPY_SIZE = 1 << 20
+
+
+'''
+What the checkpoint holds about an input: how many bytes of it are
+covered, their fingerprint, and whether they end with a whole line
+(if not, appending to the file would change the covered last line).
+'''
+def covered_input(path):
+    size = os.path.getsize(path)
+
+    ends_line = True
+    if size > 0:
+        with open(path, 'rb') as f:
+            f.seek(size - 1)
+            ends_line = f.read(1) == b'\n'
+
+    return {
+        "path": os.path.abspath(path),
+        "covered": size,
+        "fingerprint": file_fingerprint(path, size),
+        "ends_line": ends_line,
+    }
+
+
+'''
+The byte range (start, stop) of an input still to be read, given what
+the checkpoint covers of it (None if nothing). None if the covered
+bytes changed, so the state can't be reused.
+'''
+def new_range(path, covered):
+    size = os.path.getsize(path)
+
+    if covered is None:
+        return 0, size
+
+    if size < covered["covered"] or \
+            file_fingerprint(path, covered["covered"]) != covered["fingerprint"]:
+        return None
+    if size > covered["covered"] and not covered["ends_line"]:
+        return None # the last line was extended
+
+    return covered["covered"], size
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+# Write the checkpoint to a temporary file and move it into place, so an
+# interrupted run leaves the old checkpoint
+def save_checkpoint(path, checkpoint):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+    with os.fdopen(fd, 'w') as f:
+        json.dump(checkpoint, f, indent=1, sort_keys=True)
+
+    os.replace(tmp_path, path)
+
+
+class IncrementalRun(object):
+
+    def __init__(self, checkpoint_path, job_class, job_args, inputs,
+                 runner='inline', rebuild=False):
+        self.checkpoint_path = checkpoint_path
+        self.job_class = job_class
+        self.job_args = list(job_args)
+        self.inputs = list(inputs)
+        self.runner = runner
+        self.rebuild = rebuild
+
+        # set by run()
+        self.state = None
+        self.rebuilt = False
+        self.ranges = {}
+        self.delta = 0
+
+    # The checkpoint, if it can be built upon for these inputs and options
+    def reusable(self, checkpoint):
+        if checkpoint is None or self.rebuild:
+            return None
+
+        if checkpoint.get("version") != VERSION \
+                or checkpoint.get("job") != self.job_class.__name__ \
+                or checkpoint.get("args") != self.job_args \
+                or checkpoint.get("files") != option_files(self.job_args):
+            return None
+
+        paths = set(os.path.abspath(path) for path in self.inputs)
+        if any(c["path"] not in paths for c in checkpoint["inputs"]):
+            return None
+
+        return checkpoint
+
+    '''
+    Decide what to read of each input: every byte, or only the new ones
+    if the checkpoint can be reused. Returns the state to merge into.
+    '''
+    def plan(self):
+        checkpoint = self.reusable(load_checkpoint(self.checkpoint_path))
+
+        if checkpoint is not None:
+            covered = dict((c["path"], c) for c in checkpoint["inputs"])
+            ranges = {}
+
+            for path in self.inputs:
+                r = new_range(path, covered.get(os.path.abspath(path)))
+                if r is None:
+                    checkpoint = None
+                    break
+                ranges[path] = r
+
+        if checkpoint is None:
+            self.rebuilt = True
+            self.delta = 0
+            self.ranges = dict((path, (0, os.path.getsize(path)))
+                               for path in self.inputs)
+            return []
+
+        self.delta = checkpoint.get("delta", 0) + 1
+        self.ranges = ranges
+        return checkpoint["state"]
+
+    '''
+    Paths of the bytes still to read: the input itself if all of it is
+    new, else a copy of its new bytes in directory.
+    '''
+    def delta_paths(self, directory):
+        paths = []
+
+        for i, path in enumerate(self.inputs):
+            start, stop = self.ranges[path]
+            if start == stop:
+                continue
+            if start == 0:
+                paths.append(path)
+                continue
+
+            delta = os.path.join(directory, "%05d-%s" % (
+                i, os.path.basename(path)))
+            with open(path, 'rb') as src, open(delta, 'wb') as dst:
+                src.seek(start)
+                left = stop - start
+                while left > 0:
+                    chunk = src.read(min(COPY_SIZE, left))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    left -= len(chunk)
+
+            paths.append(delta)
+
+        return paths
+
+    # Run the job with --emit-state, returning its [key, state] pairs
+    def run_job(self, paths):
+        args = self.job_args + [
+            '--emit-state', '--jobconf', '%s=%d' % (DELTA_SETTING, self.delta)]
+        if self.runner != 'parallel':
+            args = ['-r', self.runner] + args
+        args += paths
+
+        job = self.job_class(args=args)
+
+        if self.runner == 'parallel':
+            runner = ParallelRunner(self.job_class, args)
+        else:
+            runner = job.make_runner()
+
+        with runner as r:
+            r.run()
+            return [list(pair) for pair in job.parse_output(r.cat_output())]
+
+    '''
+    Merge the state of the new bytes into the checkpoint's, key by key,
+    with the job's combiner.
+    '''
+    def merge(self, old, new):
+        job = self.job_class(args=self.job_args)
+
+        values = {}
+        order = []
+        for key, state in old + new:
+            encoded = json.dumps(key, sort_keys=True)
+            if encoded not in values:
+                values[encoded] = (key, [])
+                order.append(encoded)
+            values[encoded][1].append(state)
+
+        merged = []
+        for encoded in sorted(order):
+            key, states = values[encoded]
+            if len(states) == 1:
+                merged.append([key, states[0]])
+                continue
+            for k, v in job.combiner(key, states):
+                merged.append([k, v])
+
+        return merged
+
+    def run(self):
+        old = self.plan()
+
+        directory = tempfile.mkdtemp(prefix="checkpoint-")
+        try:
+            paths = self.delta_paths(directory)
+            new = self.run_job(paths) if paths else []
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        self.state = self.merge(old, new)
+
+        save_checkpoint(self.checkpoint_path, {
+            "version": VERSION,
+            "job": self.job_class.__name__,
+            "args": self.job_args,
+            "files": option_files(self.job_args),
+            "inputs": [covered_input(path) for path in self.inputs],
+            "delta": self.delta,
+            "state": self.state,
+        })
+
+    # The job's output, read off the merged state by its reducer
+    def output(self):
+        job = self.job_class(args=self.job_args)
+
+        for key, state in self.state:
+            for pair in job.reducer(key, [state]):
+                yield pair
+
+    # The output as the job writes it
+    def cat_output(self):
+        protocol = self.job_class(args=self.job_args).output_protocol()
+
+        for k, v in self.output():
+            yield protocol.write(k, v) + b'\n'
+
+
+def main(argv):
+    runner = 'inline'
+    rebuild = False
+
+    while argv[:1] in (['-r'], ['--rebuild']):
+        if argv[0] == '-r':
+            runner = argv[1]
+            argv = argv[2:]
+        else:
+            rebuild = True
+            argv = argv[1:]
+
+    if len(argv) < 3:
+        print("usage: checkpoint.py [-r inline|local|parallel] [--rebuild] "
+              "CHECKPOINT JOB.py [job options] INPUT...")
+        return 2
+
+    checkpoint_path = argv[0]
+    job_class = load_job_class(argv[1])
+
+    # inputs come last, as for the parallel runner
+    args = argv[2:]
+    inputs = job_class(args=args).options.args
+    job_args = args[:len(args) - len(inputs)]
+
+    run = IncrementalRun(checkpoint_path, job_class, job_args, inputs,
+                         runner=runner, rebuild=rebuild)
+    run.run()
+
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    for line in run.cat_output():
+        out.write(line)
+
+    read = sum(stop - start for start, stop in run.ranges.values())
+    sys.stderr.write("%s %d new bytes of %d inputs\n" % (
+        "Rebuilt from" if run.rebuilt else "Merged", read, len(inputs)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,9 +1,9 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
+from instrumentation import InstrumentedJob
 from mrjob.compat import jobconf_from_env
 import numpy as np
-import csv
+from schema import COLLEGES
 
 '''
 Obtain a random sample of approximately 100 colleges, in which
@@ -18,9 +18,14 @@ in-state tuition,out-of-state tuition, room, board,
 add. fees, estim. book costs, estim. personal $,
 % fac. w/PHD, stud./fac. ratio, Graduation rate
 '''
-class MRCollegeRandomSample(MRJob):
-        
-    
+
+# Only the college name is decoded from each line
+parse_college = COLLEGES.parser(["name"])
+
+class MRCollegeRandomSample(InstrumentedJob):
+
+    FILES = ['schema.py', 'instrumentation.py']
+
     def mapper_init(self):
         self.numColleges = jobconf_from_env("my.job.settings.numColleges")
         
@@ -34,19 +39,8 @@ class MRCollegeRandomSample(MRJob):
         # The probability we assign to each observation
         p = float(N_SAMPLE) / self.numColleges
         
-        # Use csv library to split the line on commas
-        # (the library handles nasty edge cases for us)
-        split_line = csv.reader([line])
-        split_line = list(split_line)
-        split_line = split_line[0]
-        
         # Extract observation from csv line
-        name, state, pub_priv, mathSAT, verbSAT, ACT, \
-          numAppRec, numApplAcc, numNewStudEnrolled, \
-          numStudTop10, numStudTop25, numFTunder, numPTunder, \
-          inStateTuition, outStateTuition, room, board, \
-          addFees, bookCosts, personalMoney, percFacPHD, \
-          studFacRatio, gradRate = split_line
+        name, = parse_college(line)
         
         # Yield this particular line, with probability p
         if np.random.uniform() < p:
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import random
+
+from instrumentation import InstrumentedJob
+from mrjob.compat import jobconf_from_env
+from reservoir import Reservoir, task_seed
+from schema import COLLEGES
+
+'''
+Obtain a random sample of exactly 100 colleges (--sample-size), in
+which each college is equally likely to appear in the sample.
+
+Unlike collegeRandomSample.py this needs no count of the colleges from
+an earlier countColleges.py run, and the sample size is exact rather
+than approximate. Each college is given a random priority, every
+mapper and combiner keeps only the colleges with the largest
+priorities in a bounded Reservoir, and the reducer merges the
+reservoirs into the final sample.
+
+Each map task seeds its random number generator from --seed and its
+task number, so re-running the job on the same input gives the same
+sample.
+
+Reads in a csv file with columns:
+College Name, State, Public (1)/ Private (2), Math SAT,
+Verbal SAT, ACT, # appli. rec'd, # appl. accepted,
+# new stud. enrolled, % new stud. from top 10%,
+% new stud. from top 25%, # FT undergrad, # PT undergrad,
+in-state tuition,out-of-state tuition, room, board,
+add. fees, estim. book costs, estim. personal $,
+% fac. w/PHD, stud./fac. ratio, Graduation rate
+'''
+
+parse_college = COLLEGES.parser(["name"])
+
+class MRCollegeReservoirSample(InstrumentedJob):
+
+    FILES = ['reservoir.py', 'schema.py', 'instrumentation.py']
+
+    def configure_args(self):
+        super(MRCollegeReservoirSample, self).configure_args()
+        self.add_passthru_arg(
+            '--sample-size', type=int, default=100,
+            help='Number of colleges to sample')
+        self.add_passthru_arg(
+            '--seed', type=int, default=0,
+            help='Base seed for the per-task random number generators')
+
+    def mapper_init(self):
+        partition = jobconf_from_env("mapreduce.task.partition")
+
+        self.random = random.Random(task_seed(self.options.seed, partition))
+        self.reservoir = Reservoir(self.options.sample_size)
+
+    def mapper(self, _, line):
+
+        name, = parse_college(line)
+
+        self.reservoir.add(self.random.random(), name)
+
+    # Emit one partial reservoir per map task
+    def mapper_final(self):
+        if len(self.reservoir) > 0:
+            yield "_", self.reservoir.to_list()
+
+    '''
+    Keep only the top sample-size priorities
+    '''
+    def combiner(self, key, values):
+        k = self.options.sample_size
+
+        yield key, Reservoir.merge_all(k, values).to_list()
+
+    def reducer(self, key, values):
+        k = self.options.sample_size
+
+        for name in Reservoir.merge_all(k, values).sample():
+            yield key, name
+
+
+if __name__ == '__main__':
+    MRCollegeReservoirSample.run()
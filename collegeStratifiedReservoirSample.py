@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+
+import random
+
+from instrumentation import InstrumentedJob
+from mrjob.step import MRStep
+from mrjob.compat import jobconf_from_env
+from protocols import PackedProtocol
+from moments import Moments
+from reservoir import Reservoir, task_seed
+from schema import COLLEGES
+
+'''
+Obtain a stratified random sample of exactly 100 colleges
+(--sample-size), in a single pass of the data.
+
+Colleges are stratified on one or more columns of the college schema
+(--strata, comma separated), for example pub_priv, or state,pub_priv
+for State x public/private. Within a stratum every college is
+equally likely to be sampled.
+
+The sample size of each stratum is chosen by --allocation:
+
+equal          the same number from every stratum
+proportional   proportional to the stratum size N_h
+neyman         proportional to N_h * S_h, where S_h is the standard
+               deviation of --neyman-column within the stratum
+
+Strata sizes (and standard deviations) are computed in the same pass
+as the sample, so no countColleges.py run is needed. Mappers keep, for
+every stratum, its count, a Moments accumulator for the Neyman column,
+and a Reservoir of up to sample-size colleges. Combiners and the first
+reducer merge these per stratum; the second reducer allocates the
+sample across strata and takes the top n_h colleges of each reservoir,
+which is a simple random sample of size n_h of that stratum.
+
+Reads in a csv file with columns:
+College Name, State, Public (1)/ Private (2), Math SAT,
+Verbal SAT, ACT, # appli. rec'd, # appl. accepted,
+# new stud. enrolled, % new stud. from top 10%,
+% new stud. from top 25%, # FT undergrad, # PT undergrad,
+in-state tuition,out-of-state tuition, room, board,
+add. fees, estim. book costs, estim. personal $,
+% fac. w/PHD, stud./fac. ratio, Graduation rate
+'''
+
+ALLOCATIONS = ["equal", "proportional", "neyman"]
+
+
+# Sort key of a stratum: blank (None) values of nullable strata columns
+# sort after the others, rather than failing to compare with them
+def stratum_order(h):
+    return tuple((v is None, v) for v in h)
+
+
+'''
+Split a sample of size n across strata in proportion to weights,
+without giving any stratum more than caps[h] (its size). Quotas of
+capped strata are fixed at their cap and the remainder is spread over
+the others; the final integer sizes use the largest remainder method,
+so they always add up to min(n, sum of caps).
+'''
+def allocate(n, weights, caps):
+    n = min(n, sum(caps.values()))
+
+    fixed = {}
+    free = set(h for h in weights if caps[h] > 0)
+    quotas = {}
+
+    while free:
+        left = n - sum(fixed.values())
+        W = float(sum(weights[h] for h in free))
+
+        if W > 0:
+            quotas = dict((h, left * weights[h] / W) for h in free)
+        else:
+            quotas = dict((h, float(left) / len(free)) for h in free)
+
+        over = [h for h in free if quotas[h] >= caps[h]]
+        if not over:
+            break
+
+        for h in over:
+            fixed[h] = caps[h]
+            free.remove(h)
+            del quotas[h]
+
+    alloc = dict((h, 0) for h in weights)
+    alloc.update(fixed)
+
+    for h in quotas:
+        alloc[h] = int(quotas[h])
+
+    left = n - sum(alloc.values())
+    by_remainder = sorted(quotas, key=lambda h: (alloc[h] - quotas[h],
+                                                  stratum_order(h)))
+
+    for h in by_remainder[:left]:
+        alloc[h] += 1
+
+    return alloc
+
+
+class MRCollegeStratifiedReservoirSample(InstrumentedJob):
+
+    FILES = ['moments.py', 'reservoir.py', 'schema.py', 'instrumentation.py',
+             'protocols.py']
+
+    # binary values in the shuffle, see protocols.py
+    INTERNAL_PROTOCOL = PackedProtocol
+
+    def configure_args(self):
+        super(MRCollegeStratifiedReservoirSample, self).configure_args()
+        self.add_passthru_arg(
+            '--strata', default='pub_priv',
+            help='Comma separated columns to stratify on')
+        self.add_passthru_arg(
+            '--sample-size', type=int, default=100,
+            help='Total number of colleges to sample')
+        self.add_passthru_arg(
+            '--allocation', choices=ALLOCATIONS, default='equal',
+            help='How to split the sample across strata')
+        self.add_passthru_arg(
+            '--neyman-column', default=None,
+            help='Numeric column whose spread drives Neyman allocation')
+        self.add_passthru_arg(
+            '--seed', type=int, default=0,
+            help='Base seed for the per-task random number generators')
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.mapper_init,
+                   mapper=self.mapper,
+                   mapper_final=self.mapper_final,
+                   combiner=self.combiner,
+                   reducer=self.reducer_strata),
+            MRStep(reducer=self.reducer_sample)
+        ]
+
+    def mapper_init(self):
+        if self.options.allocation == 'neyman' and \
+                self.options.neyman_column is None:
+            raise Exception("Neyman allocation needs --neyman-column")
+
+        columns = ["name"] + self.options.strata.split(',')
+        if self.options.neyman_column is not None:
+            columns.append(self.options.neyman_column)
+
+        self.parse = COLLEGES.parser(columns)
+        self.nStrata = len(columns) - 1 - (self.options.neyman_column is not None)
+
+        partition = jobconf_from_env("mapreduce.task.partition")
+
+        self.random = random.Random(task_seed(self.options.seed, partition))
+
+        # stratum -> [count, reservoir, moments]
+        self.partials = {}
+
+    def mapper(self, _, line):
+
+        values = self.parse(line)
+
+        name = values[0]
+        stratum = values[1:1 + self.nStrata]
+
+        if stratum not in self.partials:
+            self.partials[stratum] = [0,
+                                      Reservoir(self.options.sample_size),
+                                      Moments()]
+        partial = self.partials[stratum]
+
+        partial[0] += 1
+        partial[1].add(self.random.random(), name)
+
+        if self.options.neyman_column is not None:
+            value = values[-1]
+            if value is not None:
+                partial[2].add(float(value))
+
+    # Emit one partial per stratum per map task
+    def mapper_final(self):
+        for stratum, (count, reservoir, moments) in self.partials.items():
+            yield list(stratum), [count, reservoir.to_list(),
+                                  moments.to_list()]
+
+    def merge_partials(self, values):
+        k = self.options.sample_size
+
+        count = 0
+        reservoir = Reservoir(k)
+        moments = Moments()
+
+        for c, r, m in values:
+            count += c
+            reservoir.merge(Reservoir.from_list(k, r))
+            moments.merge(Moments.from_list(m))
+
+        return count, reservoir, moments
+
+    '''
+    Merge the partials of each stratum
+    '''
+    def combiner(self, stratum, values):
+        count, reservoir, moments = self.merge_partials(values)
+
+        yield stratum, [count, reservoir.to_list(), moments.to_list()]
+
+    # Send every merged stratum to a single reducer for allocation
+    def reducer_strata(self, stratum, values):
+        count, reservoir, moments = self.merge_partials(values)
+
+        yield "_", [stratum, count, reservoir.sample(), moments.to_list()]
+
+    '''
+    Allocate the sample across strata, then take the
+    highest priority colleges of each stratum.
+    '''
+    def reducer_sample(self, key, values):
+        strata = {}
+        weights = {}
+        caps = {}
+
+        for stratum, count, names, moments in values:
+            h = tuple(stratum)
+
+            strata[h] = names
+            caps[h] = count
+
+            if self.options.allocation == 'equal':
+                weights[h] = 1.0
+            elif self.options.allocation == 'proportional':
+                weights[h] = float(count)
+            else:
+                moments = Moments.from_list(moments)
+                if moments.n > 1:
+                    weights[h] = count * moments.variance(ddof=1) ** 0.5
+                else:
+                    weights[h] = 0.0
+
+        alloc = allocate(self.options.sample_size, weights, caps)
+
+        for h in sorted(strata, key=stratum_order):
+            for name in strata[h][:alloc[h]]:
+                yield list(h), name
+
+
+if __name__ == '__main__':
+    MRCollegeStratifiedReservoirSample.run()
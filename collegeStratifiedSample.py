@@ -1,9 +1,9 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
+from instrumentation import InstrumentedJob
 from mrjob.compat import jobconf_from_env
 import numpy as np
-import csv
+from schema import COLLEGES
 
 '''
 Obtain a random sample of approximately 100 colleges, in which
@@ -22,9 +22,12 @@ add. fees, estim. book costs, estim. personal $,
 PUBLIC_COLLEGE_CODE = 1
 PRIVATE_COLLEGE_CODE = 2
 
-class MRCollegeStratifiedSample(MRJob):
-        
-    
+parse_college = COLLEGES.parser(["name", "pub_priv"])
+
+class MRCollegeStratifiedSample(InstrumentedJob):
+
+    FILES = ['schema.py', 'instrumentation.py']
+
     def mapper_init(self):
         self.numPubColleges = jobconf_from_env("my.job.settings.numPubColleges")
         self.numPrivColleges = jobconf_from_env("my.job.settings.numPrivColleges")
@@ -49,21 +52,8 @@ class MRCollegeStratifiedSample(MRJob):
         p_pub = float(N_SAMPLE / 2) / self.numPubColleges
         p_priv = float(N_SAMPLE / 2) / self.numPrivColleges
         
-        # Use csv library to split the line on commas
-        # (the library handles nasty edge cases for us)
-        split_line = csv.reader([line])
-        split_line = list(split_line)
-        split_line = split_line[0]
-        
         # Extract observation from csv line
-        name, state, pub_priv, mathSAT, verbSAT, ACT, \
-          numAppRec, numApplAcc, numNewStudEnrolled, \
-          numStudTop10, numStudTop25, numFTunder, numPTunder, \
-          inStateTuition, outStateTuition, room, board, \
-          addFees, bookCosts, personalMoney, percFacPHD, \
-          studFacRatio, gradRate = split_line
-        
-        pub_priv = int(pub_priv)
+        name, pub_priv = parse_college(line)
         
         if pub_priv == PUBLIC_COLLEGE_CODE:
             
@@ -78,7 +68,7 @@ class MRCollegeStratifiedSample(MRJob):
                 yield "PRIVATE", name
 
         else:
-            print line
+            print(line)
             raise Exception("Invalid public/private data entry")
 
 if __name__ == '__main__':
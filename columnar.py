@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from blocks import parse_block
+from fingerprint import file_fingerprint
+from schema import SCHEMAS
+
+'''
+Memory-mapped columnar cache for the csv inputs.
+
+convert() parses a csv file once and writes every column to its own
+binary file, in a cache directory keyed by the source file's content
+fingerprint:
+
+<cache root>/<file name>.<fingerprint>/
+    header.json           schema, source, row count, and per column
+                          dtype, min, max and null count
+    <column>.bin          numeric columns, raw int64 / float64
+    <column>.offsets      string columns, int64 start of every value
+    <column>.bytes        string columns, the utf-8 values back to back
+
+Non-nullable integer columns are stored as int64; every other numeric
+column is float64, with NaN for blanks. open_table() returns a Table
+whose numeric columns are read-only np.memmap arrays, so jobs get typed
+columns without parsing (or even copying) anything, and count, min and
+max come straight from the header.
+
+The cache root defaults to a .columnar directory next to the source
+file. Re-running on a changed file gives a new fingerprint, and so a
+new cache directory.
+
+Usage:
+python columnar.py {electricity,states,colleges} FILE
+'''
+
+HEADER = "header.json"
+CONVERT_BLOCK_SIZE = 100000
+
+# rows of a memory-mapped column handled per vectorized operation
+CHUNK_SIZE = 1 << 20
+
+
+def cache_dir(path, fingerprint, cache_root=None):
+    if cache_root is None:
+        cache_root = os.path.join(os.path.dirname(os.path.abspath(path)),
+                                  ".columnar")
+
+    return os.path.join(cache_root,
+                        "%s.%s" % (os.path.basename(path), fingerprint))
+
+
+def column_dtype(column):
+    if column.type is int and not column.nullable:
+        return np.int64
+    return np.float64
+
+
+'''
+Accumulates one column's files and header statistics while the source
+is converted block by block.
+'''
+class ColumnWriter(object):
+
+    def __init__(self, directory, column):
+        self.column = column
+        self.nulls = 0
+        self.min = None
+        self.max = None
+
+        base = os.path.join(directory, column.name)
+
+        if column.type is str:
+            self.offsets = open(base + ".offsets", "wb")
+            self.data = open(base + ".bytes", "wb")
+            self.position = 0
+            np.array([0], dtype=np.int64).tofile(self.offsets)
+        else:
+            self.dtype = column_dtype(column)
+            self.data = open(base + ".bin", "wb")
+
+    def write(self, values):
+        if self.column.type is str:
+            encoded = [v.encode('utf-8') for v in values]
+            lengths = np.array([len(v) for v in encoded], dtype=np.int64)
+
+            (self.position + np.cumsum(lengths)).tofile(self.offsets)
+            self.position += int(lengths.sum())
+            self.data.write(b"".join(encoded))
+            return
+
+        values = np.asarray(values, dtype=self.dtype)
+
+        if self.dtype == np.float64:
+            present = values[~np.isnan(values)]
+            self.nulls += len(values) - len(present)
+        else:
+            present = values
+
+        if len(present):
+            lo = present.min().item()
+            hi = present.max().item()
+            self.min = lo if self.min is None else min(self.min, lo)
+            self.max = hi if self.max is None else max(self.max, hi)
+
+        values.tofile(self.data)
+
+    def close(self):
+        self.data.close()
+        if self.column.type is str:
+            self.offsets.close()
+
+    def header(self):
+        if self.column.type is str:
+            return {"type": "str", "nulls": 0}
+
+        return {"type": self.column.type.__name__,
+                "dtype": np.dtype(self.dtype).name,
+                "min": self.min, "max": self.max, "nulls": self.nulls}
+
+
+def read_blocks(path, size):
+    block = []
+
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+
+            block.append(line)
+            if len(block) == size:
+                yield block
+                block = []
+
+    if block:
+        yield block
+
+
+'''
+Convert a csv file into the columnar cache (if it isn't there already),
+returning the cache directory.
+'''
+def convert(path, schema, cache_root=None):
+    fingerprint = file_fingerprint(path)
+    directory = cache_dir(path, fingerprint, cache_root)
+
+    if os.path.exists(os.path.join(directory, HEADER)):
+        return directory
+
+    # build in a private directory, so concurrent tasks converting the
+    # same file never see (or write into) each other's half-built cache
+    building = "%s.%d.tmp" % (directory, os.getpid())
+    os.makedirs(building)
+
+    writers = [ColumnWriter(building, c) for c in schema.columns]
+    rows = 0
+
+    for block in read_blocks(path, CONVERT_BLOCK_SIZE):
+        columns = parse_block(schema, schema.names, block)
+
+        for writer, values in zip(writers, columns):
+            writer.write(values)
+
+        rows += len(block)
+
+    for writer in writers:
+        writer.close()
+
+    header = {
+        "schema": schema.name,
+        "source": os.path.abspath(path),
+        "fingerprint": fingerprint,
+        "rows": rows,
+        "columns": dict((w.column.name, w.header()) for w in writers),
+    }
+
+    with open(os.path.join(building, HEADER), "w") as f:
+        json.dump(header, f, indent=2, sort_keys=True)
+
+    try:
+        os.rename(building, directory)
+    except OSError:
+        # another task finished converting first
+        shutil.rmtree(building)
+
+    return directory
+
+
+class Table(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        with open(os.path.join(directory, HEADER)) as f:
+            self.header = json.load(f)
+
+        self.schema = SCHEMAS[self.header["schema"]]
+        self.rows = self.header["rows"]
+
+    def path(self, name, extension):
+        return os.path.join(self.directory, name + extension)
+
+    # A numeric column as a read-only memory-mapped array
+    def column(self, name):
+        column = self.schema.column(name)
+        if column.type is str:
+            return self.strings(name)
+        if self.rows == 0:
+            return np.zeros(0, dtype=column_dtype(column))
+
+        return np.memmap(self.path(name, ".bin"), mode="r",
+                         dtype=column_dtype(column), shape=(self.rows,))
+
+    # A string column (or a slice of it) decoded into a list
+    def strings(self, name, start=0, stop=None):
+        stop = self.rows if stop is None else stop
+        if stop <= start:
+            return []
+
+        offsets = np.memmap(self.path(name, ".offsets"), mode="r",
+                            dtype=np.int64, shape=(self.rows + 1,))
+        data = np.memmap(self.path(name, ".bytes"), mode="r", dtype=np.uint8)
+
+        bounds = offsets[start:stop + 1]
+        if bounds[-1] == bounds[0]:
+            return [""] * (stop - start)
+
+        raw = data[bounds[0]:bounds[-1]].tobytes()
+        bounds = bounds - bounds[0]
+
+        return [raw[bounds[i]:bounds[i + 1]].decode('utf-8')
+                for i in range(stop - start)]
+
+    # Queries answered from the header alone
+    def count(self):
+        return self.rows
+
+    def min(self, name):
+        return self.header["columns"][name]["min"]
+
+    def max(self, name):
+        return self.header["columns"][name]["max"]
+
+    def nulls(self, name):
+        return self.header["columns"][name]["nulls"]
+
+
+def open_table(path, schema, cache_root=None):
+    return Table(convert(path, schema, cache_root))
+
+
+'''
+Open the table for a job's mapper_raw input. The cache is keyed on the
+original file (input_uri) when it is a local path, so every run shares
+it, rather than on the task's copy of the input.
+'''
+def open_input(input_path, input_uri, schema, cache_root=None):
+    if input_uri and os.path.isfile(input_uri):
+        input_path = input_uri
+
+    return open_table(input_path, schema, cache_root)
+
+
+# Row ranges covering n rows, size rows at a time
+def chunks(n, size=CHUNK_SIZE):
+    for start in range(0, n, size):
+        yield start, min(start + size, n)
+
+
+def main(argv):
+    if len(argv) != 2 or argv[0] not in SCHEMAS:
+        print("usage: columnar.py {%s} FILE" % ",".join(sorted(SCHEMAS)))
+        return 2
+
+    table = open_table(argv[1], SCHEMAS[argv[0]])
+
+    print(table.directory)
+    print(json.dumps(table.header, indent=2, sort_keys=True))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
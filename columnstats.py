@@ -0,0 +1,133 @@
+import numpy as np
+
+from moments import Moments
+
+'''
+Composite mergeable accumulator profiling a set of named, possibly
+nullable, numeric columns.
+
+For every column keeps the number of blank (None) values, a Moments
+accumulator of the present values (count, mean and M2, so the
+variance), and the smallest and largest values with the label of the
+observation each came from (argmin / argmax). Every part merges
+exactly (or, for the moments, with the pairwise update), so profiles
+of any number of columns for any number of groups can be built by
+mappers and merged by combiners and reducers in a single shuffle.
+
+Profiles travel between MapReduce steps as plain lists, see to_list()
+and from_list().
+'''
+
+AGGREGATES = ["count", "nulls", "mean", "variance", "min", "max"]
+
+
+class ColumnStats(object):
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+        k = len(self.columns)
+
+        self.nulls = [0] * k
+        self.moments = [Moments() for _ in range(k)]
+
+        self.min = [np.inf] * k
+        self.argmin = [""] * k
+        self.max = [-np.inf] * k
+        self.argmax = [""] * k
+
+    # Add a single observation, values in the same order as the columns
+    def add(self, label, values):
+        for i, x in enumerate(values):
+            if x is None:
+                self.nulls[i] += 1
+                continue
+
+            self.moments[i].add(x)
+
+            if x < self.min[i]:
+                self.min[i] = x
+                self.argmin[i] = label
+            if x > self.max[i]:
+                self.max[i] = x
+                self.argmax[i] = label
+
+    # Fold another profile of the same columns into this one
+    def merge(self, other):
+        for i in range(len(self.columns)):
+            self.nulls[i] += other.nulls[i]
+            self.moments[i].merge(other.moments[i])
+
+            if other.min[i] < self.min[i]:
+                self.min[i] = other.min[i]
+                self.argmin[i] = other.argmin[i]
+            if other.max[i] > self.max[i]:
+                self.max[i] = other.max[i]
+                self.argmax[i] = other.argmax[i]
+
+        return self
+
+    '''
+    The requested aggregates of every column, labelled for job output.
+    Statistics of a column with no present values are None.
+    '''
+    def profile(self, aggregates=AGGREGATES, ddof=0):
+        d = {}
+
+        for i, column in enumerate(self.columns):
+            m = self.moments[i]
+            present = m.n > 0
+
+            stats = {}
+            if "count" in aggregates:
+                stats["Count"] = m.n
+            if "nulls" in aggregates:
+                stats["Nulls"] = self.nulls[i]
+            if "mean" in aggregates:
+                stats["Mean"] = m.mean if present else None
+            if "variance" in aggregates:
+                stats["Variance"] = m.variance(ddof) if m.n > ddof else None
+            if "min" in aggregates:
+                stats["Min"] = self.min[i] if present else None
+                stats["Argmin"] = self.argmin[i] if present else None
+            if "max" in aggregates:
+                stats["Max"] = self.max[i] if present else None
+                stats["Argmax"] = self.argmax[i] if present else None
+
+            d[column] = stats
+
+        return d
+
+    # Extremes of empty columns are sent as None, since JSON has no inf
+    def to_list(self):
+        present = [m.n > 0 for m in self.moments]
+
+        return [self.nulls,
+                [m.to_list() for m in self.moments],
+                [x if p else None for x, p in zip(self.min, present)],
+                self.argmin,
+                [x if p else None for x, p in zip(self.max, present)],
+                self.argmax]
+
+    @classmethod
+    def from_list(cls, columns, values):
+        s = cls(columns)
+
+        nulls, moments, lo, s.argmin, hi, s.argmax = values
+
+        s.nulls = nulls
+        s.moments = [Moments.from_list(m) for m in moments]
+        s.min = [np.inf if x is None else x for x in lo]
+        s.max = [-np.inf if x is None else x for x in hi]
+
+        return s
+
+    # Merge an iterable of serialized profiles into one profile
+    @classmethod
+    def merge_all(cls, columns, values):
+        total = cls(columns)
+
+        for v in values:
+            total.merge(cls.from_list(columns, v))
+
+        return total
@@ -0,0 +1,163 @@
+import numpy as np
+
+'''
+Mergeable accumulator for the co-moments of a pair of variables.
+
+Keeps the count, the means of x and y, and the sums of products of
+deviations from the means
+
+C_xx = sum (x - mean_x)^2
+C_xy = sum (x - mean_x)(y - mean_y)
+C_yy = sum (y - mean_y)^2
+
+updated one observation at a time (Welford) and merged pairwise
+(Chan et al.), so partials from any number of mappers / combiners can
+be combined without knowing the means in advance. These are the
+sufficient statistics of a simple linear regression of y on x: the
+slope, intercept, R^2, residual variance and standard errors all
+follow from them, from a single pass of the data.
+
+Accumulators travel between MapReduce steps as plain lists, see
+to_list() and from_list().
+'''
+class CoMoments(object):
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.C_xx = 0.0
+        self.C_xy = 0.0
+        self.C_yy = 0.0
+
+    # Add a single (x, y) observation
+    def add(self, x, y):
+        self.n += 1
+
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+
+        # one deviation from the old mean, one from the new
+        self.C_xx += dx * (x - self.mean_x)
+        self.C_xy += dx * (y - self.mean_y)
+        self.C_yy += dy * (y - self.mean_y)
+
+    # Build an accumulator from arrays of observations, vectorized
+    @classmethod
+    def from_arrays(cls, x, y):
+        c = cls()
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(x) == 0:
+            return c
+
+        c.n = len(x)
+        c.mean_x = float(x.mean())
+        c.mean_y = float(y.mean())
+
+        dx = x - c.mean_x
+        dy = y - c.mean_y
+
+        c.C_xx = float(np.dot(dx, dx))
+        c.C_xy = float(np.dot(dx, dy))
+        c.C_yy = float(np.dot(dy, dy))
+
+        return c
+
+    # Fold another accumulator into this one
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n = other.n
+            self.mean_x = other.mean_x
+            self.mean_y = other.mean_y
+            self.C_xx = other.C_xx
+            self.C_xy = other.C_xy
+            self.C_yy = other.C_yy
+            return self
+
+        na = float(self.n)
+        nb = float(other.n)
+        n = na + nb
+
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        scale = na * nb / n
+
+        self.C_xx += other.C_xx + dx * dx * scale
+        self.C_xy += other.C_xy + dx * dy * scale
+        self.C_yy += other.C_yy + dy * dy * scale
+
+        self.mean_x += dx * nb / n
+        self.mean_y += dy * nb / n
+        self.n = self.n + other.n
+
+        return self
+
+    def slope(self):
+        return self.C_xy / self.C_xx
+
+    def intercept(self):
+        return self.mean_y - self.slope() * self.mean_x
+
+    # R^2 = 1 - SS_Res / SS_Tot, with SS_Res = C_yy - C_xy^2 / C_xx
+    def r_squared(self):
+        return 1 - self.ss_res() / self.C_yy
+
+    def ss_res(self):
+        # clamp tiny negative values left over from rounding
+        return max(self.C_yy - self.C_xy * self.C_xy / self.C_xx, 0.0)
+
+    # Unbiased estimate of the residual variance, SS_Res / (n - 2)
+    def residual_variance(self):
+        return self.ss_res() / (self.n - 2)
+
+    def slope_stderr(self):
+        return (self.residual_variance() / self.C_xx) ** 0.5
+
+    def intercept_stderr(self):
+        s2 = self.residual_variance()
+        return (s2 * (1.0 / self.n + self.mean_x ** 2 / self.C_xx)) ** 0.5
+
+    # F statistic of the model against the intercept-only model, on (1, n - 2) df
+    def f_statistic(self):
+        ss_res = self.ss_res()
+        if ss_res == 0:
+            return float('inf')
+        return (self.C_yy - ss_res) / (ss_res / (self.n - 2))
+
+    # Regression statistics, labelled for job output
+    def regression(self):
+        labels = "Slope,Intercept,R^2,Slope SE,Intercept SE,Residual Variance".split(",")
+        vals = [self.slope(), self.intercept(), self.r_squared(),
+                self.slope_stderr(), self.intercept_stderr(),
+                self.residual_variance()]
+
+        return dict(zip(labels, vals))
+
+    def to_list(self):
+        return [self.n, self.mean_x, self.mean_y,
+                self.C_xx, self.C_xy, self.C_yy]
+
+    @classmethod
+    def from_list(cls, values):
+        c = cls()
+
+        c.n, c.mean_x, c.mean_y, c.C_xx, c.C_xy, c.C_yy = values
+
+        return c
+
+    # Merge an iterable of serialized accumulators into one accumulator
+    @classmethod
+    def merge_all(cls, values):
+        total = cls()
+
+        for v in values:
+            total.merge(cls.from_list(v))
+
+        return total
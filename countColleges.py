@@ -1,9 +1,7 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
-from mrjob.compat import jobconf_from_env
-import numpy as np
-import csv
+from instrumentation import InstrumentedJob
+from schema import COLLEGES
 
 '''
 Obtain a random sample of approximately 100 colleges, in which
@@ -17,45 +15,62 @@ Verbal SAT, ACT, # appli. rec'd, # appl. accepted,
 in-state tuition,out-of-state tuition, room, board,
 add. fees, estim. book costs, estim. personal $,
 % fac. w/PHD, stud./fac. ratio, Graduation rate
+
+Mappers count their colleges per public/private code, and combiners
+and the reducer add up the partial counts. With --emit-state the
+reducer outputs the merged counts instead, which checkpoint.py keeps
+between runs to update the totals from new rows only.
 '''
 
 PUBLIC_COLLEGE_CODE = 1
 PRIVATE_COLLEGE_CODE = 2
 
-class MRCollegeCount(MRJob):
+parse_college = COLLEGES.parser(["pub_priv"])
+
+class MRCollegeCount(InstrumentedJob):
+
+    FILES = ['schema.py', 'instrumentation.py']
+
+    def configure_args(self):
+        super(MRCollegeCount, self).configure_args()
+        self.add_passthru_arg(
+            '--emit-state', action='store_true', default=False,
+            help='Output the merged counts instead of the totals, for '
+                 'checkpoint.py')
+
+    def mapper_init(self):
+        self.counts = {}
 
     def mapper(self, _, line):
         
-        # Use csv library to split the line on commas
-        # (the library handles nasty edge cases for us)
-        split_line = csv.reader([line])
-        split_line = list(split_line)
-        split_line = split_line[0]
-        
         # Extract observation from csv line
-        name, state, pub_priv, mathSAT, verbSAT, ACT, \
-          numAppRec, numApplAcc, numNewStudEnrolled, \
-          numStudTop10, numStudTop25, numFTunder, numPTunder, \
-          inStateTuition, outStateTuition, room, board, \
-          addFees, bookCosts, personalMoney, percFacPHD, \
-          studFacRatio, gradRate = split_line
-          
-        pub_priv = int(pub_priv)
-        
-        yield "_", pub_priv
+        pub_priv, = parse_college(line)
+
+        if pub_priv not in (PUBLIC_COLLEGE_CODE, PRIVATE_COLLEGE_CODE):
+            raise Exception("Invalid public/private data entry")
+
+        code = str(pub_priv)
+        self.counts[code] = self.counts.get(code, 0) + 1
+
+    # Emit one partial {code: count} per map task
+    def mapper_final(self):
+        if self.counts:
+            yield "_", self.counts
+
+    def combiner(self, key, values):
+        yield key, merge_counts(values)
         
     def reducer(self, key, values):
-        
-        pubCount = 0
-        privCount = 0
-        
-        for public_private in values:
-            if public_private == PUBLIC_COLLEGE_CODE:
-                pubCount += 1
-            elif public_private == PRIVATE_COLLEGE_CODE:
-                privCount += 1
-            else:
-                raise Exception("Invalid public/private data entry")
+
+        if self.options.emit_state:
+            for k, v in self.combiner(key, values):
+                yield k, v
+            return
+
+        counts = merge_counts(values)
+
+        pubCount = counts.get(str(PUBLIC_COLLEGE_CODE), 0)
+        privCount = counts.get(str(PRIVATE_COLLEGE_CODE), 0)
                 
         labels = ["Private", "Public", "Total"]
         
@@ -63,5 +78,14 @@ class MRCollegeCount(MRJob):
                 
         yield "College Counts", d
 
+
+# Sum partial counts per public/private code
+def merge_counts(values):
+    counts = {}
+    for partial in values:
+        for code, n in partial.items():
+            counts[code] = counts.get(code, 0) + n
+    return counts
+
 if __name__ == '__main__':
     MRCollegeCount.run()
\ No newline at end of file
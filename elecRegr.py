@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
-from mrjob.step import MRStep
+from instrumentation import InstrumentedJob
+from protocols import PackedProtocol
+from summation import ExactSum, product, total
 from mrjob.compat import jobconf_from_env
-import numpy as np
+from joins import load_states, join_price
+from schema import ELECTRICITY, STATES
+from aggregation import add_aggregation_args, job_plan, record_bin, \
+    tree_steps
 
 '''
 Which of the following linear models is a better fit for the electricity data
@@ -28,42 +32,77 @@ Area (Sq. Miles), Population.
 The State column matches the Name column, so that is
 the field we will join the tables on.
 
+By default the join happens in the reducers. Passing the state table
+with --states (and only Electricity.csv as input) switches to a
+broadcast join: every mapper loads the state table into a dict and
+joins price rows itself, which saves a shuffle and a step.
+
 Outputs the slope and intercept for both regressions.
 '''
-class MRElecRegr(MRJob):
-        
+
+parse_state = STATES.parser(["name", "area", "pop"])
+parse_price = ELECTRICITY.parser(["state", "pp_kwh"])
+
+class MRElecRegr(InstrumentedJob):
+
+    FILES = ['joins.py', 'schema.py', 'aggregation.py', 'instrumentation.py',
+             'protocols.py', 'summation.py']
+
+    # binary values in the shuffle, see protocols.py
+    INTERNAL_PROTOCOL = PackedProtocol
+
+    def configure_args(self):
+        super(MRElecRegr, self).configure_args()
+        self.add_file_arg(
+            '--states', default=None,
+            help='states_clean.csv to join with in the mappers')
+        add_aggregation_args(self)
+
     def steps(self):
-        return [
-            MRStep(mapper=self.mapper,
-                   reducer=self.produce_observations),
-            MRStep(reducer_init=self.reducer_init,
-                   reducer=self.reducer_partials),
-            MRStep(reducer_init=self.reducer_init,
-                    reducer=self.reducer_final)
-        ]
+        self.plan = job_plan(self)
+
+        if self.options.states:
+            source = dict(mapper_init=self.broadcast_init,
+                          mapper=self.broadcast_mapper)
+        else:
+            source = dict(mapper=self.mapper,
+                          reducer_init=self.load_means,
+                          reducer=self.produce_observations)
+
+        return tree_steps(self.plan, source,
+                          self.merge_partials, self.reducer_final)
     
     # Spit out partial observations for each state
     def mapper(self, _, line):
         
-        vals = line.split(',')
-        
-        if len(vals) > 2: # states.csv
-            state_name, abr_long, abr, area, pop = vals
-            
-            area = int(area)
-            pop = int(pop)
-            
+        if line.count(',') > 1: # states.csv
+            state_name, area, pop = parse_state(line)
+
             yield state_name, (area, pop)
 
         else: # electricity.csv
-            state_name, price = vals
-            
-            price = float(price)
-        
+            state_name, price = parse_price(line)
+
             yield state_name, (price,)
-        
+
+    # Load the state table for the broadcast join
+    def broadcast_init(self):
+        self.states = load_states(self.options.states)
+        self.load_means()
+
+    '''
+    Join each price row with its state in the mapper, then bin
+    its partial by the aggregation plan.
+    '''
+    def broadcast_mapper(self, _, line):
+
+        observation = join_price(self, self.states, line)
+
+        if observation is not None:
+            yield record_bin(self.plan, line), self.partial(*observation)
+
     # Load mean of response and predictors
-    def reducer_init(self):
+    def load_means(self):
         self.priceMean = jobconf_from_env("my.job.settings.elecMean")
         self.popMean = jobconf_from_env("my.job.settings.popMean")
         self.areaMean = jobconf_from_env("my.job.settings.areaMean")
@@ -74,13 +113,11 @@ class MRElecRegr(MRJob):
         
     '''
     This reducer is more of a mapper, performing an INNER JOIN
-    on the two input tables. Then it uses random binning to
-    bin observations.
+    on the two input tables. Then it bins each observation's
+    partial by the aggregation plan.
     '''
     def produce_observations(self, key, values):
         
-        NUMBER_OF_FIRST_REDUCERS = 10
-        
         price = None
         pop = None
         area = None
@@ -97,59 +134,55 @@ class MRElecRegr(MRJob):
         # Raise an error if we don't have a full observation for this state
         assert(price is not None and pop is not None and area is not None)
         
-        yield np.random.randint(0, NUMBER_OF_FIRST_REDUCERS), \
-                (price, area, pop)
-        
-    '''
-    Calculate partial means
-    '''
-    def reducer_partials(self, key, values):
-        
-        # covariance of predictors and response scaled by n
-        partialAreaCov = 0
-        partialPopCov = 0
-        
-        # variance of predictors scaled by n
-        partialAreaVar = 0
-        partialPopVar = 0
+        yield record_bin(self.plan, key), self.partial(price, area, pop)
         
-        for price, area, pop in values:
-            normalizedPrice = (price - self.priceMean)
-            normalizedArea = (area - self.areaMean)
-            normalizedPop = (pop - self.popMean)
-            
-            partialAreaCov += normalizedArea * normalizedPrice
-            partialPopCov += normalizedPop * normalizedPrice
-            
-            partialAreaVar += normalizedArea ** 2
-            partialPopVar += normalizedPop ** 2
-        
-        yield "_", (partialAreaCov, partialPopCov, 
-                        partialAreaVar, partialPopVar)
+    # One observation's terms of the sums
+    def partial(self, price, area, pop):
+        normalizedPrice = (price - self.priceMean)
+        normalizedArea = (area - self.areaMean)
+        normalizedPop = (pop - self.popMean)
+
+        # covariances of predictors and response, and variances of
+        # predictors, scaled by n, as exact products
+        return (product(normalizedArea, normalizedPrice),
+                product(normalizedPop, normalizedPrice),
+                product(normalizedArea, normalizedArea),
+                product(normalizedPop, normalizedPop))
         
     '''
-    Combine partials into total.
-    
-    Then use totals to compute OLS estimates.
+    Combine partials into a larger partial, summing exactly
+    (see summation.py)
     '''
-    def reducer_final(self, key, values):
+    def merge_partials(self, values):
 
         # covariance of predictors and response scaled by n
-        totalAreaCov = 0
-        totalPopCov = 0
+        totalAreaCov = ExactSum()
+        totalPopCov = ExactSum()
         
         # variance of predictors scaled by n
-        totalAreaVar = 0
-        totalPopVar = 0
+        totalAreaVar = ExactSum()
+        totalPopVar = ExactSum()
         
         for partialAreaCov, partialPopCov, \
                 partialAreaVar, partialPopVar in values:
 
-            totalAreaCov += partialAreaCov
-            totalPopCov += partialPopCov
+            totalAreaCov.add_value(partialAreaCov)
+            totalPopCov.add_value(partialPopCov)
             
-            totalAreaVar += partialAreaVar
-            totalPopVar += partialPopVar
+            totalAreaVar.add_value(partialAreaVar)
+            totalPopVar.add_value(partialPopVar)
+
+        return totalAreaCov.value(), totalPopCov.value(), \
+            totalAreaVar.value(), totalPopVar.value()
+        
+    '''
+    Use totals to compute OLS estimates.
+    '''
+    def reducer_final(self, totals):
+        self.load_means()
+
+        totalAreaCov, totalPopCov, totalAreaVar, totalPopVar = \
+            [total(t) for t in totals]
             
         slopeArea = totalAreaCov / totalAreaVar
         
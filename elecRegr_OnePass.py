@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+from instrumentation import InstrumentedJob
+from mrjob.step import MRStep
+from protocols import PackedProtocol
+from comoments import CoMoments
+from joins import load_states, join_price
+from schema import ELECTRICITY, STATES
+from bootstrap import BootstrapCoMoments, task_rng, DEFAULT_CONFIDENCE
+
+'''
+Which of the following linear models is a better fit for the electricity data
+Electricity Price = Area * <alpha> + <beta>
+Or
+Electricity Price = Population * <alpha> + <beta>
+
+Fits both models and computes their R^2 in a single pass of the data.
+elecRegr.py and elecRsq.py need the means from earlier runs of
+electricityVariance_TwoPass_Mean.py and summarizeStates.py, and R^2
+needs the slopes from elecRegr.py. Here the joined observations are
+folded into one CoMoments accumulator per model instead, and slope,
+intercept, R^2, standard errors and residual variance are all read off
+the merged co-moments.
+
+Reads in two csv files: Electricity.csv and states_clean.csv.
+
+Electricity.csv has columns:
+State, Price per Kilowatt Hour
+
+States_clean.csv has columns:
+Name, Abbreviation (Long), 2-Letter Abbreviation,
+Area (Sq. Miles), Population.
+
+The State column matches the Name column, so that is
+the field we will join the tables on.
+
+Passing the state table with --states (and only Electricity.csv as
+input) joins in the mappers instead, against a dict of the states
+loaded in mapper_init. Each mapper then emits one partial per model
+and the job runs in a single step.
+
+With --bootstrap-replicates B every joined observation is also
+weighted by B Poisson(1) draws into weighted co-moments per replicate
+and model (see bootstrap.py), and the reducer outputs percentile
+confidence intervals (--confidence) of each model's slope, intercept
+and R^2.
+
+With --emit-state the reducer outputs each model's merged co-moments
+instead, which checkpoint.py keeps between runs to update both models
+from new prices only. Run incrementally, the job needs --states: with
+the reduce-side join, new price rows would have no state rows to join.
+'''
+
+parse_state = STATES.parser(["name", "area", "pop"])
+parse_price = ELECTRICITY.parser(["state", "pp_kwh"])
+
+BOOTSTRAP_SUFFIX = " Bootstrap"
+
+class MRElecRegrOnePass(InstrumentedJob):
+
+    FILES = ['comoments.py', 'joins.py', 'schema.py', 'instrumentation.py',
+             'bootstrap.py', 'seeds.py', 'protocols.py']
+
+    # binary values in the shuffle, see protocols.py
+    INTERNAL_PROTOCOL = PackedProtocol
+
+    def configure_args(self):
+        super(MRElecRegrOnePass, self).configure_args()
+        self.add_file_arg(
+            '--states', default=None,
+            help='states_clean.csv to join with in the mappers')
+        self.add_passthru_arg(
+            '--bootstrap-replicates', type=int, default=0,
+            help='Also compute confidence intervals from this many Poisson '
+                 'bootstrap replicates (0 for none)')
+        self.add_passthru_arg(
+            '--bootstrap-seed', type=int, default=0,
+            help='Base seed of the bootstrap weights')
+        self.add_passthru_arg(
+            '--confidence', type=float, default=DEFAULT_CONFIDENCE,
+            help='Confidence level of the bootstrap intervals')
+        self.add_passthru_arg(
+            '--emit-state', action='store_true', default=False,
+            help='Output the merged accumulators instead of the statistics, '
+                 'for checkpoint.py')
+
+    def steps(self):
+        if self.options.states:
+            return [
+                MRStep(mapper_init=self.broadcast_init,
+                       mapper=self.broadcast_mapper,
+                       mapper_final=self.emit_models,
+                       combiner=self.combiner,
+                       reducer=self.reducer)
+            ]
+
+        return [
+            MRStep(mapper=self.mapper,
+                   reducer_init=self.init_models,
+                   reducer=self.join_observations,
+                   reducer_final=self.emit_models),
+            MRStep(combiner=self.combiner,
+                   reducer=self.reducer)
+        ]
+
+    # Spit out partial observations for each state
+    def mapper(self, _, line):
+
+        if line.count(',') > 1: # states.csv
+            state_name, area, pop = parse_state(line)
+
+            yield state_name, (area, pop)
+
+        else: # electricity.csv
+            state_name, price = parse_price(line)
+
+            yield state_name, (price,)
+
+    # Load the state table for the broadcast join
+    def broadcast_init(self):
+        self.states = load_states(self.options.states)
+        self.init_models()
+
+    # Join each price row with its state, and fold it into both models
+    def broadcast_mapper(self, _, line):
+
+        observation = join_price(self, self.states, line)
+
+        if observation is not None:
+            price, area, pop = observation
+
+            self.add_observation(price, area, pop)
+
+    # Start both models' accumulators, in the task that joins
+    def init_models(self):
+        self.areaModel = CoMoments()
+        self.popModel = CoMoments()
+
+        self.areaBootstrap = self.popBootstrap = None
+        if self.options.bootstrap_replicates:
+            rng = task_rng(self.options.bootstrap_seed)
+
+            self.areaBootstrap = BootstrapCoMoments(
+                self.options.bootstrap_replicates, rng)
+            self.popBootstrap = BootstrapCoMoments(
+                self.options.bootstrap_replicates, rng)
+
+    def add_observation(self, price, area, pop):
+        self.areaModel.add(area, price)
+        self.popModel.add(pop, price)
+
+        if self.areaBootstrap is not None:
+            self.areaBootstrap.add(area, price)
+            self.popBootstrap.add(pop, price)
+
+    '''
+    Perform an INNER JOIN on the two input tables, and fold
+    each joined observation into both models' co-moments.
+    '''
+    def join_observations(self, key, values):
+
+        price = None
+        pop = None
+        area = None
+
+        for t in values:
+            if len(t) == 1: # price
+                price = t[0]
+            elif len(t) == 2: # area, pop
+                area = t[0]
+                pop = t[1]
+            else:
+                raise Exception("Unrecognized mapper input in first reducer")
+
+        # Raise an error if we don't have a full observation for this state
+        assert(price is not None and pop is not None and area is not None)
+
+        self.add_observation(price, area, pop)
+
+    # Emit one partial accumulator per model per joining task
+    def emit_models(self):
+        if self.areaModel.n > 0:
+            yield "Area", self.areaModel.to_list()
+            yield "Pop", self.popModel.to_list()
+        if self.areaBootstrap is not None and self.areaModel.n > 0:
+            yield "Area" + BOOTSTRAP_SUFFIX, self.areaBootstrap.to_list()
+            yield "Pop" + BOOTSTRAP_SUFFIX, self.popBootstrap.to_list()
+
+    '''
+    Merge partial accumulators (or bootstrap replicates)
+    '''
+    def combiner(self, key, values):
+        if key.endswith(BOOTSTRAP_SUFFIX):
+            yield key, BootstrapCoMoments.merge_all(values).to_list()
+            return
+
+        yield key, CoMoments.merge_all(values).to_list()
+
+    '''
+    Combine partials into total.
+
+    Then use totals to compute OLS estimates and R^2.
+    '''
+    def reducer(self, key, values):
+        if self.options.emit_state:
+            for k, v in self.combiner(key, values):
+                yield k, v
+            return
+
+        if key.endswith(BOOTSTRAP_SUFFIX):
+            yield "Electricity Price ~ " + key, \
+                BootstrapCoMoments.merge_all(values).intervals(
+                    self.options.confidence)
+            return
+
+        yield "Electricity Price ~ " + key, \
+            CoMoments.merge_all(values).regression()
+
+
+if __name__ == '__main__':
+    MRElecRegrOnePass.run()
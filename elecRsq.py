@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
-from mrjob.step import MRStep
+from instrumentation import InstrumentedJob
+from protocols import PackedProtocol
+from summation import ExactSum, product, total
 from mrjob.compat import jobconf_from_env
-import numpy as np
+from joins import load_states, join_price
+from schema import ELECTRICITY, STATES
+from aggregation import add_aggregation_args, job_plan, record_bin, \
+    tree_steps
 
 '''
 Which of the following linear models is a better fit for the electricity data
@@ -23,44 +27,79 @@ Area (Sq. Miles), Population.
 The State column matches the Name column, so that is
 the field we will join the tables on.
 
+By default the join happens in the reducers. Passing the state table
+with --states (and only Electricity.csv as input) switches to a
+broadcast join: every mapper loads the state table into a dict and
+joins price rows itself, which saves a shuffle and a step.
+
 This script calculates R squared for both models, using
 the definition:
 R^2 = 1 - SS_Res / SS_Tot
 '''
-class MRElecRsq(MRJob):
-        
+
+parse_state = STATES.parser(["name", "area", "pop"])
+parse_price = ELECTRICITY.parser(["state", "pp_kwh"])
+
+class MRElecRsq(InstrumentedJob):
+
+    FILES = ['joins.py', 'schema.py', 'aggregation.py', 'instrumentation.py',
+             'protocols.py', 'summation.py']
+
+    # binary values in the shuffle, see protocols.py
+    INTERNAL_PROTOCOL = PackedProtocol
+
+    def configure_args(self):
+        super(MRElecRsq, self).configure_args()
+        self.add_file_arg(
+            '--states', default=None,
+            help='states_clean.csv to join with in the mappers')
+        add_aggregation_args(self)
+
     def steps(self):
-        return [
-            MRStep(mapper=self.mapper,
-                   reducer=self.produce_observations),
-            MRStep(reducer_init=self.reducer_init,
-                   reducer=self.reducer_partials),
-            MRStep(reducer_init=self.reducer_init,
-                    reducer=self.reducer_final)
-        ]
+        self.plan = job_plan(self)
+
+        if self.options.states:
+            source = dict(mapper_init=self.broadcast_init,
+                          mapper=self.broadcast_mapper)
+        else:
+            source = dict(mapper=self.mapper,
+                          reducer_init=self.load_coefficients,
+                          reducer=self.produce_observations)
+
+        return tree_steps(self.plan, source,
+                          self.merge_partials, self.reducer_final)
     
     # Spit out partial observations for each state
     def mapper(self, _, line):
         
-        vals = line.split(',')
-        
-        if len(vals) > 2: # states.csv
-            state_name, abr_long, abr, area, pop = vals
-            
-            area = int(area)
-            pop = int(pop)
-            
+        if line.count(',') > 1: # states.csv
+            state_name, area, pop = parse_state(line)
+
             yield state_name, (area, pop)
 
         else: # electricity.csv
-            state_name, price = vals
-            
-            price = float(price)
-        
+            state_name, price = parse_price(line)
+
             yield state_name, (price,)
-        
+
+    # Load the state table for the broadcast join
+    def broadcast_init(self):
+        self.states = load_states(self.options.states)
+        self.load_coefficients()
+
+    '''
+    Join each price row with its state in the mapper, then bin
+    its partial by the aggregation plan.
+    '''
+    def broadcast_mapper(self, _, line):
+
+        observation = join_price(self, self.states, line)
+
+        if observation is not None:
+            yield record_bin(self.plan, line), self.partial(*observation)
+
     # Load mean of response, and regression coefficients
-    def reducer_init(self):
+    def load_coefficients(self):
         self.priceMean = jobconf_from_env("my.job.settings.elecMean")
         self.areaIntercept = jobconf_from_env("my.job.settings.areaIntercept")
         self.popIntercept = jobconf_from_env("my.job.settings.popIntercept")
@@ -76,13 +115,11 @@ class MRElecRsq(MRJob):
         
     '''
     This reducer is more of a mapper, performing an INNER JOIN
-    on the two input tables. Then it uses random binning to
-    bin observations.
+    on the two input tables. Then it bins each observation's
+    partial by the aggregation plan.
     '''
     def produce_observations(self, key, values):
         
-        NUMBER_OF_FIRST_REDUCERS = 10
-        
         price = None
         pop = None
         area = None
@@ -99,55 +136,49 @@ class MRElecRsq(MRJob):
         # Raise an error if we don't have a full observation for this state
         assert(price is not None and pop is not None and area is not None)
         
-        yield np.random.randint(0, NUMBER_OF_FIRST_REDUCERS), \
-                (price, area, pop)
+        yield record_bin(self.plan, key), self.partial(price, area, pop)
         
-    '''
-    Calculate partial sums of squares
-    '''
-    def reducer_partials(self, key, values):
-        
-        partial_ss_res_area = 0
-        partial_ss_res_pop = 0
-        
-        partial_ss_tot = 0
-        
-        for price, area, pop in values:
-            
-            partial_ss_tot += (price - self.priceMean)**2
-            
-            fArea = self.areaIntercept + self.areaSlope * area
-            fPop = self.popIntercept + self.popSlope * pop
-            
-            eArea = fArea - price
-            ePop = fPop - price
-            
-            partial_ss_res_area += eArea**2
-            partial_ss_res_pop += ePop**2
+    # One observation's terms of the sums of squares
+    def partial(self, price, area, pop):
+        fArea = self.areaIntercept + self.areaSlope * area
+        fPop = self.popIntercept + self.popSlope * pop
         
-        yield "_", (partial_ss_res_area, partial_ss_res_pop, 
-                        partial_ss_tot)
+        eArea = fArea - price
+        ePop = fPop - price
+
+        eMean = price - self.priceMean
+
+        # as exact squares
+        return product(eArea, eArea), product(ePop, ePop), \
+            product(eMean, eMean)
         
     '''
-    Combine partials into total.
-    
-    Then use totals to compute R^2.
+    Combine partials into a larger partial, summing exactly
+    (see summation.py)
     '''
-    def reducer_final(self, key, values):
+    def merge_partials(self, values):
 
-        ss_res_area = 0
-        ss_res_pop = 0
+        ss_res_area = ExactSum()
+        ss_res_pop = ExactSum()
         
-        ss_tot = 0
+        ss_tot = ExactSum()
         
         for partial_ss_res_area, partial_ss_res_pop, \
                         partial_ss_tot in values:
 
-            ss_res_area += partial_ss_res_area
-            ss_res_pop += partial_ss_res_pop
-            
-            ss_tot += partial_ss_tot
+            ss_res_area.add_value(partial_ss_res_area)
+            ss_res_pop.add_value(partial_ss_res_pop)
             
+            ss_tot.add_value(partial_ss_tot)
+
+        return ss_res_area.value(), ss_res_pop.value(), ss_tot.value()
+        
+    '''
+    Use totals to compute R^2.
+    '''
+    def reducer_final(self, totals):
+
+        ss_res_area, ss_res_pop, ss_tot = [total(t) for t in totals]
             
         rsqArea = 1 - ss_res_area / ss_tot
         rsqPop = 1 - ss_res_pop / ss_tot
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+from instrumentation import InstrumentedJob
+from mrjob.step import MRStep
+from moments import Moments
+from schema import ELECTRICITY
+from blocks import BlockBuffer, parse_block
+from columnar import open_input, chunks
+from quantiles import KLL, DEFAULT_K, quantile_summary, parse_percentiles
+from bootstrap import BootstrapMoments, task_rng, DEFAULT_CONFIDENCE
+from seeds import task_seed
+
+'''
+Calculate the mean, variance, skewness and kurtosis of electricity
+prices among the states, in a single pass of the data.
+
+Reads in a csv file with two variables per line, name of state and
+price per kilowatt hour.
+
+Each mapper folds its prices into a Moments accumulator (count, mean
+and the sums of powered deviations M2, M3, M4), and emits a single
+partial accumulator when it finishes. Combiners and the reducer merge
+partials with the pairwise update, so the variance has the accuracy of
+electricityVariance_TwoPass_* without reading the input twice, and no
+mean has to be passed in via the jobconf parameter.
+
+With --block-size the mappers parse their lines in blocks into NumPy
+arrays and emit one vectorized partial per block instead. With
+--columnar each mapper reads its whole input file as a memory-mapped
+price column from the columnar cache (see columnar.py), and no text
+is parsed at all once the cache exists.
+
+With --quantiles the mappers also feed the prices into a KLL quantile
+sketch, merged alongside the moments under the Electricity_Quantiles
+key, and the reducer outputs the median, IQR and --percentiles.
+
+With --bootstrap-replicates B the mappers also weight every price by B
+Poisson(1) draws and keep a weighted accumulator per replicate (see
+bootstrap.py), merged under the Electricity_Bootstrap key, and the
+reducer outputs percentile confidence intervals (--confidence) of the
+mean and variance, from the same single pass.
+
+In this case our data makes up the full population, so the variance
+uses divison by n, not (n-1).
+
+With --emit-state the reducer outputs the merged accumulator (and
+sketch) instead, which checkpoint.py keeps between runs to update the
+statistics from new prices only.
+'''
+
+QUANTILE_KEY = "Electricity_Quantiles"
+BOOTSTRAP_KEY = "Electricity_Bootstrap"
+
+parse_price = ELECTRICITY.parser(["state", "pp_kwh"])
+
+class MRElecMoments(InstrumentedJob):
+
+    # Ship the accumulator module alongside the job
+    FILES = ['moments.py', 'schema.py', 'blocks.py', 'columnar.py',
+             'fingerprint.py', 'quantiles.py', 'instrumentation.py',
+             'bootstrap.py', 'seeds.py']
+
+    def configure_args(self):
+        super(MRElecMoments, self).configure_args()
+        self.add_passthru_arg(
+            '--block-size', type=int, default=0,
+            help='Parse and accumulate input in vectorized blocks of this '
+                 'many lines (0 for one line at a time)')
+        self.add_passthru_arg(
+            '--columnar', action='store_true', default=False,
+            help='Read typed columns from the memory-mapped columnar cache')
+        self.add_passthru_arg(
+            '--columnar-cache', default=None,
+            help='Columnar cache directory (default: .columnar next to '
+                 'each input file)')
+        self.add_passthru_arg(
+            '--quantiles', action='store_true', default=False,
+            help='Also estimate the median, IQR and percentiles with a '
+                 'quantile sketch')
+        self.add_passthru_arg(
+            '--percentiles', default='5,25,75,95',
+            help='Comma separated percentiles to report with --quantiles')
+        self.add_passthru_arg(
+            '--quantile-k', type=int, default=DEFAULT_K,
+            help='Quantile sketch size; rank error is about 1.7 / k')
+        self.add_passthru_arg(
+            '--bootstrap-replicates', type=int, default=0,
+            help='Also compute confidence intervals from this many Poisson '
+                 'bootstrap replicates (0 for none)')
+        self.add_passthru_arg(
+            '--bootstrap-seed', type=int, default=0,
+            help='Base seed of the bootstrap weights')
+        self.add_passthru_arg(
+            '--confidence', type=float, default=DEFAULT_CONFIDENCE,
+            help='Confidence level of the bootstrap intervals')
+        self.add_passthru_arg(
+            '--emit-state', action='store_true', default=False,
+            help='Output the merged accumulators instead of the statistics, '
+                 'for checkpoint.py')
+
+    def steps(self):
+        if self.options.columnar:
+            return [MRStep(mapper_raw=self.mapper_columnar,
+                           combiner=self.combiner,
+                           reducer=self.reducer)]
+
+        return [MRStep(mapper_init=self.mapper_init,
+                       mapper=self.mapper,
+                       mapper_final=self.mapper_final,
+                       combiner=self.combiner,
+                       reducer=self.reducer)]
+
+    def mapper_init(self):
+        self.moments = Moments(higher=True)
+        self.block = BlockBuffer(self.options.block_size)
+
+        self.sketch = KLL(self.options.quantile_k,
+                          seed=task_seed(0, QUANTILE_KEY))
+
+        self.bootstrap = None
+        if self.options.bootstrap_replicates:
+            self.bootstrap = BootstrapMoments(
+                self.options.bootstrap_replicates,
+                task_rng(self.options.bootstrap_seed))
+
+    def mapper(self, _, line):
+
+        if self.options.block_size:
+            if self.block.add(line):
+                yield "Electricity_Moments", self.block_partial()
+            return
+
+        name, pp_kwh = parse_price(line)
+
+        self.moments.add(pp_kwh)
+
+        if self.options.quantiles:
+            self.sketch.add(pp_kwh)
+        if self.bootstrap is not None:
+            self.bootstrap.add(pp_kwh)
+
+    # Moments of a whole block of lines, computed with NumPy
+    def block_partial(self):
+        pp_kwh, = parse_block(ELECTRICITY, ["pp_kwh"], self.block.take())
+
+        if self.options.quantiles:
+            self.sketch.add_array(pp_kwh)
+        if self.bootstrap is not None:
+            self.bootstrap.add_array(pp_kwh)
+
+        return Moments.from_array(pp_kwh, higher=True).to_list()
+
+    # Moments of a whole input file, from its memory-mapped price column
+    def mapper_columnar(self, input_path, input_uri):
+        table = open_input(input_path, input_uri, ELECTRICITY,
+                           self.options.columnar_cache)
+        pp_kwh = table.column("pp_kwh")
+
+        self.mapper_init()
+
+        for start, stop in chunks(table.rows):
+            self.moments.merge(Moments.from_array(pp_kwh[start:stop],
+                                                  higher=True))
+
+            if self.options.quantiles:
+                self.sketch.add_array(pp_kwh[start:stop])
+            if self.bootstrap is not None:
+                self.bootstrap.add_array(pp_kwh[start:stop])
+
+        for k, v in self.mapper_final():
+            yield k, v
+
+    # Emit one partial accumulator per map task (or final block)
+    def mapper_final(self):
+        if len(self.block) > 0:
+            yield "Electricity_Moments", self.block_partial()
+        if self.moments.n > 0:
+            yield "Electricity_Moments", self.moments.to_list()
+        if self.options.quantiles and self.sketch.n > 0:
+            yield QUANTILE_KEY, self.sketch.to_list()
+        if self.bootstrap is not None:
+            self.bootstrap.flush()
+            if self.bootstrap.n.any():
+                yield BOOTSTRAP_KEY, self.bootstrap.to_list()
+
+    '''
+    Merge partial accumulators (or quantile sketches, or bootstrap
+    replicates)
+    '''
+    def combiner(self, key, values):
+        if key == QUANTILE_KEY:
+            yield key, KLL.merge_all(
+                values, seed=task_seed(0, QUANTILE_KEY)).to_list()
+            return
+        if key == BOOTSTRAP_KEY:
+            yield key, BootstrapMoments.merge_all(values).to_list()
+            return
+
+        yield key, Moments.merge_all(values).to_list()
+
+    '''
+    Merge partial accumulators into the total,
+    then read off the statistics.
+    '''
+    def reducer(self, key, values):
+        if self.options.emit_state:
+            for k, v in self.combiner(key, values):
+                yield k, v
+            return
+
+        if key == QUANTILE_KEY:
+            percentiles = parse_percentiles(self.options.percentiles)
+            sketch = KLL.merge_all(values, seed=task_seed(0, QUANTILE_KEY))
+            yield key, quantile_summary(sketch, "Price", percentiles)
+            return
+        if key == BOOTSTRAP_KEY:
+            yield key, BootstrapMoments.merge_all(values).intervals(
+                self.options.confidence)
+            return
+
+        moments = Moments.merge_all(values)
+
+        labels = "Count,Mean,Variance,Skewness,Kurtosis".split(",")
+        vals = [moments.n, moments.mean, moments.variance(),
+                moments.skewness(), moments.kurtosis()]
+
+        d = dict(zip(labels, vals))
+
+        yield key, d
+
+
+if __name__ == '__main__':
+    MRElecMoments.run()
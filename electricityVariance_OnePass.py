@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
-from mrjob.step import MRStep
-import numpy as np
-import os
+from instrumentation import InstrumentedJob
+from protocols import PackedProtocol
+from summation import ExactSum
+from schema import ELECTRICITY
+from aggregation import add_aggregation_args, job_plan, record_bin, \
+    tree_steps
 
 '''
 Calculate the variance in electricity prices among the states.
@@ -18,74 +20,96 @@ Var(X) = E(X^2) - E(X)^2
 formula to calculate variance in one pass of the data. The sample
 variance is estimated by using the sample mean of X in place of E(X).
 
-WARNING: This method is numerically unstable, as the sum of X^2 and the
-sum of X terms would not scale to big data levels. Catastrophic cancellation
-could occur.
+With float sums this method is numerically unstable, as the sum of X^2
+and the sum of X terms would not scale to big data levels, and
+catastrophic cancellation could occur. So the sums of X and of X^2
+(each square added exactly, as its rounded value and rounding error)
+are kept exactly, as ExactSums (see summation.py), and the formula is
+evaluated in rational arithmetic: the variance is that of the prices
+as parsed, correctly rounded, and the same whatever order the partials
+are merged in.
+
+The partial means are merged by a tree of reducers, shaped by the
+aggregation planner (see aggregation.py) from the input size,
+--fan-in and --parallelism.
 '''
-class MRElecVar(MRJob):
-        
+
+parse_price = ELECTRICITY.parser(["state", "pp_kwh"])
+
+class MRElecVar(InstrumentedJob):
+
+    FILES = ['schema.py', 'aggregation.py', 'instrumentation.py',
+             'protocols.py', 'summation.py']
+
+    # binary values in the shuffle, see protocols.py
+    INTERNAL_PROTOCOL = PackedProtocol
+
+    def configure_args(self):
+        super(MRElecVar, self).configure_args()
+        add_aggregation_args(self)
+
     def steps(self):
-        return [
-            MRStep(mapper=self.mapper,
-                   reducer=self.reducer_first),
-            MRStep(reducer=self.reducer_second)
-        ]
-    
+        self.plan = job_plan(self)
+
+        return tree_steps(self.plan,
+                          dict(mapper_init=self.mapper_init,
+                               mapper=self.mapper,
+                               mapper_final=self.mapper_final),
+                          self.merge_partials, self.reducer_final)
+
+    def mapper_init(self):
+        self.partials = {}
+
+    # Sum each price into the partial of its bin of the aggregation plan
     def mapper(self, _, line):
-        NUMBER_OF_FIRST_REDUCERS = 10
-        
-        name, pp_kwh = line.split(',')
-        
-        pp_kwh = float(pp_kwh)
-        
-        yield np.random.randint(1, NUMBER_OF_FIRST_REDUCERS), (name, pp_kwh)
-        
+        name, pp_kwh = parse_price(line)
+
+        key = record_bin(self.plan, line)
+        partial = self.partials.get(key)
+        if partial is None:
+            partial = self.partials[key] = [ExactSum(), ExactSum(), 0]
+
+        partial[0].add(pp_kwh)
+        partial[1].add_product(pp_kwh, pp_kwh)
+        partial[2] += 1
+
+    # Emit one partial per bin per map task
+    def mapper_final(self):
+        for key, (total, sqTotal, n) in sorted(self.partials.items()):
+            yield key, (total.value(), sqTotal.value(), n)
+
     '''
-    Calculate partial means
+    Combine partial sums into a larger partial
     '''
-    def reducer_first(self, key, values):
-        nValues = 0
-        total = 0
-        sqTotal = 0
+    def merge_partials(self, values):
+        n = 0
+        total = ExactSum()
+        sqTotal = ExactSum()
         
-        for name, pp_kwh in values:
-            total += pp_kwh
-            sqTotal += pp_kwh**2
-            nValues += 1
-            
-        avg = float(total) / nValues
-        sqAvg = float(sqTotal) / nValues
+        for partialTotal, partialSqTotal, count in values:
+            total.add_value(partialTotal)
+            sqTotal.add_value(partialSqTotal)
+            n += count
         
-        yield "Electricity_Variance", (avg, sqAvg, nValues)
+        return total.value(), sqTotal.value(), n
         
     '''
-    Combine partial means into total mean.
-    Then use total mean to compute sample
+    Use total sums to compute sample
     variance.
     
     In this case our data is, 
     
     so we use divison by n, not (n-1).
     '''
-    def reducer_second(self, key, values):
-        n = 0
-        total = 0
-        sqTotal = 0
-        
-        for avg, sqAvg, count in values:
-            tmp = count * avg
-            sqTmp = count * sqAvg
-            total += tmp
-            sqTotal += sqTmp
-            n += count
-            
-        e_x = float(total) / n
-        
-        e_x_Sq = float(sqTotal) / n
+    def reducer_final(self, totals):
+        total, sqTotal, n = totals
+
+        total = ExactSum.from_value(total).fraction()
+        sqTotal = ExactSum.from_value(sqTotal).fraction()
         
-        var = e_x_Sq - e_x**2
+        var = float((sqTotal - total**2 / n) / n)
         
-        yield key, var
+        yield "Electricity_Variance", var
 
 
 if __name__ == '__main__':
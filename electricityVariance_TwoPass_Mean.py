@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
+from instrumentation import InstrumentedJob
 import numpy as np
 import os
+from schema import ELECTRICITY
+from summation import ExactSum
 
 '''
 Reads in a csv file with two variables per line, name of state and
@@ -14,28 +16,31 @@ of electricity prices. This task is split up into two parts, to
 allow a more numerically stable computation of the variance. This
 part simply computes the mean of pp_kwh.
 '''
-class MRElecMean(MRJob):
-    
+
+parse_price = ELECTRICITY.parser(["state", "pp_kwh"])
+
+class MRElecMean(InstrumentedJob):
+
+    FILES = ['schema.py', 'instrumentation.py', 'summation.py']
+
     def mapper(self, _, line):
         
-        name, pp_kwh = line.split(',')
-        
-        pp_kwh = float(pp_kwh)
+        name, pp_kwh = parse_price(line)
         
         yield "Electricity_Mean", pp_kwh
         
     '''
-    Calculate mean
+    Calculate mean, from the exact sum (see summation.py)
     '''
     def reducer(self, key, values):
         nValues = 0
-        total = 0
+        total = ExactSum()
         
         for pp_kwh in values:
-            total += pp_kwh
+            total.add(pp_kwh)
             nValues += 1
             
-        avg = float(total) / nValues
+        avg = float(total.fraction() / nValues)
         
         yield key, avg
 
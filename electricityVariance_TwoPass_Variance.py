@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
+from instrumentation import InstrumentedJob
 from mrjob.compat import jobconf_from_env
 import numpy as np
 import os
+from schema import ELECTRICITY
+from summation import ExactSum
 
 '''
 Reads in a csv file with two variables per line, name of state and
@@ -15,14 +17,17 @@ of electricity prices. This task is split up into two parts, to
 allow a more numerically stable computation of the variance. The
 pp_kwh mean must be passed in via the jobconf parameter.
 '''
-class MRElecVar(MRJob):
-    
+
+parse_price = ELECTRICITY.parser(["state", "pp_kwh"])
+
+class MRElecVar(InstrumentedJob):
+
+    FILES = ['schema.py', 'instrumentation.py', 'summation.py']
+
     # Output the state name and price per kilowatt hour.
     def mapper(self, _, line):
 
-        name, pp_kwh = line.split(',')
-        
-        pp_kwh = float(pp_kwh)
+        name, pp_kwh = parse_price(line)
         
         yield "Electricity_Variance", pp_kwh
         
@@ -32,19 +37,21 @@ class MRElecVar(MRJob):
         self.mean = float(self.mean)
     
     '''
-    Calculate variance in a numerically stable way.
+    Calculate variance in a numerically stable way,
+    summing the squared deviations exactly (see summation.py).
     In this case our data makes up the full population,
     so we use divison by n, not (n-1).
     '''
     def reducer(self, key, values):
         nValues = 0
-        total = 0
+        total = ExactSum()
         
         for pp_kwh in values:
-            total += (pp_kwh - self.mean)**2
+            deviation = pp_kwh - self.mean
+            total.add_product(deviation, deviation)
             nValues += 1
             
-        var = float(total) / nValues
+        var = float(total.fraction() / nValues)
         
         yield "Electricity_Variance", var
 
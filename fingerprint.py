@@ -0,0 +1,40 @@
+import hashlib
+import os
+
+'''
+Content fingerprints of input files.
+
+A fingerprint is the SHA-1 of a file's bytes, so it stays the same
+when a file is copied or touched, and changes whenever its contents
+do. Caches key their entries on it.
+'''
+
+CHUNK_SIZE = 1 << 20
+
+
+def file_fingerprint(path, length=None):
+    sha = hashlib.sha1()
+    left = os.path.getsize(path) if length is None else length
+
+    with open(path, 'rb') as f:
+        while left > 0:
+            chunk = f.read(min(CHUNK_SIZE, left))
+            if not chunk:
+                break
+            sha.update(chunk)
+            left -= len(chunk)
+
+    return sha.hexdigest()
+
+
+'''
+Fingerprints of the files a job reads besides its input, passed as
+job options (e.g. --states states_clean.csv), by absolute path.
+'''
+def option_files(args):
+    files = {}
+    for arg in args:
+        value = arg.split('=', 1)[-1]
+        if os.path.isfile(value):
+            files[os.path.abspath(value)] = file_fingerprint(value)
+    return files
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+
+from schema import SCHEMAS
+
+'''
+Generate synthetic versions of the three example datasets, of any
+size, for measuring how the jobs scale.
+
+Each file follows its schema (see schema.py): the same columns, types
+and nullable columns as the example data, with values drawn to look
+like it (log-normal areas, populations, prices and application counts,
+normal test scores, and so on, clipped to the example data's ranges).
+
+Row i of the states table is state i, named "State<i>", with a unique
+letter abbreviation ('all' writes --state-rows states, by default
+--keys). Electricity price rows and college rows refer to the first
+--keys states, by name and by abbreviation:
+
+--keys        number of distinct states the price and college rows use
+--skew        Zipf exponent of the key frequencies: 0 is uniform, 1 and
+              above puts most rows on a few hot keys (for reducer skew)
+--coverage    fraction of price rows whose state is in the states table
+              (the rest get names no state has, and miss the join)
+--null-rate   chance a nullable college field is blank (default: each
+              column's rate in the example data)
+
+Rows are generated in fixed size chunks, each from its own seeded
+random stream, so a file is the same whatever --shard it is generated
+in: --shard K/N writes only the K-th of N slices of the rows, and the
+slices concatenated in order make the whole file. Very large files can
+be generated in parallel that way.
+
+Usage:
+python generateData.py all 1000000 data/
+python generateData.py electricity 1000000 Electricity.csv --skew 1.2
+python generateData.py colleges 1000000000 part-3 --shard 3/16
+'''
+
+DATASETS = ["states", "electricity", "colleges"]
+
+# Output file names of 'all', those of the example data
+FILE_NAMES = {
+    "states": "states_clean.csv",
+    "electricity": "Electricity.csv",
+    "colleges": "colleges_no_header.csv",
+}
+
+CHUNK_ROWS = 100000
+
+DEFAULT_KEYS = 50
+
+PUBLIC_RATE = 0.36
+
+'''
+Distributions of the numeric college columns, fitted roughly to the
+example data: (distribution, location, scale, low, high, null rate),
+where a normal has the given mean and standard deviation and a
+log-normal the given median and sigma (of its log).
+'''
+COLLEGE_COLUMNS = {
+    "mathSAT": ("normal", 507, 68, 200, 800, 0.40),
+    "verbSAT": ("normal", 461, 58, 200, 800, 0.40),
+    "ACT": ("normal", 22, 2.6, 1, 36, 0.45),
+    "numAppRec": ("lognormal", 1700, 0.9, 10, 60000, 0.01),
+    "numApplAcc": ("lognormal", 1200, 0.9, 10, 30000, 0.01),
+    "numNewStudEnrolled": ("lognormal", 500, 0.9, 10, 10000, 0.004),
+    "numStudTop10": ("lognormal", 20, 0.65, 1, 100, 0.18),
+    "numStudTop25": ("normal", 52, 21, 1, 100, 0.16),
+    "numFTunder": ("lognormal", 2200, 1.0, 50, 40000, 0.002),
+    "numPTunder": ("lognormal", 450, 1.3, 1, 25000, 0.03),
+    "inStateTuition": ("lognormal", 6500, 0.7, 400, 30000, 0.02),
+    "outStateTuition": ("normal", 9300, 4200, 1000, 30000, 0.015),
+    "room": ("normal", 2500, 1150, 500, 8000, 0.25),
+    "board": ("normal", 2060, 660, 500, 6500, 0.38),
+    "addFees": ("lognormal", 250, 1.0, 5, 5000, 0.21),
+    "bookCosts": ("normal", 550, 167, 90, 2500, 0.04),
+    "personalMoney": ("lognormal", 1230, 0.5, 75, 7000, 0.14),
+    "percFacPHD": ("normal", 69, 18, 5, 100, 0.025),
+    "studFacRatio": ("lognormal", 14.2, 0.3, 2, 90, 0.002),
+    "gradRate": ("normal", 60, 19, 5, 100, 0.075),
+}
+
+
+# Unique letter abbreviation of state i: AA, AB, ..., ZZ, AAA, ...
+def abbreviation(i):
+    letters = []
+    i += 26 # two letters at least
+    while True:
+        i, r = divmod(i, 26)
+        letters.append(chr(ord('A') + r))
+        if i == 0:
+            break
+        i -= 1
+    return "".join(reversed(letters))
+
+def state_name(i):
+    return "State%d" % i
+
+
+'''
+Draws key indexes 0 .. keys - 1 with Zipf frequencies: key k is drawn
+in proportion to 1 / (k + 1)^skew.
+'''
+class KeySampler(object):
+
+    def __init__(self, keys, skew):
+        weights = 1.0 / np.arange(1, keys + 1, dtype=np.float64) ** skew
+        self.cumulative = np.cumsum(weights / weights.sum())
+
+    def sample(self, rng, n):
+        keys = np.searchsorted(self.cumulative, rng.random(n), side='right')
+        return np.minimum(keys, len(self.cumulative) - 1)
+
+
+def draw(rng, n, spec):
+    kind, location, scale, low, high, _ = spec
+
+    if kind == "normal":
+        values = rng.normal(location, scale, n)
+    else:
+        values = np.exp(rng.normal(math.log(location), scale, n))
+
+    return np.clip(values, low, high)
+
+
+def format_ints(values):
+    return [str(v) for v in np.rint(values).astype(np.int64).tolist()]
+
+def format_floats(values, digits):
+    return ["%.*f" % (digits, v) for v in values.tolist()]
+
+def blank_out(rng, fields, rate):
+    if rate <= 0:
+        return fields
+    for i in np.flatnonzero(rng.random(len(fields)) < rate).tolist():
+        fields[i] = ""
+    return fields
+
+
+'''
+Generators of the columns of n rows of each dataset, starting at row
+first, as lists of formatted fields in schema order.
+'''
+def state_columns(rng, first, n, options):
+    rows = range(first, first + n)
+
+    names = [state_name(i) for i in rows]
+    long_names = ["St%d." % i for i in rows]
+    abbreviations = [abbreviation(i) for i in rows]
+    area = np.exp(rng.normal(math.log(70000), 1.0, n)).clip(1000, 700000)
+    pop = np.exp(rng.normal(math.log(4000000), 1.0, n)).clip(400000, 4e7)
+
+    return [names, long_names, abbreviations,
+            format_ints(area), format_ints(pop)]
+
+def electricity_columns(rng, first, n, options):
+    keys = options.sampler.sample(rng, n).tolist()
+    matched = (rng.random(n) < options.coverage).tolist()
+
+    names = [state_name(k) if hit else "Nowhere%d" % (first + i)
+             for i, (k, hit) in enumerate(zip(keys, matched))]
+    price = np.exp(rng.normal(math.log(9.5), 0.25, n))
+
+    return [names, format_floats(price, 2)]
+
+def college_columns(rng, first, n, options):
+    columns = [["College %d" % i for i in range(first, first + n)],
+               [abbreviation(k) for k in options.sampler.sample(rng, n)],
+               format_ints(np.where(rng.random(n) < PUBLIC_RATE, 1, 2))]
+
+    for column in SCHEMAS["colleges"].columns[3:]:
+        spec = COLLEGE_COLUMNS[column.name]
+        values = draw(rng, n, spec)
+
+        if column.type is float:
+            fields = format_floats(values, 1)
+        else:
+            fields = format_ints(values)
+
+        rate = spec[-1] if options.null_rate is None else options.null_rate
+        columns.append(blank_out(rng, fields, rate))
+
+    return columns
+
+GENERATORS = {
+    "states": state_columns,
+    "electricity": electricity_columns,
+    "colleges": college_columns,
+}
+
+
+'''
+Write rows start .. stop - 1 of a dataset of the given number of rows
+to a file, chunk by chunk.
+'''
+def write_dataset(path, dataset, rows, options, start=0, stop=None):
+    stop = rows if stop is None else stop
+    generate = GENERATORS[dataset]
+    stream = DATASETS.index(dataset)
+
+    with open(path, 'w') as f:
+        for chunk in range(start // CHUNK_ROWS,
+                           (stop + CHUNK_ROWS - 1) // CHUNK_ROWS):
+            first = chunk * CHUNK_ROWS
+            n = min(CHUNK_ROWS, rows - first)
+
+            rng = np.random.default_rng([options.seed, stream, chunk])
+            lines = [",".join(fields)
+                     for fields in zip(*generate(rng, first, n, options))]
+
+            lines = lines[max(start - first, 0):stop - first]
+            if lines:
+                f.write("\n".join(lines))
+                f.write("\n")
+
+
+def shard_rows(rows, shard):
+    k, n = [int(x) for x in shard.split("/")]
+    if not 0 <= k < n:
+        raise ValueError("Bad shard %s" % shard)
+    return rows * k // n, rows * (k + 1) // n
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic example data")
+    parser.add_argument('dataset', choices=DATASETS + ["all"])
+    parser.add_argument('rows', type=int)
+    parser.add_argument('output',
+                        help="Output file (a directory, for 'all')")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keys', type=int, default=DEFAULT_KEYS,
+                        help="Distinct states used by the price and "
+                             "college rows")
+    parser.add_argument('--skew', type=float, default=0.0,
+                        help="Zipf exponent of the state frequencies")
+    parser.add_argument('--coverage', type=float, default=1.0,
+                        help="Fraction of price rows that join a state")
+    parser.add_argument('--null-rate', type=float, default=None,
+                        help="Chance a nullable college field is blank")
+    parser.add_argument('--state-rows', type=int, default=None,
+                        help="Rows of the states table, for 'all' "
+                             "(default: --keys)")
+    parser.add_argument('--shard', default="0/1",
+                        help="Write only slice K/N of the rows")
+
+    options = parser.parse_args(argv)
+    options.sampler = KeySampler(options.keys, options.skew)
+
+    return options
+
+def main(argv):
+    options = parse_args(argv)
+
+    if options.dataset != "all":
+        start, stop = shard_rows(options.rows, options.shard)
+        write_dataset(options.output, options.dataset, options.rows,
+                      options, start, stop)
+        return 0
+
+    if not os.path.isdir(options.output):
+        os.makedirs(options.output)
+
+    sizes = {
+        "states": options.state_rows or options.keys,
+        "electricity": options.rows,
+        "colleges": options.rows,
+    }
+
+    for dataset in DATASETS:
+        start, stop = shard_rows(sizes[dataset], options.shard)
+        write_dataset(os.path.join(options.output, FILE_NAMES[dataset]),
+                      dataset, sizes[dataset], options, start, stop)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
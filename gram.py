@@ -0,0 +1,195 @@
+import numpy as np
+
+'''
+Mergeable Gram (cross-product) matrices of a set of numeric columns
+with missing values, for multiple regression and correlation matrices.
+
+For a block of rows X (NaN where blank) with mask M (1 where present),
+the accumulator keeps, over every pair of columns i, j:
+
+N[i, j] = number of rows where both i and j are present
+S[i, j] = sum of x_i over those rows
+P[i, j] = sum of x_i * x_j over those rows       (X'X)
+Q[i, j] = sum of x_i^2 over those rows
+
+all computed with matrix products (M'M, X'M, X'X, (X^2)'M), so a
+partial is O(p^2) in the number of columns however many rows it covers.
+Sums are taken of x - shift, with a per column shift near the data's
+mean, so the centered (co)variances derived from them don't suffer
+from cancellation. Partials with different shifts are merged by
+re-shifting one of them exactly.
+
+Pairwise counts and sums give pairwise-deletion covariances and
+correlations. Fed only the complete rows, the same sums give the usual
+listwise (complete case) X'X, X'y and y'y of a regression.
+
+Accumulators travel between MapReduce steps as plain lists, see
+to_list() and from_list().
+'''
+class Gram(object):
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+        k = len(self.columns)
+
+        self.shift = np.zeros(k)
+        self.N = np.zeros((k, k))
+        self.S = np.zeros((k, k))
+        self.P = np.zeros((k, k))
+        self.Q = np.zeros((k, k))
+
+    @property
+    def empty(self):
+        return not self.N.any()
+
+    # Build an accumulator from a block of rows (one column per column)
+    @classmethod
+    def from_array(cls, columns, X):
+        g = cls(columns)
+
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(g.columns))
+        if len(X) == 0:
+            return g
+
+        present = ~np.isnan(X)
+        M = present.astype(np.float64)
+
+        counts = M.sum(axis=0)
+        totals = np.where(present, X, 0.0).sum(axis=0)
+        g.shift = np.where(counts > 0, totals / np.maximum(counts, 1), 0.0)
+
+        Z = np.where(present, X - g.shift, 0.0)
+
+        g.N = M.T.dot(M)
+        g.S = Z.T.dot(M)
+        g.P = Z.T.dot(Z)
+        g.Q = (Z * Z).T.dot(M)
+
+        return g
+
+    def add_array(self, X):
+        return self.merge(Gram.from_array(self.columns, X))
+
+    # Fold another accumulator of the same columns into this one
+    def merge(self, other):
+        if other.empty:
+            return self
+        if self.empty:
+            self.shift = other.shift.copy()
+            self.N = other.N.copy()
+            self.S = other.S.copy()
+            self.P = other.P.copy()
+            self.Q = other.Q.copy()
+            return self
+
+        # other's sums of (x - other.shift) as sums of (x - self.shift)
+        d = other.shift - self.shift
+        N, S = other.N, other.S
+
+        self.P += other.P + S * d[None, :] + d[:, None] * S.T \
+            + np.outer(d, d) * N
+        self.Q += other.Q + 2 * d[:, None] * S + (d * d)[:, None] * N
+        self.S += S + d[:, None] * N
+        self.N += N
+
+        return self
+
+    # Mean of every column over the rows where it is present
+    def means(self):
+        n = np.diag(self.N)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.diag(self.S) / n + self.shift
+
+    # Centered sums of products, C[i, j] over the rows where both are present
+    def comoments(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.P - self.S * self.S.T / self.N
+
+    # Pairwise covariances (dividing by n)
+    def covariance(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.comoments() / self.N
+
+    '''
+    Pairwise Pearson correlations: each r[i, j] uses only the rows where
+    both columns are present. NaN where there are no such rows, or a
+    column is constant over them.
+    '''
+    def correlation(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            V = self.Q - self.S * self.S / self.N
+            return self.comoments() / np.sqrt(V * V.T)
+
+    '''
+    Ordinary least squares fit of the response column on the predictor
+    columns (with an intercept), from the (pairwise) covariances. The
+    number of observations is the smallest pairwise count among the
+    model's columns, which is the number of complete rows when the
+    accumulator was fed complete rows only.
+    '''
+    def regression(self, response, predictors):
+        x = [self.columns.index(name) for name in predictors]
+        y = self.columns.index(response)
+        model = x + [y]
+
+        n = self.N[np.ix_(model, model)].min()
+        k = len(x)
+
+        cov = self.covariance()
+        Sxx = cov[np.ix_(x, x)]
+        Sxy = cov[x, y]
+        Syy = cov[y, y]
+
+        beta = np.linalg.solve(Sxx, Sxy)
+
+        means = self.means()
+        intercept = means[y] - beta.dot(means[x])
+
+        ss_tot = n * Syy
+        ss_res = max(n * (Syy - beta.dot(Sxy)), 0.0)
+        dof = n - k - 1
+
+        r2 = 1 - ss_res / ss_tot
+        adj_r2 = 1 - (1 - r2) * (n - 1) / dof
+
+        s2 = ss_res / dof
+        inverse = np.linalg.inv(n * Sxx)
+        stderr = np.sqrt(s2 * np.diag(inverse))
+        intercept_stderr = np.sqrt(
+            s2 * (1.0 / n + means[x].dot(inverse).dot(means[x])))
+
+        d = {}
+        d["Observations"] = int(n)
+        d["Coefficients"] = dict(zip(predictors, beta.tolist()))
+        d["Coefficients"]["Intercept"] = float(intercept)
+        d["Standard Errors"] = dict(zip(predictors, stderr.tolist()))
+        d["Standard Errors"]["Intercept"] = float(intercept_stderr)
+        d["R^2"] = float(r2)
+        d["Adjusted R^2"] = float(adj_r2)
+        d["Residual Variance"] = float(s2)
+
+        return d
+
+    def to_list(self):
+        return [self.shift.tolist(), self.N.tolist(), self.S.tolist(),
+                self.P.tolist(), self.Q.tolist()]
+
+    @classmethod
+    def from_list(cls, columns, values):
+        g = cls(columns)
+
+        g.shift, g.N, g.S, g.P, g.Q = [np.array(v, dtype=np.float64)
+                                       for v in values]
+
+        return g
+
+    # Merge an iterable of serialized accumulators into one accumulator
+    @classmethod
+    def merge_all(cls, columns, values):
+        total = cls(columns)
+
+        for v in values:
+            total.merge(cls.from_list(columns, v))
+
+        return total
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+from instrumentation import InstrumentedJob
+from schema import SCHEMAS
+from sketches import GroupCounter, DEFAULT_EXACT_LIMIT, DEFAULT_TOP, \
+    DEFAULT_PRECISION, DEFAULT_WIDTH, DEFAULT_DEPTH
+
+'''
+Count the rows of a csv file for every value of one of its columns
+(e.g. colleges by State, or by Public (1)/ Private (2)), along with the
+number of distinct values.
+
+Each mapper counts the values of its rows in a GroupCounter (see
+sketches.py), which is exact while there are at most --exact-limit
+distinct values and switches to a HyperLogLog distinct count plus
+Count-Min frequency estimates for the --top most frequent values past
+that. Every mapper emits a single partial counter when it finishes,
+and the combiners and reducer merge them, so the shuffle is bounded by
+the size of the sketches however many rows or distinct values there
+are.
+
+Blank values of nullable columns are counted separately as Nulls.
+
+Usage:
+python groupCount.py --schema colleges --column state FILE
+'''
+
+class MRGroupCount(InstrumentedJob):
+
+    FILES = ['schema.py', 'sketches.py', 'instrumentation.py']
+
+    def configure_args(self):
+        super(MRGroupCount, self).configure_args()
+        self.add_passthru_arg(
+            '--schema', default='colleges', choices=sorted(SCHEMAS),
+            help='Schema of the input file')
+        self.add_passthru_arg(
+            '--column', default='pub_priv',
+            help='Name of the column to count values of')
+        self.add_passthru_arg(
+            '--exact-limit', type=int, default=DEFAULT_EXACT_LIMIT,
+            help='Count exactly up to this many distinct values, then '
+                 'switch to sketches')
+        self.add_passthru_arg(
+            '--top', type=int, default=DEFAULT_TOP,
+            help='Number of most frequent values to report once counts '
+                 'are estimated')
+        self.add_passthru_arg(
+            '--hll-precision', type=int, default=DEFAULT_PRECISION,
+            help='HyperLogLog uses 2^p registers')
+        self.add_passthru_arg(
+            '--cms-width', type=int, default=DEFAULT_WIDTH,
+            help='Count-Min sketch counters per row')
+        self.add_passthru_arg(
+            '--cms-depth', type=int, default=DEFAULT_DEPTH,
+            help='Count-Min sketch rows')
+
+    # Sketch settings, the same in every task
+    def counter_options(self):
+        return dict(exact_limit=self.options.exact_limit,
+                    top=self.options.top,
+                    p=self.options.hll_precision,
+                    width=self.options.cms_width,
+                    depth=self.options.cms_depth)
+
+    def mapper_init(self):
+        schema = SCHEMAS[self.options.schema]
+        schema.column(self.options.column) # fail early on a bad name
+
+        self.parse = schema.parser([self.options.column])
+        self.counter = GroupCounter(**self.counter_options())
+        self.nulls = 0
+
+    def mapper(self, _, line):
+        value, = self.parse(line)
+
+        if value is None:
+            self.nulls += 1
+        else:
+            self.counter.add(value)
+
+    # Emit one partial counter per map task
+    def mapper_final(self):
+        yield self.options.column, [self.nulls, self.counter.to_list()]
+
+    def merge_partials(self, values):
+        nulls = 0
+        partials = []
+
+        for partial_nulls, partial in values:
+            nulls += partial_nulls
+            partials.append(partial)
+
+        return nulls, GroupCounter.merge_all(partials,
+                                             **self.counter_options())
+
+    '''
+    Merge partial counters
+    '''
+    def combiner(self, key, values):
+        nulls, counter = self.merge_partials(values)
+
+        yield key, [nulls, counter.to_list()]
+
+    def reducer(self, key, values):
+        nulls, counter = self.merge_partials(values)
+
+        d = {}
+        d["Total"] = counter.n + nulls
+        d["Nulls"] = nulls
+        d["Distinct"] = counter.distinct()
+        d["Exact"] = counter.exact
+        d["Counts"] = counter.most_common()
+
+        yield key, d
+
+
+if __name__ == '__main__':
+    MRGroupCount.run()
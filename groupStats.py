@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+from instrumentation import InstrumentedJob
+from schema import SCHEMAS
+from columnstats import ColumnStats, AGGREGATES
+
+'''
+Profile any numeric columns of a csv file, grouped by any of its
+columns, in a single pass of the data and a single shuffle.
+
+The caller declares the groups and statistics:
+
+--schema        dataset of the input file (electricity, states, colleges)
+--group-by      comma separated group key columns, e.g. state,pub_priv
+                (blank for one global group)
+--columns       comma separated columns to profile (default: every
+                numeric column of the schema but the group keys)
+--aggregates    comma separated subset of count, nulls, mean,
+                variance, min, max (default: all of them)
+--label-column  column naming each row, reported as the argmin /
+                argmax of the extremes (default: the first column)
+
+Each mapper folds its rows into one ColumnStats profile per group (see
+columnstats.py), and emits them when it finishes, or early if it holds
+more than --max-groups groups. Combiners and the reducer merge the
+partial profiles of each group, so e.g. profiling all 20 numeric
+college columns by state is one scan instead of dozens of jobs.
+
+The output key is the list of group key values.
+
+Usage:
+python groupStats.py --schema colleges --group-by state,pub_priv FILE
+'''
+
+MAX_GROUPS = 10000
+
+def split_names(text):
+    return [name for name in text.split(',') if name]
+
+
+class MRGroupStats(InstrumentedJob):
+
+    FILES = ['schema.py', 'moments.py', 'columnstats.py', 'instrumentation.py']
+
+    def configure_args(self):
+        super(MRGroupStats, self).configure_args()
+        self.add_passthru_arg(
+            '--schema', default='colleges', choices=sorted(SCHEMAS),
+            help='Schema of the input file')
+        self.add_passthru_arg(
+            '--group-by', default='state',
+            help='Comma separated group key columns (blank for one group)')
+        self.add_passthru_arg(
+            '--columns', default=None,
+            help='Comma separated columns to profile (default: every '
+                 'numeric column)')
+        self.add_passthru_arg(
+            '--aggregates', default=",".join(AGGREGATES),
+            help='Comma separated statistics, out of %s'
+                 % ", ".join(AGGREGATES))
+        self.add_passthru_arg(
+            '--label-column', default=None,
+            help='Column naming each row in argmin / argmax (default: '
+                 'the first column)')
+        self.add_passthru_arg(
+            '--ddof', type=int, default=0,
+            help='Delta degrees of freedom of the variance (0 for the '
+                 'population variance, 1 for the sample variance)')
+        self.add_passthru_arg(
+            '--max-groups', type=int, default=MAX_GROUPS,
+            help='Emit a mapper\'s partial profiles once it holds this '
+                 'many groups')
+
+    # Resolve the declared groups, columns and statistics
+    def mapper_init(self):
+        schema = SCHEMAS[self.options.schema]
+
+        self.group_by = split_names(self.options.group_by)
+        self.columns = self.profiled_columns()
+
+        label = self.options.label_column or schema.names[0]
+
+        aggregates = split_names(self.options.aggregates)
+        for aggregate in aggregates:
+            if aggregate not in AGGREGATES:
+                raise ValueError("Unknown aggregate %s" % aggregate)
+
+        self.parse = schema.parser([label] + self.group_by + self.columns)
+        self.nGroupKeys = len(self.group_by)
+
+        self.groups = {}
+
+    def profiled_columns(self):
+        schema = SCHEMAS[self.options.schema]
+
+        if self.options.columns:
+            columns = split_names(self.options.columns)
+            for name in columns:
+                if schema.column(name).type not in (int, float):
+                    raise ValueError("%s is not a numeric column" % name)
+            return columns
+
+        group_by = split_names(self.options.group_by)
+        return [name for name in schema.names_of_type(int, float)
+                if name not in group_by]
+
+    def mapper(self, _, line):
+        values = self.parse(line)
+
+        label = values[0]
+        group = tuple(values[1:self.nGroupKeys + 1])
+
+        stats = self.groups.get(group)
+        if stats is None:
+            stats = self.groups[group] = ColumnStats(self.columns)
+
+        stats.add(label, values[self.nGroupKeys + 1:])
+
+        if len(self.groups) >= self.options.max_groups:
+            for pair in self.mapper_final():
+                yield pair
+
+    # Emit (and forget) one partial profile per group
+    def mapper_final(self):
+        for group, stats in self.groups.items():
+            yield list(group), stats.to_list()
+
+        self.groups = {}
+
+    '''
+    Merge partial profiles of a group
+    '''
+    def combiner(self, key, values):
+        yield key, ColumnStats.merge_all(self.profiled_columns(),
+                                         values).to_list()
+
+    def reducer(self, key, values):
+        stats = ColumnStats.merge_all(self.profiled_columns(), values)
+
+        yield key, stats.profile(split_names(self.options.aggregates),
+                                 self.options.ddof)
+
+
+if __name__ == '__main__':
+    MRGroupStats.run()
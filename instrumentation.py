@@ -0,0 +1,350 @@
+import cProfile
+import os
+import time
+
+from mrjob.compat import jobconf_from_env
+from mrjob.job import MRJob
+
+'''
+Per-step, per-task instrumentation shared by every job.
+
+Jobs subclass InstrumentedJob instead of MRJob. With --instrument, each
+map, combine and reduce task counts, through mrjob's counters (so they
+are summed over tasks the same way on every runner):
+
+- records in and out, and bytes out (as written by the output protocol)
+- keys: the distinct keys a mapper emits, or a combiner / reducer reads
+- key skew: a histogram of records per key in powers of two ("keys with
+  8-15 records"), and for reducers, which see every record of a key,
+  each task's heaviest key ("heaviest key: <key>")
+
+--instrument-timers N also times the task body (mapper_init, mapper,
+mapper_final and so on, not reading and decoding input) for one in N of
+the records it emits, and extrapolates the total. --instrument-profile DIR runs
+each task under cProfile and dumps its profile to
+DIR/step-<n>-<task type>-<task number>.prof.
+
+When the job finishes, a report of the counters, step by step, is
+written to stderr, with each step's heaviest keys. Without
+--instrument the job runs exactly as before, with no per-record
+overhead.
+'''
+
+GROUP_PREFIX = "Instrumentation"
+
+# Distinct keys each mapper tracks for its key counts and skew histogram
+MAX_TRACKED_KEYS = 100000
+
+# Heaviest keys shown per step in the report
+REPORT_KEYS = 5
+
+HEAVIEST_KEY = "heaviest key: "
+
+
+def counter_group(step_num, task_type):
+    return "%s: step %d %s" % (GROUP_PREFIX, step_num + 1, task_type)
+
+# Histogram bucket of a key with n records: 1, 2-3, 4-7, 8-15, ...
+def bucket_name(n):
+    low = 1 << (n.bit_length() - 1)
+    if low == 1:
+        return "keys with 1 record"
+    return "keys with %d-%d records" % (low, 2 * low - 1)
+
+def bucket_low(name):
+    return int(name.split()[2].split("-")[0])
+
+
+class TaskStats(object):
+
+    def __init__(self, job, step_num, task_type):
+        self.job = job
+        self.step_num = step_num
+        self.task_type = task_type
+
+        self.write = job.pick_protocols(step_num, task_type)[1]
+        self.sample = job.options.instrument_timers
+
+        self.records_in = 0
+        self.records_out = 0
+        self.bytes_out = 0
+
+        self.key_counts = {} # records per key
+        self.heaviest = None # (records, key) of a reducer's heaviest key
+
+        self.body_seconds = 0.0
+        self.calls = 0
+
+    # Count (and for grouped input, group) the records in
+    def count_in(self, pairs):
+        grouped = self.task_type != 'mapper'
+        last = None
+        n = 0
+
+        for pair in pairs:
+            self.records_in += 1
+
+            if grouped:
+                if n and pair[0] != last:
+                    self.add_key(last, n)
+                    n = 0
+                last = pair[0]
+                n += 1
+
+            yield pair
+
+        if grouped and n:
+            self.add_key(last, n)
+
+    def add_key(self, key, n):
+        bucket = bucket_name(n)
+        self.key_counts[bucket] = self.key_counts.get(bucket, 0) + 1
+
+        if self.task_type == 'reducer' and \
+                (self.heaviest is None or n > self.heaviest[0]):
+            self.heaviest = (n, key)
+
+    '''
+    Count the records out, and time the task body on one in every
+    --instrument-timers calls (minus the time spent reading input).
+    '''
+    def count_out(self, pairs, timed_input):
+        mapper = self.task_type == 'mapper'
+        mapper_keys = {}
+        clock = time.perf_counter
+
+        while True:
+            timed = self.sample and self.calls % self.sample == 0
+            self.calls += 1
+
+            if timed:
+                input_before = timed_input.seconds
+                start = clock()
+
+            try:
+                k, v = next(pairs)
+            except StopIteration:
+                break
+            finally:
+                if timed:
+                    elapsed = clock() - start
+                    elapsed -= timed_input.seconds - input_before
+                    self.body_seconds += elapsed * self.sample
+
+            line = self.write(k, v)
+            self.records_out += 1
+            self.bytes_out += len(line) + 1
+
+            if mapper:
+                key = line.split(b'\t', 1)[0]
+                if key in mapper_keys:
+                    mapper_keys[key] += 1
+                elif len(mapper_keys) < MAX_TRACKED_KEYS:
+                    mapper_keys[key] = 1
+
+            yield k, v
+
+        for n in mapper_keys.values():
+            self.add_key(None, n)
+
+        self.report()
+
+    def report(self):
+        group = counter_group(self.step_num, self.task_type)
+        increment = self.job.increment_counter
+
+        increment(group, "tasks", 1)
+        increment(group, "records in", self.records_in)
+        increment(group, "records out", self.records_out)
+        increment(group, "bytes out", self.bytes_out)
+        increment(group, "keys", sum(self.key_counts.values()))
+
+        for bucket, keys in self.key_counts.items():
+            increment(group, bucket, keys)
+
+        if self.heaviest is not None:
+            n, key = self.heaviest
+            # commas would end the counter name
+            name = repr(key)[:60].replace(",", ";")
+            increment(group, HEAVIEST_KEY + name, n)
+
+        if self.sample:
+            increment(group, "body ms", int(round(self.body_seconds * 1000)))
+
+
+# Times the reads of an input iterator
+class TimedInput(object):
+
+    def __init__(self, pairs, timed):
+        self.pairs = iter(pairs)
+        self.timed = timed
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.timed:
+            return next(self.pairs)
+
+        start = time.perf_counter()
+        try:
+            return next(self.pairs)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+class InstrumentedJob(MRJob):
+
+    def configure_args(self):
+        super(InstrumentedJob, self).configure_args()
+        self.add_passthru_arg(
+            '--instrument', action='store_true', default=False,
+            help='Count records, bytes, keys and key skew of every task, '
+                 'and report them at the end of the run')
+        self.add_passthru_arg(
+            '--instrument-timers', type=int, default=0, metavar='N',
+            help='With --instrument, also time the mappers, combiners and '
+                 'reducers on one in N records')
+        self.add_passthru_arg(
+            '--instrument-profile', default=None, metavar='DIR',
+            help='Dump a cProfile profile of every task into DIR')
+
+    def map_pairs(self, pairs, step_num=0):
+        return self.instrumented(super(InstrumentedJob, self).map_pairs,
+                                 pairs, step_num, 'mapper')
+
+    def combine_pairs(self, pairs, step_num=0):
+        return self.instrumented(super(InstrumentedJob, self).combine_pairs,
+                                 pairs, step_num, 'combiner')
+
+    def reduce_pairs(self, pairs, step_num=0):
+        return self.instrumented(super(InstrumentedJob, self).reduce_pairs,
+                                 pairs, step_num, 'reducer')
+
+    def instrumented(self, run_task, pairs, step_num, task_type):
+        if self.options.instrument:
+            stats = TaskStats(self, step_num, task_type)
+            timed_input = TimedInput(stats.count_in(pairs), stats.sample > 0)
+
+            output = stats.count_out(iter(run_task(timed_input, step_num)),
+                                     timed_input)
+        else:
+            output = run_task(pairs, step_num)
+
+        if self.options.instrument_profile:
+            output = self.profiled(output, step_num, task_type)
+
+        return output
+
+    # Run a task's body under cProfile, dumping the profile at the end
+    def profiled(self, output, step_num, task_type):
+        directory = self.options.instrument_profile
+        task = jobconf_from_env("mapreduce.task.partition", "0")
+
+        path = os.path.join(directory, "step-%d-%s-%05d.prof"
+                            % (step_num + 1, task_type, int(task)))
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            for pair in output:
+                yield pair
+        finally:
+            profile.disable()
+
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            profile.dump_stats(path)
+
+    # Remember the runner, so run_job() can read its counters
+    def make_runner(self):
+        self.runner = super(InstrumentedJob, self).make_runner()
+        return self.runner
+
+    '''
+    Run the job as MRJob does, then write the instrumentation report
+    of its counters to stderr.
+    '''
+    def run_job(self):
+        super(InstrumentedJob, self).run_job()
+
+        if self.options.instrument:
+            self.stderr.write(
+                format_report(self.runner.counters()).encode('utf-8'))
+            self.stderr.flush()
+
+
+'''
+Bytes shuffled to the reducers, over every step with a reducer, from
+the instrumentation counters of a run: the bytes out of the step's
+combiners, or of its mappers if it has none. 0 if the job wasn't run
+with --instrument.
+'''
+def shuffle_bytes(counters):
+    total = 0
+
+    for step_num, step_counters in enumerate(counters):
+        if not step_counters.get(counter_group(step_num, 'reducer')):
+            continue
+
+        for task_type in ('combiner', 'mapper'):
+            c = step_counters.get(counter_group(step_num, task_type))
+            if c:
+                total += c.get("bytes out", 0)
+                break
+
+    return total
+
+
+'''
+Format the instrumentation counters of a run (a list of each step's
+counters, as from runner.counters()) as a table of every step and task
+type, followed by each step's key skew. Empty if the job wasn't run
+with --instrument.
+'''
+def format_report(counters):
+    rows = []
+    skew = []
+
+    for step_num, step_counters in enumerate(counters):
+        for task_type in ('mapper', 'combiner', 'reducer'):
+            c = step_counters.get(counter_group(step_num, task_type))
+            if not c:
+                continue
+
+            name = "step %d %s" % (step_num + 1, task_type)
+
+            per_record = ""
+            if "body ms" in c and c.get("records in"):
+                per_record = "%.1f" % (1000.0 * c["body ms"]
+                                       / c["records in"])
+
+            buckets = [b for b in c if b.startswith("keys with")]
+            largest = max(buckets, key=bucket_low) if buckets else ""
+
+            rows.append((name, c.get("tasks", 0), c.get("records in", 0),
+                         c.get("records out", 0), c.get("bytes out", 0),
+                         c.get("keys", 0), c.get("body ms", ""),
+                         per_record, largest.replace("keys with ", "")))
+
+            heavy = sorted(((n, b[len(HEAVIEST_KEY):]) for b, n in c.items()
+                            if b.startswith(HEAVIEST_KEY)), reverse=True)
+            for n, key in heavy[:REPORT_KEYS]:
+                skew.append("%-20s %12d  %s" % (name, n, key))
+
+    if not rows:
+        return ""
+
+    header = ("step", "tasks", "records in", "records out", "bytes out",
+              "keys", "body ms", "us/record", "largest key")
+    line = "%-20s %6s %12s %12s %12s %9s %9s %9s  %s\n"
+
+    report = ["\nInstrumentation report\n", line % header]
+    report += [line % row for row in rows]
+
+    if skew:
+        report.append("\nHeaviest keys (records)\n")
+        report += [s + "\n" for s in skew]
+
+    return "".join(report)
@@ -0,0 +1,57 @@
+'''
+Helpers for joining the electricity prices to the state table inside
+the mappers (a broadcast, or map-side, join).
+
+The state table has one row per state, so it is small enough to ship
+to every map task as a distributed file and load into a dict in
+mapper_init. Each price row is then joined with a dict lookup and the
+joined observation comes straight out of the mapper, with no shuffle
+or extra reduce step needed to pair the two tables up.
+'''
+
+from schema import ELECTRICITY, STATES
+
+UNMATCHED_GROUP = "Broadcast join"
+
+parse_state = STATES.parser(["name", "area", "pop"])
+parse_price = ELECTRICITY.parser(["state", "pp_kwh"])
+
+
+'''
+Load states_clean.csv into a dict keyed on the state name (the column
+Electricity.csv is joined on), holding (area, pop).
+'''
+def load_states(path):
+    states = {}
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            name, area, pop = parse_state(line)
+
+            states[name] = (area, pop)
+
+    return states
+
+
+'''
+Join one Electricity.csv line against the loaded states.
+
+Returns (price, area, pop), or None (after bumping a counter on the
+job) if the state has no row in the state table.
+'''
+def join_price(job, states, line):
+    state_name, price = parse_price(line)
+
+    if state_name not in states:
+        job.increment_counter(UNMATCHED_GROUP, "Unmatched price rows", 1)
+        return None
+
+    job.increment_counter(UNMATCHED_GROUP, "Matched price rows", 1)
+
+    area, pop = states[state_name]
+
+    return price, area, pop
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from comoments import CoMoments
+from countColleges import MRCollegeCount, PUBLIC_COLLEGE_CODE, \
+    PRIVATE_COLLEGE_CODE
+from electricityVariance_Moments import MRElecMoments, parse_price
+from moments import Moments
+from reservoir import Reservoir
+from schema import COLLEGES
+from stateRegression_OnePass import MRStateRegrOnePass
+from summarizeStates import MRSummarize, COLUMNS, parse_state
+from summary import Summary
+
+'''
+Keep the statistics of the jobs up to date as rows arrive, and answer
+queries about them over HTTP.
+
+Rows of each dataset are read, one line at a time, from a source:
+
+-                    standard input
+PATH                 a file, followed as it grows (like tail -f), from
+                     its first line
+unix:PATH            a Unix socket, listened on: every connection
+                     sends lines
+tcp:PORT             a TCP port on 127.0.0.1, the same way
+
+and parsed with the jobs' own parsers, into the same mergeable
+accumulators the jobs' mappers build: electricity prices into Moments
+(like electricityVariance_Moments.py), states into a Summary (like
+summarizeStates.py) and the CoMoments of area and population (like
+stateRegression_OnePass.py), and colleges into counts per public /
+private code (like countColleges.py). Each dataset also keeps a
+Reservoir sample of --sample-size rows (state abbreviations, college
+names, prices). Every accumulator is of fixed size, so memory doesn't
+grow with the stream, and each row costs a constant amount of work.
+Rows that don't parse are counted and skipped.
+
+Queries are answered from the accumulators by the jobs' own reducers,
+so the answers look like the jobs' output:
+
+GET /                  every dataset
+GET /<dataset>         one dataset (electricity, states or colleges)
+
+Usage:
+python liveStats.py --electricity - < "Example Data/Electricity.csv"
+python liveStats.py --states states.csv --colleges unix:/tmp/colleges
+'''
+
+DEFAULT_PORT = 8731
+
+# Seconds between looks at a followed file that has stopped growing
+POLL_SECONDS = 0.2
+
+
+class LiveStats(object):
+
+    def __init__(self, sample_size, seed):
+        self.lock = threading.Lock()
+
+        self.rows = 0
+        self.bad_rows = 0
+
+        self.random = random.Random(seed)
+        self.sample = Reservoir(sample_size)
+
+    # Parse and fold in one line
+    def add_line(self, line):
+        line = line.rstrip('\r\n')
+        if not line:
+            return
+
+        try:
+            row = self.parse(line)
+        except ValueError:
+            with self.lock:
+                self.bad_rows += 1
+            return
+
+        with self.lock:
+            self.rows += 1
+            self.add(row)
+            self.sample.add(self.random.random(), self.label(row))
+
+    def report(self):
+        with self.lock:
+            d = {"Rows": self.rows, "Bad Rows": self.bad_rows}
+
+            if self.rows > 0:
+                for key, value in self.statistics():
+                    d[key] = value
+
+            d["Sample"] = self.sample.sample()
+
+        return d
+
+
+# Like electricityVariance_Moments.py
+class ElectricityStats(LiveStats):
+
+    def __init__(self, sample_size, seed):
+        super(ElectricityStats, self).__init__(sample_size, seed)
+        self.moments = Moments(higher=True)
+        self.job = MRElecMoments(args=[])
+
+    def parse(self, line):
+        return parse_price(line)
+
+    def add(self, row):
+        self.moments.add(row[1])
+
+    def label(self, row):
+        return list(row)
+
+    def statistics(self):
+        return self.job.reducer("Electricity_Moments",
+                                [self.moments.to_list()])
+
+
+# Like summarizeStates.py and stateRegression_OnePass.py
+class StateStats(LiveStats):
+
+    def __init__(self, sample_size, seed):
+        super(StateStats, self).__init__(sample_size, seed)
+        self.summary = Summary(COLUMNS)
+        self.comoments = CoMoments()
+        self.summary_job = MRSummarize(args=[])
+        self.regression_job = MRStateRegrOnePass(args=[])
+
+    def parse(self, line):
+        return parse_state(line)
+
+    def add(self, row):
+        abr, pop, area = row
+        self.summary.add(abr, (pop, area))
+        self.comoments.add(area, pop)
+
+    def label(self, row):
+        return row[0]
+
+    def statistics(self):
+        for pair in self.summary_job.reducer("states",
+                                             [self.summary.to_list()]):
+            yield pair
+
+        # the regression needs two distinct areas, its errors a third
+        # row, and its R^2 two distinct populations
+        c = self.comoments
+        if c.n > 2 and c.C_xx > 0 and c.C_yy > 0:
+            for pair in self.regression_job.reducer(
+                    "Population ~ Area", [c.to_list()]):
+                yield pair
+
+
+parse_college = COLLEGES.parser(["name", "pub_priv"])
+
+# Like countColleges.py
+class CollegeStats(LiveStats):
+
+    def __init__(self, sample_size, seed):
+        super(CollegeStats, self).__init__(sample_size, seed)
+        self.counts = {}
+        self.job = MRCollegeCount(args=[])
+
+    # Rows with an invalid public/private code are bad rows, which the
+    # job would fail on
+    def parse(self, line):
+        row = parse_college(line)
+        if row[1] not in (PUBLIC_COLLEGE_CODE, PRIVATE_COLLEGE_CODE):
+            raise ValueError("Invalid public/private data entry")
+        return row
+
+    def add(self, row):
+        code = str(row[1])
+        self.counts[code] = self.counts.get(code, 0) + 1
+
+    def label(self, row):
+        return row[0]
+
+    def statistics(self):
+        return self.job.reducer("_", [self.counts])
+
+DATASETS = {
+    "electricity": ElectricityStats,
+    "states": StateStats,
+    "colleges": CollegeStats,
+}
+
+
+'''
+Feeders: each reads the lines of one source into one dataset's
+statistics, in its own thread.
+'''
+def feed_stream(stream, stats):
+    for line in stream:
+        stats.add_line(line)
+
+def feed_file(path, stats):
+    f = None
+    partial = ""
+
+    while True:
+        if f is None:
+            if not os.path.exists(path):
+                time.sleep(POLL_SECONDS)
+                continue
+            f = open(path, newline='')
+
+        line = f.readline()
+
+        if line.endswith('\n'):
+            stats.add_line(partial + line)
+            partial = ""
+        elif line:
+            partial += line # the rest of the line isn't written yet
+        else:
+            # start over if the file was truncated or replaced
+            try:
+                replaced = os.stat(path).st_ino != os.fstat(f.fileno()).st_ino
+                truncated = os.path.getsize(path) < f.tell()
+            except OSError:
+                replaced, truncated = True, False
+
+            if replaced or truncated:
+                f.close()
+                f = None
+                partial = ""
+            else:
+                time.sleep(POLL_SECONDS)
+
+def feed_socket(server, stats):
+    while True:
+        connection, _ = server.accept()
+        stream = connection.makefile('r', encoding='utf-8', newline='')
+
+        t = threading.Thread(target=feed_connection,
+                             args=(connection, stream, stats))
+        t.daemon = True
+        t.start()
+
+def feed_connection(connection, stream, stats):
+    try:
+        feed_stream(stream, stats)
+    finally:
+        stream.close()
+        connection.close()
+
+def listen(source):
+    if source.startswith("unix:"):
+        path = source[len("unix:"):]
+        if os.path.exists(path):
+            os.remove(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+    else:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("127.0.0.1", int(source[len("tcp:"):])))
+
+    server.listen(16)
+    return server
+
+# Start the thread feeding one source into stats
+def start_feeder(source, stats):
+    if source == "-":
+        target, args = feed_stream, (sys.stdin, stats)
+    elif source.startswith("unix:") or source.startswith("tcp:"):
+        target, args = feed_socket, (listen(source), stats)
+    else:
+        target, args = feed_file, (source, stats)
+
+    t = threading.Thread(target=target, args=args)
+    t.daemon = True
+    t.start()
+    return t
+
+
+def make_handler(statistics):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            name = self.path.strip("/").split("?")[0]
+
+            if name == "":
+                body = dict((n, s.report()) for n, s in statistics.items())
+            elif name in statistics:
+                body = statistics[name].report()
+            else:
+                self.send_error(404, "No dataset %s" % name)
+                return
+
+            data = json.dumps(body, sort_keys=True).encode('utf-8')
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        # queries are frequent, don't log each one
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Live statistics of streamed rows")
+    for name in sorted(DATASETS):
+        parser.add_argument('--' + name, default=None, metavar='SOURCE',
+                            help="Source of %s rows: -, a file to follow, "
+                                 "unix:PATH or tcp:PORT" % name)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help="Port on 127.0.0.1 to answer queries on")
+    parser.add_argument('--sample-size', type=int, default=100,
+                        help="Rows kept in each dataset's sample")
+    parser.add_argument('--seed', type=int, default=0)
+
+    options = parser.parse_args(argv)
+
+    sources = dict((name, getattr(options, name)) for name in DATASETS
+                   if getattr(options, name) is not None)
+    if not sources:
+        parser.error("Give a source for at least one dataset")
+    if list(sources.values()).count("-") > 1:
+        parser.error("Only one dataset can be read from standard input")
+
+    return options, sources
+
+def main(argv):
+    options, sources = parse_args(argv)
+
+    statistics = {}
+    for i, name in enumerate(sorted(sources)):
+        statistics[name] = DATASETS[name](options.sample_size,
+                                          options.seed + i)
+        start_feeder(sources[name], statistics[name])
+
+    server = ThreadingHTTPServer(("127.0.0.1", options.port),
+                                 make_handler(statistics))
+    sys.stderr.write("Answering queries on http://127.0.0.1:%d/\n"
+                     % options.port)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+from instrumentation import InstrumentedJob
+from comoments import CoMoments
+from joins import load_states, join_price
+from schema import SCHEMAS
+from blocks import BlockBuffer, parse_block, DEFAULT_BLOCK_SIZE
+
+import numpy as np
+
+'''
+Screen every candidate single predictor model
+
+<response> = <candidate> * <alpha> + <beta>
+
+of a response in a single pass of the data, and rank them.
+
+Each mapper parses its lines in blocks into NumPy arrays and folds
+every block into one CoMoments accumulator per candidate, using the
+rows where both the response and that candidate are present. Each
+mapper emits the list of its partial accumulators when it finishes,
+and the reducer merges them, fits every model, and outputs them best
+first, followed by the best model. Screening N candidates is one scan
+instead of the 2N + 2 jobs of the elecRegr.py / elecRsq.py chain.
+
+Models are ranked by their F statistic against the intercept-only
+model, R^2 / (1 - R^2) * (n - 2), which for models with the same
+observations orders them the same as R^2.
+
+--schema        dataset of the input file (electricity, states, colleges)
+--response      name of the response column
+--candidates    comma separated candidate predictor columns (default:
+                every other numeric column)
+
+Passing the state table with --states (and only Electricity.csv as
+input) joins each price row with its state in the mappers instead (see
+joins.py), and screens the joined columns pp_kwh, area and pop; the
+response defaults to pp_kwh, the electricity price. This answers q4
+in one job.
+
+Usage:
+python modelScreening.py --states states_clean.csv Electricity.csv
+python modelScreening.py --response gradRate colleges_no_header.csv
+'''
+
+JOINED_COLUMNS = ["pp_kwh", "area", "pop"]
+
+def split_names(text):
+    return [name for name in text.split(',') if name]
+
+
+class MRModelScreening(InstrumentedJob):
+
+    FILES = ['comoments.py', 'joins.py', 'schema.py', 'blocks.py',
+             'instrumentation.py']
+
+    def configure_args(self):
+        super(MRModelScreening, self).configure_args()
+        self.add_passthru_arg(
+            '--schema', default='colleges', choices=sorted(SCHEMAS),
+            help='Schema of the input file')
+        self.add_passthru_arg(
+            '--response', default=None,
+            help='Name of the response column')
+        self.add_passthru_arg(
+            '--candidates', default=None,
+            help='Comma separated candidate predictor columns (default: '
+                 'every other numeric column)')
+        self.add_file_arg(
+            '--states', default=None,
+            help='states_clean.csv to join Electricity.csv with in the '
+                 'mappers')
+        self.add_passthru_arg(
+            '--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+            help='Number of lines parsed and accumulated at a time')
+
+    def numeric_columns(self):
+        if self.options.states:
+            return JOINED_COLUMNS
+        return SCHEMAS[self.options.schema].names_of_type(int, float)
+
+    def response(self):
+        if self.options.response:
+            return self.options.response
+        if self.options.states:
+            return "pp_kwh"
+        raise ValueError("--response is required")
+
+    def candidates(self):
+        if self.options.candidates:
+            return split_names(self.options.candidates)
+        return [name for name in self.numeric_columns()
+                if name != self.response()]
+
+    def mapper_init(self):
+        numeric = self.numeric_columns()
+
+        for name in [self.response()] + self.candidates():
+            if name not in numeric:
+                raise ValueError("%s is not a numeric column" % name)
+
+        self.columns = [numeric.index(name)
+                        for name in [self.response()] + self.candidates()]
+
+        if self.options.states:
+            self.states = load_states(self.options.states)
+
+        self.models = [CoMoments() for _ in self.candidates()]
+        self.block = BlockBuffer(self.options.block_size)
+
+    def mapper(self, _, line):
+        if self.options.states:
+            # keep joined (price, area, pop) rows in place of lines
+            line = join_price(self, self.states, line)
+            if line is None:
+                return
+
+        if self.block.add(line):
+            self.add_block()
+
+    # Fold a block of rows into every candidate's co-moments
+    def add_block(self):
+        rows = self.block.take()
+
+        if self.options.states:
+            X = np.array(rows, dtype=np.float64)
+        else:
+            X = np.column_stack(parse_block(SCHEMAS[self.options.schema],
+                                            self.numeric_columns(), rows))
+            X = X.astype(np.float64)
+
+        X = X[:, self.columns]
+        y = X[:, 0]
+        y_present = ~np.isnan(y)
+
+        for j, model in enumerate(self.models):
+            x = X[:, j + 1]
+            present = y_present & ~np.isnan(x)
+
+            model.merge(CoMoments.from_arrays(x[present], y[present]))
+
+    # Emit every candidate's partial accumulator, in candidate order
+    def mapper_final(self):
+        if len(self.block) > 0:
+            self.add_block()
+
+        yield self.response(), [model.to_list() for model in self.models]
+
+    '''
+    Merge partial accumulators, candidate by candidate
+    '''
+    def merge_models(self, values):
+        models = [CoMoments() for _ in self.candidates()]
+
+        for partials in values:
+            for model, partial in zip(models, partials):
+                model.merge(CoMoments.from_list(partial))
+
+        return models
+
+    def combiner(self, key, values):
+        yield key, [model.to_list() for model in self.merge_models(values)]
+
+    '''
+    Fit every candidate model from its merged co-moments,
+    and output them ranked by F statistic.
+    '''
+    def reducer(self, key, values):
+        fits = []
+
+        for name, model in zip(self.candidates(), self.merge_models(values)):
+            if model.n < 3 or model.C_xx == 0 or model.C_yy == 0:
+                continue # too few observations, or a constant column
+
+            d = {}
+            d["Observations"] = model.n
+            d["Slope"] = model.slope()
+            d["Intercept"] = model.intercept()
+            d["R^2"] = model.r_squared()
+            d["F"] = model.f_statistic()
+
+            fits.append(("%s ~ %s" % (key, name), d))
+
+        fits.sort(key=lambda fit: -fit[1]["F"])
+
+        for rank, (model, d) in enumerate(fits, 1):
+            d["Rank"] = rank
+            yield model, d
+
+        if fits:
+            yield "Best Model", fits[0][0]
+
+
+if __name__ == '__main__':
+    MRModelScreening.run()
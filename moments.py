@@ -0,0 +1,172 @@
+import numpy as np
+
+'''
+Mergeable accumulator for the central moments of a single variable.
+
+Keeps the count, the running mean, and the sums of powered deviations
+from the mean (M2, and optionally M3 and M4). Values are added one at a
+time with Welford's update, and partial accumulators built by different
+mappers / combiners are merged with the pairwise update of Chan et al.
+(extended to the third and fourth moments by Pebay). Neither update
+ever forms a sum of X^2, so there is no catastrophic cancellation and
+the variance is as accurate as the two pass formula, from one pass.
+
+Accumulators travel between MapReduce steps as plain lists, see
+to_list() and from_list().
+'''
+class Moments(object):
+
+    def __init__(self, higher=False):
+        self.higher = higher
+
+        self.n = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.M3 = 0.0
+        self.M4 = 0.0
+
+    # Add a single observation
+    def add(self, x):
+        n1 = self.n
+        self.n += 1
+        n = self.n
+
+        delta = x - self.mean
+        delta_n = delta / n
+        term1 = delta * delta_n * n1
+
+        self.mean += delta_n
+
+        if self.higher:
+            delta_n2 = delta_n * delta_n
+            self.M4 += term1 * delta_n2 * (n * n - 3 * n + 3) \
+                + 6 * delta_n2 * self.M2 - 4 * delta_n * self.M3
+            self.M3 += term1 * delta_n * (n - 2) - 3 * delta_n * self.M2
+
+        self.M2 += term1
+
+    '''
+    Build an accumulator from an array of observations with vectorized
+    operations, for merging into a running accumulator.
+    '''
+    @classmethod
+    def from_array(cls, x, higher=False):
+        m = cls(higher=higher)
+
+        x = np.asarray(x, dtype=np.float64)
+        if len(x) == 0:
+            return m
+
+        m.n = len(x)
+        m.mean = float(x.mean())
+
+        d = x - m.mean
+        d2 = d * d
+
+        m.M2 = float(d2.sum())
+
+        if higher:
+            m.M3 = float((d2 * d).sum())
+            m.M4 = float((d2 * d2).sum())
+
+        return m
+
+    '''
+    Fold another accumulator into this one. The result is the same
+    (up to rounding) as if every observation of other had been passed
+    to add().
+    '''
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n = other.n
+            self.mean = other.mean
+            self.M2 = other.M2
+            self.M3 = other.M3
+            self.M4 = other.M4
+            return self
+
+        na = float(self.n)
+        nb = float(other.n)
+        n = na + nb
+
+        delta = other.mean - self.mean
+        delta2 = delta * delta
+
+        mean = self.mean + delta * nb / n
+        M2 = self.M2 + other.M2 + delta2 * na * nb / n
+
+        if self.higher:
+            delta3 = delta2 * delta
+            delta4 = delta2 * delta2
+
+            M3 = self.M3 + other.M3 \
+                + delta3 * na * nb * (na - nb) / (n * n) \
+                + 3.0 * delta * (na * other.M2 - nb * self.M2) / n
+
+            M4 = self.M4 + other.M4 \
+                + delta4 * na * nb * (na * na - na * nb + nb * nb) / (n ** 3) \
+                + 6.0 * delta2 * (na * na * other.M2 + nb * nb * self.M2) / (n * n) \
+                + 4.0 * delta * (na * other.M3 - nb * self.M3) / n
+
+            self.M3 = M3
+            self.M4 = M4
+
+        self.n = self.n + other.n
+        self.mean = mean
+        self.M2 = M2
+
+        return self
+
+    '''
+    Variance of the observations. ddof=0 treats the data as the full
+    population (divide by n), ddof=1 gives the unbiased sample variance.
+    '''
+    def variance(self, ddof=0):
+        return self.M2 / (self.n - ddof)
+
+    # Population skewness, g1 = m3 / m2^(3/2)
+    def skewness(self):
+        if self.M2 == 0:
+            return 0.0
+        return (self.n ** 0.5) * self.M3 / (self.M2 ** 1.5)
+
+    # Population excess kurtosis, g2 = m4 / m2^2 - 3
+    def kurtosis(self):
+        if self.M2 == 0:
+            return 0.0
+        return self.n * self.M4 / (self.M2 * self.M2) - 3.0
+
+    def to_list(self):
+        if self.higher:
+            return [self.n, self.mean, self.M2, self.M3, self.M4]
+        return [self.n, self.mean, self.M2]
+
+    @classmethod
+    def from_list(cls, values):
+        m = cls(higher=len(values) > 3)
+
+        m.n = values[0]
+        m.mean = values[1]
+        m.M2 = values[2]
+
+        if m.higher:
+            m.M3 = values[3]
+            m.M4 = values[4]
+
+        return m
+
+    # Merge an iterable of serialized accumulators into one accumulator
+    @classmethod
+    def merge_all(cls, values):
+        total = None
+
+        for v in values:
+            m = cls.from_list(v)
+            if total is None:
+                total = m
+            else:
+                total.merge(m)
+
+        return total
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+from instrumentation import InstrumentedJob
+from schema import SCHEMAS
+from gram import Gram
+from blocks import BlockBuffer, parse_block, DEFAULT_BLOCK_SIZE
+
+import numpy as np
+
+'''
+Fit a multiple linear regression
+
+<response> = <predictor 1> * b1 + ... + <predictor k> * bk + b0
+
+and compute the Pearson correlation matrix of every numeric column of
+a csv file, in a single pass of the data.
+
+Each mapper parses its lines in blocks into a NumPy matrix and folds
+each block into Gram accumulators (see gram.py) with matrix products:
+one over every numeric column with pairwise counts, for the correlation
+matrix, and one over the model's columns for the regression. With
+--missing listwise (the default) only rows where every model column is
+present go into the regression; with --missing pairwise each covariance
+uses every row where its two columns are present. Each mapper emits its
+two partial accumulators when it finishes, and combiners and the
+reducer sum them, so the shuffle is O(p^2) per task whatever the number
+of rows.
+
+Outputs the coefficients and their standard errors, R^2, adjusted R^2
+and the number of observations of the regression, and the correlation
+matrix (null where a pair of columns has no rows in common).
+
+Usage:
+python multipleRegression.py --response gradRate \
+    --predictors mathSAT,verbSAT,studFacRatio colleges_no_header.csv
+'''
+
+CORRELATION_KEY = "Correlation"
+
+def split_names(text):
+    return [name for name in text.split(',') if name]
+
+
+class MRMultipleRegression(InstrumentedJob):
+
+    FILES = ['schema.py', 'gram.py', 'blocks.py', 'instrumentation.py']
+
+    def configure_args(self):
+        super(MRMultipleRegression, self).configure_args()
+        self.add_passthru_arg(
+            '--schema', default='colleges', choices=sorted(SCHEMAS),
+            help='Schema of the input file')
+        self.add_passthru_arg(
+            '--response', default='gradRate',
+            help='Name of the response column')
+        self.add_passthru_arg(
+            '--predictors', default='mathSAT,verbSAT,percFacPHD,studFacRatio',
+            help='Comma separated names of the predictor columns')
+        self.add_passthru_arg(
+            '--missing', default='listwise', choices=['listwise', 'pairwise'],
+            help='Drop rows with any blank model column (listwise), or '
+                 'use every pair of present values (pairwise)')
+        self.add_passthru_arg(
+            '--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+            help='Number of lines parsed and accumulated at a time')
+
+    def numeric_columns(self):
+        return SCHEMAS[self.options.schema].names_of_type(int, float)
+
+    def model_columns(self):
+        return split_names(self.options.predictors) + [self.options.response]
+
+    def model_key(self):
+        return "%s ~ %s" % (self.options.response,
+                            " + ".join(split_names(self.options.predictors)))
+
+    def mapper_init(self):
+        numeric = self.numeric_columns()
+
+        for name in self.model_columns():
+            if name not in numeric:
+                raise ValueError("%s is not a numeric %s column"
+                                 % (name, self.options.schema))
+
+        self.model = [numeric.index(name) for name in self.model_columns()]
+
+        self.correlation = Gram(numeric)
+        self.regression = Gram(self.model_columns())
+        self.block = BlockBuffer(self.options.block_size)
+
+    def mapper(self, _, line):
+        if self.block.add(line):
+            self.add_block()
+
+    # Parse a block of lines into a matrix and fold it into the sums
+    def add_block(self):
+        X = np.column_stack(parse_block(SCHEMAS[self.options.schema],
+                                        self.numeric_columns(),
+                                        self.block.take()))
+        X = X.astype(np.float64)
+
+        self.correlation.add_array(X)
+
+        model = X[:, self.model]
+        if self.options.missing == 'listwise':
+            model = model[~np.isnan(model).any(axis=1)]
+
+        self.regression.add_array(model)
+
+    # Emit the partial sums of this map task
+    def mapper_final(self):
+        if len(self.block) > 0:
+            self.add_block()
+
+        yield CORRELATION_KEY, self.correlation.to_list()
+        yield self.model_key(), self.regression.to_list()
+
+    def columns(self, key):
+        if key == CORRELATION_KEY:
+            return self.numeric_columns()
+        return self.model_columns()
+
+    '''
+    Sum partial matrices
+    '''
+    def combiner(self, key, values):
+        yield key, Gram.merge_all(self.columns(key), values).to_list()
+
+    '''
+    Sum partials into the totals, then solve for the coefficients
+    (or read off the correlations).
+    '''
+    def reducer(self, key, values):
+        gram = Gram.merge_all(self.columns(key), values)
+
+        if key == CORRELATION_KEY:
+            r = gram.correlation()
+            names = gram.columns
+
+            d = {}
+            for i, name in enumerate(names):
+                d[name] = dict((other, None if np.isnan(r[i, j])
+                                else float(r[i, j]))
+                               for j, other in enumerate(names))
+
+            yield key, d
+            return
+
+        yield key, gram.regression(self.options.response,
+                                   split_names(self.options.predictors))
+
+
+if __name__ == '__main__':
+    MRMultipleRegression.run()
@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+
+import heapq
+import importlib
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from mrjob.compat import translate_jobconf_for_all_versions
+from mrjob.parse import parse_mr_job_stderr
+
+from instrumentation import GROUP_PREFIX, format_report
+
+'''
+Multi-core local execution engine for the MRJob classes in this repo.
+
+mrjob's inline runner runs every task of a job one after another in a
+single process. This runs the same tasks in a multiprocessing pool,
+one task per process at a time:
+
+- map: the input files are split on line boundaries by byte offset,
+  and each map task reads only its byte range of the original file
+  (no copies of the input are made). A task decodes its lines with the
+  job's protocols, runs mapper_init / mapper / mapper_final (or
+  mapper_raw, one task per input file), sorts its output by key, runs
+  the combiner if there is one, and spills the sorted run to disk.
+- shuffle: the sorted runs are merged (stably, in map task order) and
+  range-partitioned, on key boundaries, into reduce task inputs.
+- reduce: the reduce tasks run in the pool, each writing one part file
+  of the step's output, which is the next step's input.
+
+The engine reproduces the inline runner's task layout: map splits of
+(total input size) / (2 * processes) bytes per file, ending on line
+boundaries, the stable sort of reducer input by key, and reduce splits
+of (reducer input size) / (2 * processes) bytes, ending on key
+boundaries. Reduce tasks are range rather than hash partitioned for
+the same reason: a hash partition would regroup keys into different
+tasks. So with as many processes as the inline runner's --num-cores
+(by default, both use every CPU) the output holds the same records as
+the inline runner's, even for jobs that keep partials per task in
+mapper_final / reducer_final, but not always in the same order or to
+the last bit:
+
+- part files are read, and output, in part number order, while the
+  inline runner lists them in directory order, so output lines can
+  come out in another order
+- for that reason a later step of a multi-step job can get its input
+  in another order than under the inline runner, and floats summed
+  from it can differ in their last digits
+
+Tasks see the same jobconf environment as under mrjob (the job's and
+steps' jobconf, mapreduce.task.partition, mapreduce.map.input.*), and
+counters are collected from every task.
+
+Input paths must come after the job's options.
+
+Usage:
+python parallelRunner.py [-p PROCESSES] JOB.py [job options] INPUT...
+'''
+
+
+'''
+Load the MRJob class defined in a job script (e.g. summarizeStates.py),
+importing the script as a module so pool workers can find the class.
+'''
+def load_job_class(script):
+    from mrjob.job import MRJob
+
+    directory, name = os.path.split(os.path.abspath(script))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+    module = importlib.import_module(os.path.splitext(name)[0])
+
+    classes = [c for c in vars(module).values()
+               if isinstance(c, type) and issubclass(c, MRJob)
+               and c is not MRJob and c.__module__ == module.__name__]
+    if len(classes) != 1:
+        raise ValueError("Expected one MRJob class in %s" % script)
+
+    return classes[0]
+
+
+# Key of a line of internal protocol output, as Hadoop sorts it
+def line_key(line):
+    return line.split(b'\t', 1)[0]
+
+
+'''
+Byte ranges (start, length) of the map splits of a file, the way the
+inline runner splits it: a split ends before the first line that starts
+split_size or more bytes after the split's start. An empty file is one
+empty split.
+'''
+def file_splits(path, split_size):
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(0, 0)]
+
+    splits = []
+    start = 0
+
+    with open(path, 'rb') as f:
+        while start < size:
+            # the first line starting at or after start + split_size
+            f.seek(start + max(split_size, 1) - 1)
+            f.readline()
+            end = min(f.tell(), size)
+
+            splits.append((start, end - start))
+            start = end
+
+    return splits
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        left = length
+
+        while left > 0:
+            line = f.readline()
+            if not line:
+                break
+            left -= len(line)
+            yield line
+
+
+'''
+Environment variables of a task, from jobconf settings, the way mrjob
+sets them (with every Hadoop version's name for each setting).
+'''
+def task_environ(jobconf):
+    env = {}
+
+    for key, value in jobconf.items():
+        for name in translate_jobconf_for_all_versions(key):
+            env[name.replace('.', '_')] = str(value)
+
+    return env
+
+
+class Task(object):
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.counters = {}
+
+    # Run fn(job) in the task's environment, with a sandboxed job
+    def run(self, args, fn):
+        spec = self.spec
+        saved = dict(os.environ)
+
+        try:
+            os.environ.update(task_environ(spec['jobconf']))
+
+            job = spec['job_class'](args=args)
+            stderr = io.BytesIO()
+            job.sandbox(stdin=io.BytesIO(), stdout=io.BytesIO(),
+                        stderr=stderr)
+
+            result = fn(job)
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
+
+        stderr.seek(0)
+        parse_mr_job_stderr(stderr, counters=self.counters)
+
+        return result
+
+
+def sort_lines(lines, sort_values):
+    if sort_values:
+        return sorted(lines)
+    return sorted(lines, key=line_key)
+
+
+# Run one map task (and its combiner), writing its sorted output run
+def run_map_task(spec):
+    task = Task(spec)
+    step_num = spec['step_num']
+    step = spec['step']
+
+    args = spec['args']
+    if spec.get('raw'):
+        args = args + [spec['path'], spec['path']]
+
+    def mapper(job):
+        read, write = job.pick_protocols(step_num, 'mapper')
+        lines = read_range(spec['path'], spec['start'], spec['length'])
+
+        if spec.get('raw'):
+            pairs = job.map_pairs(iter(()), step_num)
+        else:
+            pairs = job.map_pairs(
+                (read(line.rstrip(b'\r\n')) for line in lines), step_num)
+
+        return [write(k, v) + b'\n' for k, v in pairs]
+
+    if 'mapper' in step:
+        output = task.run(args, mapper)
+    else:
+        output = [line if line.endswith(b'\n') else line + b'\n'
+                  for line in read_range(spec['path'], spec['start'],
+                                         spec['length'])]
+
+    if 'combiner' in step:
+        output = sort_lines(output, spec['sort_values'])
+
+        def combiner(job):
+            read, write = job.pick_protocols(step_num, 'combiner')
+            pairs = job.combine_pairs(
+                (read(line.rstrip(b'\r\n')) for line in output), step_num)
+            return [write(k, v) + b'\n' for k, v in pairs]
+
+        output = task.run(spec['args'], combiner)
+
+    if 'reducer' in step:
+        output = sort_lines(output, spec['sort_values'])
+
+    with open(spec['output'], 'wb') as f:
+        f.writelines(output)
+
+    return task.counters
+
+
+def run_reduce_task(spec):
+    task = Task(spec)
+    step_num = spec['step_num']
+
+    def reducer(job):
+        read, write = job.pick_protocols(step_num, 'reducer')
+
+        with open(spec['path'], 'rb') as f, open(spec['output'], 'wb') as out:
+            pairs = job.reduce_pairs(
+                (read(line.rstrip(b'\r\n')) for line in f), step_num)
+            for k, v in pairs:
+                out.write(write(k, v) + b'\n')
+
+    task.run(spec['args'], reducer)
+
+    return task.counters
+
+
+def add_counters(total, counters):
+    for group, names in counters.items():
+        for name, amount in names.items():
+            group_total = total.setdefault(group, {})
+            group_total[name] = group_total.get(name, 0) + amount
+
+
+class ParallelRunner(object):
+
+    def __init__(self, job_class, args, processes=None, tmp_dir=None):
+        self.job_class = job_class
+        self.job = job_class(args=list(args))
+
+        self.inputs = list(self.job.options.args)
+        if not self.inputs:
+            raise ValueError("No input paths")
+
+        args = list(args)
+        if args[len(args) - len(self.inputs):] != self.inputs:
+            raise ValueError("Input paths must come after the job's options")
+        self.args = args[:len(args) - len(self.inputs)]
+
+        self.processes = processes or self.job.options.num_cores \
+            or multiprocessing.cpu_count()
+        self.tmp_dir = tempfile.mkdtemp(prefix='parallel-', dir=tmp_dir)
+
+        self.counters = []
+        self.shuffle_bytes = [] # map output bytes sent to reducers, by step
+        self.output_paths = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+    def cleanup(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def step_dir(self, step_num, name):
+        path = os.path.join(self.tmp_dir, 'step-%03d' % step_num, name)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        return path
+
+    def run(self):
+        steps = self.job.steps()
+        paths = [os.path.abspath(p) for p in self.inputs]
+
+        ctx = multiprocessing.get_context('fork') \
+            if 'fork' in multiprocessing.get_all_start_methods() \
+            else multiprocessing
+        pool = ctx.Pool(self.processes)
+
+        try:
+            for step_num, step in enumerate(steps):
+                counters = {}
+                self.shuffle_bytes.append(0)
+                paths = self.run_step(pool, step_num, step.description(step_num),
+                                      paths, counters)
+                self.counters.append(counters)
+        finally:
+            pool.close()
+            pool.join()
+
+        self.output_paths = paths
+        return paths
+
+    def jobconf(self, step_num, desc, extra):
+        jobconf = dict(self.job.options.jobconf or {})
+        jobconf.update(desc.get('jobconf') or {})
+        jobconf.update(extra)
+        return jobconf
+
+    def run_step(self, pool, step_num, desc, paths, counters):
+        step = dict((k, True) for k in ('mapper', 'combiner', 'reducer')
+                    if k in desc)
+        # mapper_raw steps get one map task per input file
+        raw = bool(desc.get('input_manifest'))
+
+        map_dir = self.step_dir(step_num, 'map')
+        last = 'reducer' not in step
+
+        # map splits, as (path, start, length)
+        if raw:
+            splits = [(path, 0, 0) for path in paths]
+        else:
+            total = sum(os.path.getsize(p) for p in paths)
+            split_size = total // max(self.processes * 2, 1)
+            splits = [(path, start, length) for path in paths
+                      for start, length in file_splits(path, split_size)]
+
+        specs = []
+        for task_num, (path, start, length) in enumerate(splits):
+            specs.append(dict(
+                job_class=self.job_class, args=self.args, step=step,
+                step_num=step_num, raw=raw, path=path, start=start,
+                length=length, sort_values=bool(self.job.sort_values()),
+                output=os.path.join(map_dir, 'part-%05d' % task_num),
+                jobconf=self.jobconf(step_num, desc, {
+                    'mapreduce.task.partition': task_num,
+                    'mapreduce.task.ismap': 'true',
+                    'mapreduce.map.input.file': 'file://' + path,
+                    'mapreduce.map.input.start': start,
+                    'mapreduce.map.input.length': length,
+                })))
+
+        for c in pool.map(run_map_task, specs, chunksize=1):
+            add_counters(counters, c)
+
+        runs = [spec['output'] for spec in specs]
+        if last:
+            return runs
+
+        reduce_dir = self.step_dir(step_num, 'reduce')
+        inputs = self.shuffle(runs, reduce_dir)
+
+        specs = []
+        for task_num, path in enumerate(inputs):
+            specs.append(dict(
+                job_class=self.job_class, args=self.args, step_num=step_num,
+                path=path,
+                output=os.path.join(reduce_dir, 'part-%05d' % task_num),
+                jobconf=self.jobconf(step_num, desc, {
+                    'mapreduce.task.partition': task_num,
+                    'mapreduce.task.ismap': 'false',
+                })))
+
+        for c in pool.map(run_reduce_task, specs, chunksize=1):
+            add_counters(counters, c)
+
+        return [spec['output'] for spec in specs]
+
+    '''
+    Merge the sorted map output runs and split them into reduce task
+    inputs of about (total size) / (2 * processes) bytes each, never
+    splitting a key.
+    '''
+    def shuffle(self, runs, reduce_dir):
+        total = sum(os.path.getsize(run) for run in runs)
+        split_size = total // max(self.processes * 2, 1)
+        self.shuffle_bytes[-1] = total
+
+        sort_key = None if self.job.sort_values() else line_key
+
+        files = [open(run, 'rb') for run in runs]
+        inputs = []
+
+        try:
+            merged = heapq.merge(*files, key=sort_key)
+
+            out = None
+            size = 0
+            last_key = None
+
+            for line in merged:
+                key = line_key(line)
+                if out is None or (size >= split_size and key != last_key):
+                    if out is not None:
+                        out.close()
+                    inputs.append(os.path.join(
+                        reduce_dir, 'input-%05d' % len(inputs)))
+                    out = open(inputs[-1], 'wb')
+                    size = 0
+
+                out.write(line)
+                size += len(line)
+                last_key = key
+
+            if out is not None:
+                out.close()
+        finally:
+            for f in files:
+                f.close()
+
+        if not inputs:
+            # special case for no reducer input
+            inputs.append(os.path.join(reduce_dir, 'input-00000'))
+            open(inputs[0], 'wb').close()
+
+        return inputs
+
+    def cat_output(self):
+        for path in self.output_paths:
+            with open(path, 'rb') as f:
+                for line in f:
+                    yield line
+
+
+def main(argv):
+    processes = None
+    if len(argv) >= 2 and argv[0] == '-p':
+        processes = int(argv[1])
+        argv = argv[2:]
+
+    if not argv:
+        print("usage: parallelRunner.py [-p PROCESSES] JOB.py "
+              "[job options] INPUT...")
+        return 2
+
+    job_class = load_job_class(argv[0])
+
+    with ParallelRunner(job_class, argv[1:], processes) as runner:
+        runner.run()
+
+        out = getattr(sys.stdout, 'buffer', sys.stdout)
+        for line in runner.cat_output():
+            out.write(line)
+
+        for step_num, counters in enumerate(runner.counters):
+            for group in sorted(counters):
+                if group.startswith(GROUP_PREFIX):
+                    continue # in the report below
+                for name in sorted(counters[group]):
+                    sys.stderr.write("step %d: %s: %s: %d\n" % (
+                        step_num + 1, group, name, counters[group][name]))
+
+        sys.stderr.write(format_report(runner.counters))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+
+import json
+import sys
+import threading
+from collections import namedtuple
+
+from collegeReservoirSample import MRCollegeReservoirSample
+from collegeStratifiedReservoirSample import MRCollegeStratifiedReservoirSample
+from elecRegr import MRElecRegr
+from elecRsq import MRElecRsq
+from parallelRunner import ParallelRunner
+from resultCache import ResultCache, cached_output
+from electricityVariance_TwoPass_Mean import MRElecMean
+from stateRegression import MRStateRegr
+from summarizeStates import MRSummarize
+
+'''
+Run the multi-job analyses (q3.sh - q6.sh) in process, through mrjob's
+runner API.
+
+Each analysis is a dependency graph of Nodes. A node names its job
+class and input files, a function turning the job's decoded output
+into a typed result (a namedtuple), and a function building the
+jobconf settings it needs from the typed results of the nodes it
+depends on. Nodes whose dependencies are finished run concurrently,
+each in its own thread, and results are handed to downstream jobs
+directly rather than being scraped back out of printed output.
+
+The inline runner runs tasks inside the driver process and changes
+its working directory and environment while it does, so it can't run
+two jobs at once. Pipelines run on the local runner by default; with
+-r inline the nodes are run one at a time. With -r parallel each job
+runs on the multi-core engine of parallelRunner.py, whose tasks run in
+worker processes, so nodes still run concurrently.
+
+Every node is first looked up in the result cache (see resultCache.py,
+--cache-dir, default .result-cache), and only run if no earlier run
+of the same job code, options and input data is cached. --no-cache
+runs every node.
+
+Usage:
+python pipeline.py q4 [-r local|inline|parallel] [--no-cache]
+'''
+
+STATES = "Example Data/states_clean.csv"
+ELECTRICITY = "Example Data/Electricity.csv"
+COLLEGES = "Example Data/colleges_no_header.csv"
+
+# Typed job outputs
+ElecMean = namedtuple("ElecMean", "mean")
+StateSummary = namedtuple("StateSummary", "avg_pop avg_area")
+Regression = namedtuple("Regression", "slope intercept")
+ElecRegressions = namedtuple("ElecRegressions", "area pop")
+ElecRsq = namedtuple("ElecRsq", "area pop")
+
+
+class Node(object):
+
+    def __init__(self, name, job_class, inputs, extract,
+                 depends=(), jobconf=None, options=()):
+        self.name = name
+        self.job_class = job_class
+        self.inputs = list(inputs)
+        self.extract = extract
+        self.depends = list(depends)
+
+        # extra command line options for the job, e.g. ['--states', path]
+        self.options = list(options)
+
+        # maps {dependency name: result} to {jobconf key: value}
+        self.jobconf = jobconf
+
+    def args(self, results, runner):
+        args = [] if runner == 'parallel' else ['-r', runner]
+        args += self.options
+
+        if self.jobconf is not None:
+            settings = self.jobconf(results)
+            for key in sorted(settings):
+                # repr() round-trips floats exactly
+                args += ['--jobconf', '%s=%r' % (key, settings[key])]
+
+        return args + self.inputs
+
+    def make_runner(self, job, args, runner):
+        if runner == 'parallel':
+            return ParallelRunner(self.job_class, args)
+        return job.make_runner()
+
+    '''
+    Run the job (or find its output in the cache, if given), returning
+    its decoded output and typed result
+    '''
+    def run(self, results, runner, cache=None):
+        args = self.args(results, runner)
+        job = self.job_class(args=args)
+
+        lines, _ = cached_output(
+            cache, self.job_class, args,
+            lambda job, args: self.make_runner(job, args, runner), runner)
+        output = list(job.parse_output(lines))
+
+        return output, self.extract(output)
+
+
+class Pipeline(object):
+
+    def __init__(self, nodes, runner='local', cache=None):
+        self.nodes = dict((node.name, node) for node in nodes)
+        self.runner = runner
+        self.cache = cache
+
+        for node in nodes:
+            for dep in node.depends:
+                if dep not in self.nodes:
+                    raise ValueError("%s depends on unknown job %s"
+                                     % (node.name, dep))
+
+    '''
+    Run every node once all of its dependencies have finished.
+
+    Returns the typed results and the decoded job outputs, both
+    keyed by node name.
+    '''
+    def run(self):
+        results = {}
+        outputs = {}
+        errors = []
+
+        pending = dict(self.nodes)
+        running = {}
+
+        lock = threading.Lock()
+        finished = threading.Condition(lock)
+
+        def work(node, inputs):
+            try:
+                output, result = node.run(inputs, self.runner, self.cache)
+            except Exception as e:
+                output, result = None, None
+                errors.append((node.name, e))
+
+            with finished:
+                outputs[node.name] = output
+                results[node.name] = result
+                del running[node.name]
+                finished.notify()
+
+        with finished:
+            while pending or running:
+                if errors:
+                    if not running:
+                        break
+                    finished.wait()
+                    continue
+
+                ready = [node for node in pending.values()
+                         if all(dep in results for dep in node.depends)]
+
+                if not ready and not running:
+                    raise ValueError("Dependency cycle among: %s"
+                                     % ", ".join(sorted(pending)))
+
+                for node in sorted(ready, key=lambda node: node.name):
+                    if self.runner == 'inline' and running:
+                        break
+
+                    del pending[node.name]
+
+                    inputs = dict((dep, results[dep]) for dep in node.depends)
+                    t = threading.Thread(target=work, args=(node, inputs))
+                    running[node.name] = t
+                    t.start()
+
+                finished.wait()
+
+        if errors:
+            name, e = errors[0]
+            raise RuntimeError("Job %s failed: %s" % (name, e))
+
+        return results, outputs
+
+
+def output_value(output):
+    # Every job here yields exactly one (key, value) pair
+    assert(len(output) == 1)
+    return output[0][1]
+
+def extract_elec_mean(output):
+    return ElecMean(output_value(output))
+
+def extract_state_summary(output):
+    d = output_value(output)
+    return StateSummary(d["Average Pop"], d["Average Area"])
+
+def extract_state_regression(output):
+    slope, intercept = output_value(output)
+    return Regression(slope, intercept)
+
+def extract_elec_regressions(output):
+    d = output_value(output)
+    (interceptArea, slopeArea) = d["Area"]
+    (interceptPop, slopePop) = d[" Pop"]
+    return ElecRegressions(Regression(slopeArea, interceptArea),
+                           Regression(slopePop, interceptPop))
+
+def extract_elec_rsq(output):
+    d = output_value(output)
+    return ElecRsq(d["Area R^2"], d[" Pop R^2"])
+
+def extract_sample(output):
+    return [name for _, name in output]
+
+
+def q3_nodes(states=STATES):
+    return [
+        Node("summarize", MRSummarize, [states], extract_state_summary),
+        Node("regression", MRStateRegr, [states], extract_state_regression,
+             depends=["summarize"],
+             jobconf=lambda r: {
+                 "my.job.settings.areaMean": r["summarize"].avg_area,
+                 "my.job.settings.popMean": r["summarize"].avg_pop}),
+    ]
+
+def q4_nodes(electricity=ELECTRICITY, states=STATES):
+    return [
+        Node("elecMean", MRElecMean, [electricity], extract_elec_mean),
+        Node("summarize", MRSummarize, [states], extract_state_summary),
+        Node("regression", MRElecRegr, [electricity],
+             extract_elec_regressions,
+             depends=["elecMean", "summarize"],
+             options=["--states", states],
+             jobconf=lambda r: {
+                 "my.job.settings.elecMean": r["elecMean"].mean,
+                 "my.job.settings.areaMean": r["summarize"].avg_area,
+                 "my.job.settings.popMean": r["summarize"].avg_pop}),
+        Node("rsquared", MRElecRsq, [electricity], extract_elec_rsq,
+             depends=["elecMean", "regression"],
+             options=["--states", states],
+             jobconf=lambda r: {
+                 "my.job.settings.elecMean": r["elecMean"].mean,
+                 "my.job.settings.areaIntercept": r["regression"].area.intercept,
+                 "my.job.settings.areaSlope": r["regression"].area.slope,
+                 "my.job.settings.popIntercept": r["regression"].pop.intercept,
+                 "my.job.settings.popSlope": r["regression"].pop.slope}),
+    ]
+
+# The reservoir sampler needs no count of the colleges
+def q5_nodes(colleges=COLLEGES):
+    return [
+        Node("sample", MRCollegeReservoirSample, [colleges], extract_sample),
+    ]
+
+# Equal allocation across public / private, in a single pass
+def q6_nodes(colleges=COLLEGES):
+    return [
+        Node("sample", MRCollegeStratifiedReservoirSample, [colleges],
+             extract_sample,
+             options=["--strata", "pub_priv", "--allocation", "equal"]),
+    ]
+
+PIPELINES = {
+    "q3": (q3_nodes, ["regression"]),
+    "q4": (q4_nodes, ["regression", "rsquared"]),
+    "q5": (q5_nodes, ["sample"]),
+    "q6": (q6_nodes, ["sample"]),
+}
+
+
+# Print decoded output the way mrjob's JSONProtocol writes it
+def print_output(output):
+    for key, value in output:
+        print("%s\t%s" % (json.dumps(key), json.dumps(value)))
+
+def main(argv):
+    runner = 'local'
+    cache = ResultCache()
+
+    if argv[:1] and argv[0] in PIPELINES:
+        name, argv = argv[0], argv[1:]
+    else:
+        name = None
+
+    while name and argv:
+        if argv[0] == '-r' and len(argv) >= 2:
+            runner, argv = argv[1], argv[2:]
+        elif argv[0] == '--cache-dir' and len(argv) >= 2:
+            cache, argv = ResultCache(argv[1]), argv[2:]
+        elif argv[0] == '--no-cache':
+            cache, argv = None, argv[1:]
+        else:
+            name = None
+
+    if name is None:
+        print("usage: pipeline.py {%s} [-r RUNNER] [--cache-dir DIR] "
+              "[--no-cache]" % ",".join(sorted(PIPELINES)))
+        return 2
+
+    make_nodes, shown = PIPELINES[name]
+    results, outputs = Pipeline(make_nodes(), runner=runner,
+                                cache=cache).run()
+
+    for node_name in shown:
+        print_output(outputs[node_name])
+
+    if name == "q4":
+        rsq = results["rsquared"]
+        if rsq.pop > rsq.area:
+            print("The model with population as a predictor is a better fit to the electricity price data.")
+        else:
+            print("The model with area as a predictor is a better fit to the electricity price data.")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,246 @@
+import base64
+import json
+import math
+import struct
+from functools import lru_cache
+
+'''
+A compact binary internal protocol for the records shuffled between
+mappers, combiners and reducers.
+
+mrjob's default internal protocol writes values as JSON text, so a
+partial sum like 64.80250000000001 costs 17 bytes, and its key is
+repeated, as JSON, on every line. PackedProtocol keeps keys as JSON
+(Hadoop sorts and groups the shuffle by key bytes, so keys must be
+written the same way every time) and packs values into binary with the
+struct module:
+
+- flat tuples and lists of numbers (observations like (price, area,
+  pop), and the partial sums of the aggregation steps) are one record:
+  a format string, and the numbers packed by a single struct.pack
+  call, ints in the fewest bytes that hold them, floats with at most
+  two decimals (prices) as ints of hundredths, and other floats as
+  doubles
+- anything else (None, bools, strings, nested lists, dicts with string
+  keys) is tagged and packed recursively
+
+and base64 encodes the result, so lines stay free of tabs and newlines
+for Hadoop Streaming. Values decode to what JSONProtocol would give
+back: tuples as lists, exact ints and floats (including inf and nan).
+
+Usage, in a job:
+
+    INTERNAL_PROTOCOL = PackedProtocol
+'''
+
+# struct codes of ints by size, smallest first
+INT_CODES = [(1 << 7, 'b'), (1 << 15, 'h'), (1 << 31, 'i'), (1 << 63, 'q')]
+
+# struct codes of floats with at most two decimals (like prices), packed
+# as ints of hundredths, and the int codes they are packed with
+DECIMAL_CODES = [(1 << 7, 'B'), (1 << 15, 'H'), (1 << 31, 'I')]
+DECIMAL_INTS = {'B': 'b', 'H': 'h', 'I': 'i'}
+DECIMAL_SCALE = 100.0
+
+# Most numbers in a flat record
+MAX_RECORD = 255
+
+LENGTH = struct.Struct('<I')
+DOUBLE = struct.Struct('<d')
+
+
+def int_code(v):
+    for bound, code in INT_CODES:
+        if -bound <= v < bound:
+            return code
+    return None
+
+# Code of a float: a decimal code if it is exactly n / 100, else 'd'
+def float_code(v):
+    n = round(v * DECIMAL_SCALE) if abs(v) < 1e7 else None
+    if n is not None and n / DECIMAL_SCALE == v \
+            and (n or math.copysign(1.0, v) > 0): # keep -0.0
+        for bound, code in DECIMAL_CODES:
+            if -bound <= n < bound:
+                return code
+    return 'd'
+
+'''
+Codes of a flat record of numbers (or None if it isn't one), and the
+values to pack with the matching struct format: decimals as ints.
+'''
+def record_codes(values):
+    if len(values) > MAX_RECORD:
+        return None, None
+
+    codes = []
+    packed = list(values)
+
+    for i, v in enumerate(values):
+        if type(v) is int:
+            code = int_code(v)
+            if code is None:
+                return None, None
+        elif isinstance(v, float):
+            code = float_code(v)
+            if code != 'd':
+                packed[i] = int(round(v * DECIMAL_SCALE))
+        else:
+            return None, None # bools among others
+
+        codes.append(code)
+
+    return "".join(codes), packed
+
+# The Struct packing a record's codes, and the indexes of its decimals
+@lru_cache(maxsize=1024)
+def record_struct(codes):
+    fmt = '<' + "".join(DECIMAL_INTS.get(c, c) for c in codes)
+    decimals = [i for i, c in enumerate(codes) if c in DECIMAL_INTS]
+    return struct.Struct(fmt), decimals
+
+
+def pack_into(value, out):
+    t = type(value)
+
+    if value is None:
+        out.append(b'N')
+    elif t is bool:
+        out.append(b'T' if value else b'F')
+    elif t is int:
+        code = int_code(value)
+        if code is None:
+            # arbitrarily large int
+            data = value.to_bytes((value.bit_length() + 8) // 8, 'little',
+                                  signed=True)
+            out.append(b'B' + LENGTH.pack(len(data)) + data)
+        else:
+            out.append(code.encode('ascii') + struct.pack('<' + code, value))
+    elif isinstance(value, float):
+        out.append(b'd' + DOUBLE.pack(value))
+    elif t is str:
+        data = value.encode('utf-8')
+        out.append(b's' + LENGTH.pack(len(data)) + data)
+    elif isinstance(value, (list, tuple)):
+        codes, packed = record_codes(value)
+        if codes is not None:
+            out.append(b'R' + bytes([len(codes)]) + codes.encode('ascii')
+                       + record_struct(codes)[0].pack(*packed))
+        else:
+            out.append(b'l' + LENGTH.pack(len(value)))
+            for v in value:
+                pack_into(v, out)
+    elif isinstance(value, dict):
+        out.append(b'm' + LENGTH.pack(len(value)))
+        for k, v in value.items():
+            pack_into(str(k), out)
+            pack_into(v, out)
+    else:
+        raise TypeError("Can't pack %r" % (value,))
+
+def pack(value):
+    out = []
+    pack_into(value, out)
+    return b"".join(out)
+
+
+# Unpack the value at offset i of data, returning it and the next offset
+def unpack_from(data, i):
+    tag = data[i:i + 1]
+    i += 1
+
+    if tag == b'R':
+        n = data[i]
+        record, decimals = record_struct(data[i + 1:i + 1 + n].decode('ascii'))
+        i += 1 + n
+
+        values = list(record.unpack_from(data, i))
+        for j in decimals:
+            values[j] /= DECIMAL_SCALE
+
+        return values, i + record.size
+    if tag == b'd':
+        return DOUBLE.unpack_from(data, i)[0], i + 8
+    if tag in (b'b', b'h', b'i', b'q'):
+        code = '<' + tag.decode('ascii')
+        return struct.unpack_from(code, data, i)[0], i + struct.calcsize(code)
+    if tag == b'N':
+        return None, i
+    if tag == b'T':
+        return True, i
+    if tag == b'F':
+        return False, i
+    if tag == b's':
+        n, = LENGTH.unpack_from(data, i)
+        i += 4
+        return data[i:i + n].decode('utf-8'), i + n
+    if tag == b'l':
+        n, = LENGTH.unpack_from(data, i)
+        i += 4
+        values = []
+        for _ in range(n):
+            v, i = unpack_from(data, i)
+            values.append(v)
+        return values, i
+    if tag == b'm':
+        n, = LENGTH.unpack_from(data, i)
+        i += 4
+        d = {}
+        for _ in range(n):
+            k, i = unpack_from(data, i)
+            d[k], i = unpack_from(data, i)
+        return d, i
+    if tag == b'B':
+        n, = LENGTH.unpack_from(data, i)
+        i += 4
+        return int.from_bytes(data[i:i + n], 'little', signed=True), i + n
+
+    raise ValueError("Bad packed value tag %r" % tag)
+
+def unpack(data):
+    value, i = unpack_from(data, 0)
+    if i != len(data):
+        raise ValueError("Trailing bytes after packed value")
+    return value
+
+
+# Most keys each protocol remembers the JSON encoding of
+KEY_CACHE_SIZE = 10000
+
+
+class PackedProtocol(object):
+
+    def __init__(self):
+        # shuffle keys repeat a lot (bins, states), so remember the
+        # encodings of scalar keys rather than redo their JSON
+        self.decoded = {}
+        self.encoded = {}
+
+    def read(self, line):
+        raw_key, value = line.split(b'\t', 1)
+
+        key = self.decoded.get(raw_key)
+        if key is None:
+            key = json.loads(raw_key.decode('utf-8'))
+            if len(self.decoded) < KEY_CACHE_SIZE \
+                    and isinstance(key, (str, int, float)):
+                self.decoded[raw_key] = key
+
+        # restore the base64 padding write() strips
+        value += b'=' * (-len(value) % 4)
+
+        return key, unpack(base64.b64decode(value))
+
+    def write(self, key, value):
+        # by type too, as True == 1 == 1.0
+        cached = (type(key), key)
+
+        try:
+            raw_key = self.encoded[cached]
+        except (KeyError, TypeError):
+            raw_key = json.dumps(key).encode('utf-8')
+            if len(self.encoded) < KEY_CACHE_SIZE \
+                    and isinstance(key, (str, int, float)):
+                self.encoded[cached] = raw_key
+
+        return raw_key + b'\t' + base64.b64encode(pack(value)).rstrip(b'=')
@@ -0,0 +1,3 @@
+#!/usr/bin/env bash
+
+python electricityVariance_Moments.py Example\ Data/Electricity.csv
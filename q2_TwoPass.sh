@@ -1,7 +1,8 @@
 #!/usr/bin/env bash
 
-# The output of TwoPass_Mean.py is 'key mean'
-tmp=$(python electricityVariance_TwoPass_Mean.py Example\ Data/Electricity.csv)
+# The output of TwoPass_Mean.py is 'key mean'. It is run through the
+# result cache, which pipeline.py's q4 also reads the mean from.
+tmp=$(python resultCache.py run electricityVariance_TwoPass_Mean.py Example\ Data/Electricity.csv)
 
 # extract the mean
 mean=$(echo $tmp | cut -d' ' -f2)
@@ -0,0 +1,3 @@
+#!/usr/bin/env bash
+
+python stateRegression_OnePass.py Example\ Data/states_clean.csv
@@ -0,0 +1,3 @@
+#!/usr/bin/env bash
+
+python elecRegr_OnePass.py Example\ Data/Electricity.csv Example\ Data/states_clean.csv
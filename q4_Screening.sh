@@ -0,0 +1,4 @@
+#!/usr/bin/env bash
+
+# Fits and ranks both electricity price models in one job
+python modelScreening.py --states Example\ Data/states_clean.csv Example\ Data/Electricity.csv
@@ -0,0 +1,206 @@
+import math
+import random
+
+'''
+Mergeable, bounded-memory quantile sketch (KLL, Karnin, Lang and
+Liberty 2016).
+
+The sketch is a stack of compactors. Level h holds items that each
+stand for 2^h observations. When the sketch is full, the lowest level
+that is over its capacity is sorted and every other item (starting at
+a random offset) is promoted to the level above, halving its weight
+budget. Capacities shrink geometrically (by 2/3) going down from the
+top level, so the whole sketch holds O(k) items however many values
+are added, and any rank is estimated to within about 1.7 / k of the
+number of observations (e.g. +/- 1% for k = 200).
+
+Sketches built by different mappers / combiners merge by
+concatenating their levels and compacting again, so they work as a
+mapper / combiner / reducer aggregate. They travel between MapReduce
+steps as plain lists, see to_list() and from_list().
+
+The compaction offsets are the only randomness: the jobs seed each
+sketch from the task and the key (see seeds.py), so the same input
+gives the same quantiles on every run.
+'''
+
+DEFAULT_K = 200
+DECAY = 2.0 / 3.0
+
+
+class KLL(object):
+
+    def __init__(self, k=DEFAULT_K, seed=None):
+        self.k = k
+        self.random = random.Random(seed)
+
+        self.compactors = [[]]
+        self.n = 0
+        self.size = 0
+        self.max_size = self.capacity(0)
+
+    def capacity(self, h):
+        depth = len(self.compactors) - h - 1
+        return int(math.ceil(self.k * DECAY ** depth)) + 1
+
+    def grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self.capacity(h)
+                            for h in range(len(self.compactors)))
+
+    # Add a single observation
+    def add(self, x):
+        self.compactors[0].append(x)
+        self.n += 1
+        self.size += 1
+
+        if self.size >= self.max_size:
+            self.compress()
+
+    # Add an array of observations (e.g. a block of a column)
+    def add_array(self, xs):
+        xs = [float(x) for x in xs if x == x] # drop NaN (null) values
+
+        self.compactors[0].extend(xs)
+        self.n += len(xs)
+        self.size += len(xs)
+
+        while self.size >= self.max_size:
+            self.compress()
+
+    # Compact the lowest level over its capacity
+    def compress(self):
+        for h in range(len(self.compactors)):
+            level = self.compactors[h]
+
+            if len(level) >= self.capacity(h):
+                if h + 1 >= len(self.compactors):
+                    self.grow()
+
+                level.sort()
+
+                # an odd item out stays behind at this level
+                keep = level[-1:] if len(level) % 2 else []
+                pairs = level[:len(level) - len(keep)]
+
+                offset = self.random.randint(0, 1)
+                promoted = pairs[offset::2]
+
+                self.compactors[h + 1].extend(promoted)
+                self.compactors[h] = keep
+                self.size -= len(pairs) - len(promoted)
+
+                if self.size < self.max_size:
+                    return
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.grow()
+
+        for h, level in enumerate(other.compactors):
+            self.compactors[h].extend(level)
+
+        self.n += other.n
+        self.size += other.size
+
+        while self.size >= self.max_size:
+            self.compress()
+
+        return self
+
+    # (value, weight) pairs in increasing order of value
+    def weighted_items(self):
+        items = []
+        for h, level in enumerate(self.compactors):
+            weight = 2 ** h
+            items.extend((x, weight) for x in level)
+
+        items.sort()
+        return items
+
+    '''
+    Estimated q-quantile (0 <= q <= 1): the smallest retained value
+    whose estimated rank reaches q * n. None if the sketch is empty.
+    '''
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        items = self.weighted_items()
+        if not items:
+            return [None] * len(qs)
+
+        total = float(sum(w for _, w in items))
+
+        results = []
+        for q in qs:
+            target = q * total
+            cumulative = 0
+            value = items[-1][0]
+
+            for x, w in items:
+                cumulative += w
+                if cumulative >= target:
+                    value = x
+                    break
+
+            results.append(value)
+
+        return results
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def iqr(self):
+        q1, q3 = self.quantiles([0.25, 0.75])
+        return q3 - q1
+
+    def to_list(self):
+        return [self.k, self.n, self.compactors]
+
+    @classmethod
+    def from_list(cls, values, seed=None):
+        k, n, compactors = values
+
+        s = cls(k, seed=seed)
+        s.compactors = [list(level) for level in compactors]
+        s.n = n
+        s.size = sum(len(level) for level in compactors)
+        s.max_size = sum(s.capacity(h) for h in range(len(s.compactors)))
+
+        return s
+
+    # Merge an iterable of serialized sketches into one sketch
+    @classmethod
+    def merge_all(cls, values, seed=None):
+        total = None
+
+        for v in values:
+            s = cls.from_list(v, seed=seed)
+            if total is None:
+                total = s
+            else:
+                total.merge(s)
+
+        return total
+
+
+'''
+Labelled quantile statistics of a sketch for job output: the median,
+the IQR, and the given percentiles (0-100).
+'''
+def quantile_summary(sketch, label, percentiles):
+    d = {}
+
+    d["Median " + label] = sketch.median()
+    d["IQR " + label] = sketch.iqr()
+
+    values = sketch.quantiles([p / 100.0 for p in percentiles])
+    for p, value in zip(percentiles, values):
+        d["P%g %s" % (p, label)] = value
+
+    return d
+
+
+def parse_percentiles(text):
+    return [float(p) for p in text.split(',') if p]
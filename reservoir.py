@@ -0,0 +1,77 @@
+import heapq
+
+'''
+Mergeable fixed-size uniform sample (a reservoir).
+
+Every item is given an independent uniform random priority, and the
+reservoir keeps the k items with the largest priorities in a bounded
+min-heap. The k largest priorities of a union of inputs are the k
+largest of the per-input top-k's, so reservoirs built by different
+mappers / combiners merge exactly, and the final reservoir is a simple
+random sample (without replacement) of exactly k items, or of every
+item if there were fewer than k.
+
+Reservoirs travel between MapReduce steps as lists of
+[priority, item] pairs, see to_list() and from_list().
+'''
+class Reservoir(object):
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+
+    # Offer one item with its random priority
+    def add(self, priority, item):
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (priority, item))
+        elif priority > self.heap[0][0]:
+            heapq.heapreplace(self.heap, (priority, item))
+
+    def merge(self, other):
+        for priority, item in other.heap:
+            self.add(priority, item)
+
+        return self
+
+    # Sampled items, highest priority first
+    def sample(self, size=None):
+        entries = sorted(self.heap, reverse=True)
+
+        if size is not None:
+            entries = entries[:size]
+
+        return [item for _, item in entries]
+
+    def __len__(self):
+        return len(self.heap)
+
+    def to_list(self):
+        return [[priority, item] for priority, item in self.heap]
+
+    @classmethod
+    def from_list(cls, k, values):
+        r = cls(k)
+
+        for priority, item in values:
+            r.add(priority, item)
+
+        return r
+
+    # Merge an iterable of serialized reservoirs into one reservoir
+    @classmethod
+    def merge_all(cls, k, values):
+        total = cls(k)
+
+        for v in values:
+            total.merge(cls.from_list(k, v))
+
+        return total
+
+
+'''
+Seed for a task's random number generator, from the job's base seed and
+the task's partition number. Re-running a job with the same seed and
+the same input splits draws the same priorities.
+'''
+def task_seed(seed, partition):
+    return seed * 1000003 + int(partition or 0)
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import mrjob
+
+from fingerprint import file_fingerprint
+from parallelRunner import load_job_class
+
+'''
+A cache of job outputs, so that a job run again on unchanged inputs
+returns its output without being run.
+
+An entry is keyed on:
+
+- the job class, and the version of its code: the SHA-1 of the job's
+  source file and of the support modules it ships in FILES, and mrjob's
+  version
+- the job's options, including its --jobconf settings
+- how the run is partitioned: the runner, for the parallel runner its
+  number of worker processes (which sets its input splits and reduce
+  tasks; the other runners take theirs from --num-cores, one of the
+  options, so their entries are shared between machines), and the
+  jobconf of the job's steps (which holds the
+  aggregation plan of the tree-aggregation jobs, see aggregation.py).
+  Sampling jobs draw per split, and tree aggregation merges its
+  partials per bin, so their output depends on these
+- the content fingerprints (see fingerprint.py) of its input files, in
+  order, and of files passed as options (like --states), in place of
+  their paths
+
+so an entry is found again from a copy of the same data under another
+path, and never after the data, the options, the partitioning or the
+code changed. Runs reading anything but regular local files (a
+directory, a remote URI or standard input) have no fingerprint to key
+on: they are run every time, and not cached.
+
+Entries are directories under the cache directory (default
+.result-cache), holding the job's raw output and a description of the
+run. The cache keeps at most --max-bytes of output; when a new entry
+takes it over, the least recently used entries are evicted. Entries
+can also be dropped by hand: all of them, or those of one job.
+
+pipeline.py looks every node up in the cache before running it, so
+the summarizeStates.py run shared by q3 and q4, or an
+electricityVariance_TwoPass_Mean.py run already made by q2_TwoPass.sh,
+costs only the fingerprinting of its input.
+
+Usage:
+python resultCache.py run JOB.py [job options] INPUT...
+python resultCache.py list
+python resultCache.py invalidate [JOB.py]
+'''
+
+DEFAULT_DIR = ".result-cache"
+DEFAULT_MAX_BYTES = 1 << 30
+
+OUTPUT = "output"
+DESCRIPTION = "description.json"
+
+RUNNER_OPTIONS = ('-r', '--runner')
+
+
+def job_name(job_class):
+    return "%s.%s" % (job_class.__module__, job_class.__name__)
+
+'''
+SHA-1 of the job's code: its module's source and the support modules
+it ships alongside (FILES), as found next to it.
+'''
+def code_version(job_class):
+    module = sys.modules[job_class.__module__]
+    path = os.path.abspath(module.__file__)
+    directory = os.path.dirname(path)
+
+    sha = hashlib.sha1(mrjob.__version__.encode('ascii'))
+    for name in [path] + list(getattr(job_class, 'FILES', [])):
+        name = os.path.join(directory, name)
+        if os.path.isfile(name):
+            sha.update(file_fingerprint(name).encode('ascii'))
+
+    return sha.hexdigest()
+
+# The job's options, without the runner (keyed on separately)
+def job_options(args):
+    options = []
+    skip = False
+
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in RUNNER_OPTIONS:
+            skip = True
+        elif not arg.startswith('--runner='):
+            options.append(arg)
+
+    return options
+
+'''
+What a run's output depends on besides its options and data: the
+runner (by default the one the command line names), the number of
+worker processes of the parallel runner, and the steps' jobconf.
+'''
+def partitioning(job, runner=None):
+    runner = runner or job.options.runner or 'inline'
+    parts = {
+        "runner": runner,
+        "steps": [step.description(i).get('jobconf') or {}
+                  for i, step in enumerate(job.steps())],
+    }
+    # as ParallelRunner picks them
+    if runner == 'parallel':
+        parts["processes"] = \
+            job.options.num_cores or os.cpu_count() or 1
+
+    return parts
+
+# The first input of a job that is not a regular local file (standard
+# input if none are given), or None
+def unkeyed_input(job):
+    for path in job.options.args or ['-']:
+        if not os.path.isfile(path):
+            return path
+    return None
+
+'''
+Cache key of a job run with the given command line (inputs last, as
+for the parallel runner) and runner, and a description of the run.
+'''
+def job_key(job_class, args, runner=None):
+    job = job_class(args=args)
+    inputs = job.options.args
+    options = job_options(args[:len(args) - len(inputs)])
+
+    description = {
+        "job": job_name(job_class),
+        "code": code_version(job_class),
+        "options": [file_option(arg) for arg in options],
+        "partitioning": partitioning(job, runner),
+        "inputs": [file_fingerprint(path) for path in inputs],
+    }
+
+    key = hashlib.sha1(json.dumps(description, sort_keys=True)
+                       .encode('utf-8')).hexdigest()
+
+    description["command"] = options
+    description["paths"] = [os.path.abspath(path) for path in inputs]
+    return key, description
+
+# An option naming a file (like --states=PATH, or the PATH after
+# --states), with the file's fingerprint in place of its path
+def file_option(arg):
+    value = arg.split('=', 1)[-1]
+    if not os.path.isfile(value):
+        return arg
+    return arg[:len(arg) - len(value)] + "sha1:" + file_fingerprint(value)
+
+
+class ResultCache(object):
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        # pipelines look up and store from several threads
+        self.lock = threading.Lock()
+
+    def entry_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    '''
+    The cached output lines of a run, or None. A hit marks the entry as
+    just used, for eviction.
+    '''
+    def get(self, key):
+        path = os.path.join(self.entry_dir(key), OUTPUT)
+
+        with self.lock:
+            try:
+                with open(path, 'rb') as f:
+                    lines = f.readlines()
+            except IOError:
+                return None
+
+            now = time.time()
+            os.utime(path, (now, now))
+
+        return lines
+
+    # Store the output lines of a run, then evict down to the size limit
+    def put(self, key, lines, description):
+        data = b"".join(lines)
+        if len(data) > self.max_bytes:
+            return
+
+        with self.lock:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+
+            # written aside and moved into place, so readers never see
+            # a partial entry
+            tmp = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+            with open(os.path.join(tmp, OUTPUT), 'wb') as f:
+                f.write(data)
+
+            description = dict(description, bytes=len(data),
+                               created=time.time())
+            with open(os.path.join(tmp, DESCRIPTION), 'w') as f:
+                json.dump(description, f, indent=1, sort_keys=True)
+
+            target = self.entry_dir(key)
+            if os.path.isdir(target):
+                shutil.rmtree(target, ignore_errors=True)
+            os.rename(tmp, target)
+
+            self.evict()
+
+    # Entries as (last used, bytes, key), least recently used first
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+
+        entries = []
+        for key in os.listdir(self.directory):
+            path = os.path.join(self.directory, key, OUTPUT)
+            if key.startswith('.') or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, key))
+
+        return sorted(entries)
+
+    def description(self, key):
+        with open(os.path.join(self.entry_dir(key), DESCRIPTION)) as f:
+            return json.load(f)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            total -= size
+
+    '''
+    Drop every entry, or only those of one job class. Returns the
+    number of entries dropped.
+    '''
+    def invalidate(self, job_class=None):
+        dropped = 0
+
+        with self.lock:
+            for _, _, key in self.entries():
+                if job_class is not None and \
+                        self.description(key)["job"] != job_name(job_class):
+                    continue
+                shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+                dropped += 1
+
+        return dropped
+
+
+'''
+Run a job through the cache: return its cached output lines, or run it
+(with runner_for(job, args) giving its runner, named by runner if not
+by args) and cache its output. Also returns whether the output came
+from the cache.
+'''
+def cached_output(cache, job_class, args, runner_for, runner=None):
+    if cache is not None:
+        path = unkeyed_input(job_class(args=args))
+        if path is not None:
+            sys.stderr.write("Not caching %s: %s is not a local file\n"
+                             % (job_name(job_class), path))
+            cache = None
+
+    if cache is not None:
+        key, description = job_key(job_class, args, runner)
+        lines = cache.get(key)
+        if lines is not None:
+            return lines, True
+
+    job = job_class(args=args)
+    with runner_for(job, args) as r:
+        r.run()
+        lines = list(r.cat_output())
+
+    if cache is not None:
+        cache.put(key, lines, description)
+
+    return lines, False
+
+
+def main(argv):
+    directory = DEFAULT_DIR
+    max_bytes = DEFAULT_MAX_BYTES
+
+    while argv[:1] in (['--cache-dir'], ['--max-bytes']):
+        if argv[0] == '--cache-dir':
+            directory = argv[1]
+        else:
+            max_bytes = int(argv[1])
+        argv = argv[2:]
+
+    cache = ResultCache(directory, max_bytes)
+    command = argv[0] if argv else None
+
+    if command == 'run' and len(argv) >= 2:
+        job_class = load_job_class(argv[1])
+
+        lines, hit = cached_output(cache, job_class, argv[2:],
+                                   lambda job, args: job.make_runner())
+
+        out = getattr(sys.stdout, 'buffer', sys.stdout)
+        for line in lines:
+            out.write(line)
+
+        if hit:
+            sys.stderr.write("Output of %s from the cache\n" % argv[1])
+        return 0
+
+    if command == 'list':
+        for used, size, key in cache.entries():
+            d = cache.description(key)
+            print("%s %10d %s %s %s" % (
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(used)),
+                size, d["job"], " ".join(d["command"]),
+                " ".join(d["paths"])))
+        return 0
+
+    if command == 'invalidate' and len(argv) <= 2:
+        job_class = load_job_class(argv[1]) if len(argv) == 2 else None
+        print("Dropped %d entries" % cache.invalidate(job_class))
+        return 0
+
+    print("usage: resultCache.py [--cache-dir DIR] [--max-bytes N] "
+          "{run JOB.py [job options] INPUT... | list | invalidate [JOB.py]}")
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+
+from mrjob.compat import jobconf_from_env
+
+'''
+Seeds for the random number generators of tasks.
+
+Randomized accumulators (bootstrap weights, sketch compactions) are
+only correct if every row gets its own independent draws, so no two
+tasks whose accumulators are merged may share a seed. A task's seed is
+derived from the job's base seed and from what the task reads:
+
+- a map task: its input split, by the input's full URI (local paths
+  made absolute) and the split's start offset
+  (mapreduce.map.input.file and mapreduce.map.input.start), so the same
+  rows draw the same values whatever task number the split is given,
+  and different splits, even of files with the same name in different
+  directories, never share draws
+- any other task: its partition number (mapreduce.task.partition)
+
+and from the delta index checkpoint.py gives each of its runs over new
+bytes (DELTA_SETTING): the new bytes of a run are read from fresh copies
+named like the last run's, and their draws must not repeat those of the
+rows already in the checkpoint. Further values the caller mixes in
+(like a key) are added last. Re-running a job with the same seed on the
+same splits draws the same values.
+'''
+
+DELTA_SETTING = "my.job.settings.delta"
+
+LOCAL_PREFIX = "file://"
+
+
+# An input URI in one form: local paths absolute and normalized
+def normalize_uri(uri):
+    if uri.startswith(LOCAL_PREFIX):
+        uri = uri[len(LOCAL_PREFIX):]
+    elif "://" in uri:
+        return uri
+    return LOCAL_PREFIX + os.path.abspath(uri)
+
+def split_identity():
+    uri = jobconf_from_env("mapreduce.map.input.file")
+
+    if uri and jobconf_from_env("mapreduce.task.ismap") == "true":
+        return ["split", normalize_uri(uri),
+                int(jobconf_from_env("mapreduce.map.input.start", "0"))]
+
+    return ["task", int(jobconf_from_env("mapreduce.task.partition", "0"))]
+
+# A 64 bit seed for the current task
+def task_seed(seed, *extra):
+    delta = int(jobconf_from_env(DELTA_SETTING, "0"))
+    text = json.dumps([seed, split_identity(), delta] + list(extra))
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:16], 16)
@@ -0,0 +1,325 @@
+import base64
+import hashlib
+import math
+
+import numpy as np
+
+'''
+Mergeable sketches for counting the values of a (possibly high
+cardinality) column.
+
+HyperLogLog estimates the number of distinct values, Count-Min
+estimates how often each value occurs, and GroupCounter counts values
+exactly until there are too many distinct ones to keep, then switches
+over to the two sketches plus a bounded set of heavy-hitter candidates.
+All of them have a fixed size whatever the number of rows, and merge
+exactly (register-wise max, cell-wise sum), so they work as a mapper /
+combiner / reducer aggregate.
+
+Sketches travel between MapReduce steps as plain lists, see to_list()
+and from_list().
+'''
+
+DEFAULT_PRECISION = 12
+DEFAULT_WIDTH = 1024
+DEFAULT_DEPTH = 4
+DEFAULT_EXACT_LIMIT = 1000
+DEFAULT_TOP = 20
+
+# Mersenne prime 2^61 - 1, for the Count-Min row hashes
+PRIME = (1 << 61) - 1
+
+
+# Two independent 64 bit hashes of a value, the same in every process
+def hash_value(value):
+    digest = hashlib.sha1(str(value).encode('utf-8')).digest()
+
+    return (int.from_bytes(digest[:8], 'big'),
+            int.from_bytes(digest[8:16], 'big'))
+
+
+'''
+Distinct count estimate (Flajolet et al. 2007) with 2^p registers,
+with a relative standard error of about 1.04 / sqrt(2^p) (1.6% for
+p = 12).
+'''
+class HyperLogLog(object):
+
+    def __init__(self, p=DEFAULT_PRECISION):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    # Register index and rank (position of the first 1 bit) of a hash
+    def position(self, h):
+        rest = h & ((1 << (64 - self.p)) - 1)
+
+        return h >> (64 - self.p), (64 - self.p) - rest.bit_length() + 1
+
+    def add_hashes(self, hashes):
+        if not hashes:
+            return
+
+        index, rank = zip(*[self.position(h) for h in hashes])
+        np.maximum.at(self.registers, list(index), list(rank))
+
+    def add(self, value):
+        self.add_hashes([hash_value(value)[0]])
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+        return self
+
+    def count(self):
+        m = float(self.m)
+        alpha = 0.7213 / (1 + 1.079 / m)
+
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(float))
+
+        # small range correction: linear counting of the empty registers
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def to_list(self):
+        return [self.p,
+                base64.b64encode(self.registers.tobytes()).decode('ascii')]
+
+    @classmethod
+    def from_list(cls, values):
+        p, registers = values
+
+        h = cls(p)
+        h.registers = np.frombuffer(base64.b64decode(registers),
+                                    dtype=np.uint8).copy()
+
+        return h
+
+
+'''
+Frequency estimates (Cormode and Muthukrishnan 2005) from a depth x
+width table of counters. An estimate is never below the true count,
+and exceeds it by more than e / width of the total count with
+probability at most exp(-depth).
+'''
+class CountMinSketch(object):
+
+    def __init__(self, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.rows = np.arange(depth)
+
+    # One cell per row, by double hashing modulo a prime
+    def cells(self, hashes):
+        h1, h2 = hashes
+        return [((h1 + i * h2) % PRIME) % self.width
+                for i in range(self.depth)]
+
+    # Add counts for many values at once, given their cells
+    def add_cells(self, cells, counts):
+        cells = np.asarray(cells).reshape(-1, self.depth)
+        for i in range(self.depth):
+            np.add.at(self.table[i], cells[:, i], counts)
+
+    # Estimated counts for many values at once, given their cells
+    def estimate_cells(self, cells):
+        cells = np.asarray(cells).reshape(-1, self.depth)
+        return self.table[self.rows, cells].min(axis=1)
+
+    def add(self, value, count=1):
+        self.add_cells([self.cells(hash_value(value))], [count])
+
+    def estimate(self, value):
+        return int(self.estimate_cells([self.cells(hash_value(value))])[0])
+
+    def merge(self, other):
+        self.table += other.table
+
+        return self
+
+    def to_list(self):
+        return [self.width, self.depth, self.table.tolist()]
+
+    @classmethod
+    def from_list(cls, values):
+        width, depth, table = values
+
+        c = cls(width, depth)
+        c.table = np.array(table, dtype=np.int64).reshape(depth, width)
+
+        return c
+
+
+'''
+Counts of the values of a column.
+
+Counts exactly in a dict while there are at most exact_limit distinct
+values. Past that it folds the dict into a HyperLogLog and a Count-Min
+sketch, and from then on keeps only those and the top (at most 2 *
+top) most frequent values seen so far as heavy-hitter candidates, so
+its size stays fixed however many distinct values there are. Counts
+and the distinct count are then estimates.
+
+In sketch mode new values are first counted in a pending dict of up to
+exact_limit values, then hashed into the sketches a batch at a time.
+'''
+class GroupCounter(object):
+
+    def __init__(self, exact_limit=DEFAULT_EXACT_LIMIT, top=DEFAULT_TOP,
+                 p=DEFAULT_PRECISION, width=DEFAULT_WIDTH,
+                 depth=DEFAULT_DEPTH):
+        self.exact_limit = exact_limit
+        self.top = top
+        self.p = p
+        self.width = width
+        self.depth = depth
+
+        self.n = 0
+        self.counts = {}
+        self.pending = {}
+
+        self.hll = None
+        self.cms = None
+
+    @property
+    def exact(self):
+        return self.hll is None
+
+    def add(self, value, count=1):
+        self.n += count
+
+        if self.exact:
+            self.counts[value] = self.counts.get(value, 0) + count
+            if len(self.counts) > self.exact_limit:
+                self.switch()
+            return
+
+        self.pending[value] = self.pending.get(value, 0) + count
+        if len(self.pending) >= self.exact_limit:
+            self.flush()
+
+    # Fold the exact counts into the sketches
+    def switch(self):
+        self.hll = HyperLogLog(self.p)
+        self.cms = CountMinSketch(self.width, self.depth)
+
+        self.pending = self.counts
+        self.counts = {}
+        self.flush()
+
+    # Hash the pending counts into the sketches, and update the candidates
+    def flush(self):
+        if not self.pending:
+            return
+
+        values = list(self.pending)
+        hashes = [hash_value(v) for v in values]
+        cells = [self.cms.cells(h) for h in hashes]
+
+        self.hll.add_hashes([h1 for h1, _ in hashes])
+        self.cms.add_cells(cells, [self.pending[v] for v in values])
+
+        for value, estimate in zip(values, self.cms.estimate_cells(cells)):
+            self.counts[value] = int(estimate)
+
+        self.pending = {}
+        self.prune()
+
+    # Re-estimate the candidates against the sketch, keeping the top ones
+    def prune(self):
+        values = list(self.counts)
+        cells = [self.cms.cells(hash_value(v)) for v in values]
+        estimates = self.cms.estimate_cells(cells)
+
+        ranked = sorted(zip(values, estimates), key=lambda kv: -kv[1])
+        self.counts = dict((v, int(c)) for v, c in ranked[:2 * self.top])
+
+    def merge(self, other):
+        other.flush_all()
+
+        if self.exact and other.exact:
+            self.n += other.n
+            for value, count in other.counts.items():
+                self.counts[value] = self.counts.get(value, 0) + count
+            if len(self.counts) > self.exact_limit:
+                self.switch()
+            return self
+
+        if self.exact:
+            self.switch()
+
+        self.n += other.n
+
+        if other.exact:
+            self.pending = other.counts.copy()
+            self.flush()
+        else:
+            self.flush()
+            self.hll.merge(other.hll)
+            self.cms.merge(other.cms)
+            self.counts.update(other.counts)
+            self.prune()
+
+        return self
+
+    # Bring the sketches up to date with every value added so far
+    def flush_all(self):
+        if not self.exact:
+            self.flush()
+
+    def distinct(self):
+        self.flush_all()
+
+        if self.exact:
+            return len(self.counts)
+        return self.hll.count()
+
+    # Values and their counts, most frequent first (at most top if given)
+    def most_common(self, top=None):
+        self.flush_all()
+
+        ranked = sorted(self.counts.items(),
+                        key=lambda kv: (-kv[1], str(kv[0])))
+
+        if not self.exact:
+            top = self.top if top is None else min(top, self.top)
+        if top is not None:
+            ranked = ranked[:top]
+
+        return ranked
+
+    def to_list(self):
+        self.flush_all()
+
+        sketches = None if self.exact else [self.hll.to_list(),
+                                            self.cms.to_list()]
+
+        return [self.n, [[v, c] for v, c in self.counts.items()], sketches]
+
+    @classmethod
+    def from_list(cls, values, **options):
+        n, counts, sketches = values
+
+        g = cls(**options)
+        g.n = n
+        g.counts = dict((v, c) for v, c in counts)
+
+        if sketches is not None:
+            g.hll = HyperLogLog.from_list(sketches[0])
+            g.cms = CountMinSketch.from_list(sketches[1])
+
+        return g
+
+    # Merge an iterable of serialized counters into one counter
+    @classmethod
+    def merge_all(cls, values, **options):
+        total = cls(**options)
+
+        for v in values:
+            total.merge(cls.from_list(v, **options))
+
+        return total
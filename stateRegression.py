@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
-from mrjob.step import MRStep
+from instrumentation import InstrumentedJob
+from protocols import PackedProtocol
+from summation import ExactSum, product, total
 from mrjob.compat import jobconf_from_env
-import numpy as np
+from schema import STATES
+from aggregation import add_aggregation_args, job_plan, record_bin, \
+    tree_steps
 
 '''
 Use linear regression to fit the following simple model:
@@ -22,71 +25,82 @@ Reads in a csv file with columns:
 Name, Abbreviation (Long), 2-Letter Abbreviation,
 Area (Sq. Miles), Population.
 
+The partial sums of the regression are merged by a tree of
+reducers, shaped by the aggregation planner (see aggregation.py) from
+the input size, --fan-in and --parallelism.
+
 Outputs the slope and intercept for a simple
 linear regression of population on area.
 '''
-class MRStateRegr(MRJob):
-        
+
+parse_state = STATES.parser(["area", "pop"])
+
+class MRStateRegr(InstrumentedJob):
+
+    FILES = ['schema.py', 'aggregation.py', 'instrumentation.py',
+             'protocols.py', 'summation.py']
+
+    # binary values in the shuffle, see protocols.py
+    INTERNAL_PROTOCOL = PackedProtocol
+
+    def configure_args(self):
+        super(MRStateRegr, self).configure_args()
+        add_aggregation_args(self)
+
     def steps(self):
-        return [
-            MRStep(mapper=self.mapper,
-                   reducer_init=self.reducer_init,
-                   reducer=self.reducer_first),
-            MRStep(reducer_init=self.reducer_init,
-                   reducer=self.reducer_second)
-        ]
-    
-    # Use random binning
-    def mapper(self, _, line):
-        NUMBER_OF_FIRST_REDUCERS = 10
-        
-        name, abr_long, abr, area, pop = line.split(',')
-        
-        area = int(area)
-        pop = int(pop)
-        
-        yield np.random.randint(0, NUMBER_OF_FIRST_REDUCERS), (pop, area)
-        
+        self.plan = job_plan(self)
+
+        return tree_steps(self.plan,
+                          dict(mapper_init=self.load_means,
+                               mapper=self.mapper),
+                          self.merge_partials, self.reducer_final)
+
     # Load mean of response and predictor
-    def reducer_init(self):
+    def load_means(self):
         self.yMean = jobconf_from_env("my.job.settings.popMean")
         self.xMean = jobconf_from_env("my.job.settings.areaMean")
         
         self.yMean = float(self.yMean)
         self.xMean = float(self.xMean)
-        
+
     '''
-    Calculate partial means
+    Emit each state's terms of the sums, binned by the
+    aggregation plan
     '''
-    def reducer_first(self, key, values):
-        
-        # both scaled by n
-        partialCov = 0
-        partialVar = 0
-        
-        for y, x in values:
-            normalizedX = (x - self.xMean)
-            normalizedY = (y - self.yMean)
-            
-            partialCov += normalizedX * normalizedY
-            partialVar += normalizedX ** 2
-        
-        yield "_", (partialCov, partialVar)
+    def mapper(self, _, line):
+        area, pop = parse_state(line)
+
+        normalizedX = (area - self.xMean)
+        normalizedY = (pop - self.yMean)
+
+        # both scaled by n, as exact products
+        yield record_bin(self.plan, line), \
+            (product(normalizedX, normalizedY),
+             product(normalizedX, normalizedX))
         
     '''
-    Combine partials into total.
-    
-    Then use totals to compute OLS estimates.
+    Combine partials into a larger partial, summing exactly
+    (see summation.py)
     '''
-    def reducer_second(self, key, values):
+    def merge_partials(self, values):
 
         # both scaled by n
-        totalCov = 0
-        totalVar = 0
+        totalCov = ExactSum()
+        totalVar = ExactSum()
         
         for partialCov, partialVar in values:
-            totalCov += partialCov
-            totalVar += partialVar
+            totalCov.add_value(partialCov)
+            totalVar.add_value(partialVar)
+
+        return totalCov.value(), totalVar.value()
+        
+    '''
+    Use totals to compute OLS estimates.
+    '''
+    def reducer_final(self, totals):
+        self.load_means()
+
+        totalCov, totalVar = [total(t) for t in totals]
             
         slope = totalCov / totalVar
         
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+from instrumentation import InstrumentedJob
+from mrjob.step import MRStep
+from comoments import CoMoments
+from schema import STATES
+from blocks import BlockBuffer, parse_block
+from columnar import open_input, chunks
+from bootstrap import BootstrapCoMoments, task_rng, DEFAULT_CONFIDENCE
+
+'''
+Use linear regression to fit the following simple model:
+
+Population = Area * <alpha> + <beta>
+
+in a single pass of the data.
+
+stateRegression.py needs the mean population and area from an earlier
+summarizeStates.py run. Here every mapper instead folds its states into
+a CoMoments accumulator (count, means, and co-moments of area and
+population), combiners and the reducer merge the partial accumulators,
+and the regression is read off the merged co-moments.
+
+Reads in a csv file with columns:
+Name, Abbreviation (Long), 2-Letter Abbreviation,
+Area (Sq. Miles), Population.
+
+With --block-size the mappers parse their lines in blocks into NumPy
+arrays and emit one vectorized partial per block instead. With
+--columnar each mapper reads its whole input file as memory-mapped
+area and population columns from the columnar cache (see columnar.py).
+
+Outputs the slope, intercept, R^2, their standard errors and the
+residual variance of a simple linear regression of population on area.
+
+With --bootstrap-replicates B the mappers also weight every state by B
+Poisson(1) draws and keep weighted co-moments per replicate (see
+bootstrap.py), and the reducer outputs percentile confidence intervals
+(--confidence) of the slope, intercept and R^2, from the same pass.
+
+With --emit-state the reducer outputs the merged co-moments instead,
+which checkpoint.py keeps between runs to update the regression from
+new states only.
+'''
+
+parse_state = STATES.parser(["area", "pop"])
+
+KEY = "Population ~ Area"
+BOOTSTRAP_KEY = KEY + " Bootstrap"
+
+class MRStateRegrOnePass(InstrumentedJob):
+
+    FILES = ['comoments.py', 'schema.py', 'blocks.py', 'columnar.py',
+             'fingerprint.py', 'instrumentation.py', 'bootstrap.py',
+             'seeds.py']
+
+    def configure_args(self):
+        super(MRStateRegrOnePass, self).configure_args()
+        self.add_passthru_arg(
+            '--block-size', type=int, default=0,
+            help='Parse and accumulate input in vectorized blocks of this '
+                 'many lines (0 for one line at a time)')
+        self.add_passthru_arg(
+            '--columnar', action='store_true', default=False,
+            help='Read typed columns from the memory-mapped columnar cache')
+        self.add_passthru_arg(
+            '--columnar-cache', default=None,
+            help='Columnar cache directory (default: .columnar next to '
+                 'each input file)')
+        self.add_passthru_arg(
+            '--bootstrap-replicates', type=int, default=0,
+            help='Also compute confidence intervals from this many Poisson '
+                 'bootstrap replicates (0 for none)')
+        self.add_passthru_arg(
+            '--bootstrap-seed', type=int, default=0,
+            help='Base seed of the bootstrap weights')
+        self.add_passthru_arg(
+            '--confidence', type=float, default=DEFAULT_CONFIDENCE,
+            help='Confidence level of the bootstrap intervals')
+        self.add_passthru_arg(
+            '--emit-state', action='store_true', default=False,
+            help='Output the merged accumulators instead of the statistics, '
+                 'for checkpoint.py')
+
+    def steps(self):
+        if self.options.columnar:
+            return [MRStep(mapper_raw=self.mapper_columnar,
+                           combiner=self.combiner,
+                           reducer=self.reducer)]
+
+        return [MRStep(mapper_init=self.mapper_init,
+                       mapper=self.mapper,
+                       mapper_final=self.mapper_final,
+                       combiner=self.combiner,
+                       reducer=self.reducer)]
+
+    def mapper_init(self):
+        self.comoments = CoMoments()
+        self.block = BlockBuffer(self.options.block_size)
+
+        self.bootstrap = None
+        if self.options.bootstrap_replicates:
+            self.bootstrap = BootstrapCoMoments(
+                self.options.bootstrap_replicates,
+                task_rng(self.options.bootstrap_seed))
+
+    def mapper(self, _, line):
+
+        if self.options.block_size:
+            if self.block.add(line):
+                yield KEY, self.block_partial()
+            return
+
+        area, pop = parse_state(line)
+
+        self.comoments.add(area, pop)
+
+        if self.bootstrap is not None:
+            self.bootstrap.add(area, pop)
+
+    # Co-moments of a whole block of lines, computed with NumPy
+    def block_partial(self):
+        area, pop = parse_block(STATES, ["area", "pop"], self.block.take())
+
+        if self.bootstrap is not None:
+            self.bootstrap.add_arrays(area, pop)
+
+        return CoMoments.from_arrays(area, pop).to_list()
+
+    # Co-moments of a whole input file, from its memory-mapped columns
+    def mapper_columnar(self, input_path, input_uri):
+        table = open_input(input_path, input_uri, STATES,
+                           self.options.columnar_cache)
+        area = table.column("area")
+        pop = table.column("pop")
+
+        self.mapper_init()
+
+        for start, stop in chunks(table.rows):
+            self.comoments.merge(CoMoments.from_arrays(area[start:stop],
+                                                       pop[start:stop]))
+
+            if self.bootstrap is not None:
+                self.bootstrap.add_arrays(area[start:stop], pop[start:stop])
+
+        for k, v in self.mapper_final():
+            yield k, v
+
+    # Emit one partial accumulator per map task (or final block)
+    def mapper_final(self):
+        if len(self.block) > 0:
+            yield KEY, self.block_partial()
+        if self.comoments.n > 0:
+            yield KEY, self.comoments.to_list()
+        if self.bootstrap is not None:
+            self.bootstrap.flush()
+            if self.bootstrap.n.any():
+                yield BOOTSTRAP_KEY, self.bootstrap.to_list()
+
+    '''
+    Merge partial accumulators (or bootstrap replicates)
+    '''
+    def combiner(self, key, values):
+        if key == BOOTSTRAP_KEY:
+            yield key, BootstrapCoMoments.merge_all(values).to_list()
+            return
+
+        yield key, CoMoments.merge_all(values).to_list()
+
+    '''
+    Merge partials into the total.
+
+    Then use totals to compute OLS estimates.
+    '''
+    def reducer(self, key, values):
+        if self.options.emit_state:
+            for k, v in self.combiner(key, values):
+                yield k, v
+            return
+
+        if key == BOOTSTRAP_KEY:
+            yield key, BootstrapCoMoments.merge_all(values).intervals(
+                self.options.confidence)
+            return
+
+        yield key, CoMoments.merge_all(values).regression()
+
+
+if __name__ == '__main__':
+    MRStateRegrOnePass.run()
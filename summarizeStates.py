@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 
-from mrjob.job import MRJob
-import numpy as np
+from instrumentation import InstrumentedJob
+from mrjob.step import MRStep
+from summary import Summary
+from schema import STATES
+from blocks import BlockBuffer, parse_block
+from columnar import open_input, chunks
+from quantiles import KLL, DEFAULT_K, quantile_summary, parse_percentiles
+from seeds import task_seed
 
 '''
 Calculate the largest, smallest, and average (mean) population for a state. Calculate the
@@ -9,64 +15,203 @@ largest, smallest, and average (mean) area for a state.
 
 Assumes a csv file input, with columns
 Name, Abbreviation (Long), 2-Letter Abbreviation, Area (Sq. Miles), Population
+
+Each state becomes a one row Summary record (count, sum, min/argmin,
+max/argmax of pop and area). Combiners merge the records of each map
+task, so the reducer only merges one small partial per task rather
+than looping over every state. With --in-mapper-combine the mapper
+merges its own rows and emits a single partial when it finishes, and
+with --block-size it parses blocks of lines into NumPy arrays and
+emits one vectorized partial per block. With --columnar each mapper
+reads its whole input file as memory-mapped columns from the columnar
+cache (see columnar.py) instead of parsing text.
+
+With --quantiles every mapper also feeds pop and area into KLL quantile
+sketches, emitted under their own key and merged by the combiners and
+reducer, which output the median, IQR and --percentiles of both.
+
+With --emit-state the reducer outputs the merged summaries (and
+sketches) instead, which checkpoint.py keeps between runs to update
+the statistics from new rows only.
 '''
-class MRSummarize(MRJob):
+
+COLUMNS = ["pop", "area"]
+
+QUANTILE_KEY = "states quantiles"
+QUANTILE_LABELS = ["Pop", "Area"]
+
+parse_state = STATES.parser(["abr", "pop", "area"])
+
+class MRSummarize(InstrumentedJob):
+
+    FILES = ['summary.py', 'schema.py', 'blocks.py', 'columnar.py',
+             'fingerprint.py', 'quantiles.py', 'instrumentation.py',
+             'seeds.py']
+
+    def configure_args(self):
+        super(MRSummarize, self).configure_args()
+        self.add_passthru_arg(
+            '--in-mapper-combine', action='store_true', default=False,
+            help='Merge rows inside each mapper, emitting one partial per task')
+        self.add_passthru_arg(
+            '--block-size', type=int, default=0,
+            help='Parse and accumulate input in vectorized blocks of this '
+                 'many lines (0 for one line at a time)')
+        self.add_passthru_arg(
+            '--columnar', action='store_true', default=False,
+            help='Read typed columns from the memory-mapped columnar cache')
+        self.add_passthru_arg(
+            '--columnar-cache', default=None,
+            help='Columnar cache directory (default: .columnar next to '
+                 'each input file)')
+        self.add_passthru_arg(
+            '--quantiles', action='store_true', default=False,
+            help='Also estimate medians, IQRs and percentiles with a '
+                 'quantile sketch')
+        self.add_passthru_arg(
+            '--percentiles', default='5,25,75,95',
+            help='Comma separated percentiles to report with --quantiles')
+        self.add_passthru_arg(
+            '--quantile-k', type=int, default=DEFAULT_K,
+            help='Quantile sketch size; rank error is about 1.7 / k')
+        self.add_passthru_arg(
+            '--emit-state', action='store_true', default=False,
+            help='Output the merged accumulators instead of the statistics, '
+                 'for checkpoint.py')
+
+    def steps(self):
+        if self.options.columnar:
+            return [MRStep(mapper_raw=self.mapper_columnar,
+                           combiner=self.combiner,
+                           reducer=self.reducer)]
+
+        return [MRStep(mapper_init=self.mapper_init,
+                       mapper=self.mapper,
+                       mapper_final=self.mapper_final,
+                       combiner=self.combiner,
+                       reducer=self.reducer)]
+
+    def mapper_init(self):
+        self.summary = Summary(COLUMNS)
+        self.block = BlockBuffer(self.options.block_size)
+
+        self.sketches = [KLL(self.options.quantile_k,
+                             seed=task_seed(0, QUANTILE_KEY, column))
+                         for column in COLUMNS]
 
     def mapper(self, _, line):
-        name, abr_long, abr, area, pop = line.split(',')
-        
-        area = int(area)
-        pop = int(pop)
-        
-        yield "states", (abr, pop, area)
-        
+        if self.options.block_size:
+            if self.block.add(line):
+                yield "states", self.block_partial()
+            return
+
+        abr, pop, area = parse_state(line)
+
+        if self.options.quantiles:
+            self.sketches[0].add(pop)
+            self.sketches[1].add(area)
+
+        if self.options.in_mapper_combine:
+            self.summary.add(abr, (pop, area))
+        else:
+            row = Summary(COLUMNS)
+            row.add(abr, (pop, area))
+
+            yield "states", row.to_list()
+
+    # Summary of a whole block of lines, computed with NumPy
+    def block_partial(self):
+        abr, pop, area = parse_block(STATES, ["abr", "pop", "area"],
+                                     self.block.take())
+
+        summary = Summary(COLUMNS)
+        summary.add_block(abr, [pop, area])
+
+        if self.options.quantiles:
+            self.sketches[0].add_array(pop)
+            self.sketches[1].add_array(area)
+
+        return summary.to_list()
+
+    # Summary of a whole input file, from its memory-mapped columns
+    def mapper_columnar(self, input_path, input_uri):
+        table = open_input(input_path, input_uri, STATES,
+                           self.options.columnar_cache)
+        pop = table.column("pop")
+        area = table.column("area")
+
+        self.mapper_init()
+
+        for start, stop in chunks(table.rows):
+            self.summary.add_block(table.strings("abr", start, stop),
+                                   [pop[start:stop], area[start:stop]])
+
+            if self.options.quantiles:
+                self.sketches[0].add_array(pop[start:stop])
+                self.sketches[1].add_array(area[start:stop])
+
+        for k, v in self.mapper_final():
+            yield k, v
+
+    def mapper_final(self):
+        if len(self.block) > 0:
+            yield "states", self.block_partial()
+        if self.summary.n > 0:
+            yield "states", self.summary.to_list()
+        if self.options.quantiles and self.sketches[0].n > 0:
+            yield QUANTILE_KEY, [s.to_list() for s in self.sketches]
+
+    # Merge partial [pop, area] sketch pairs column by column
+    def merge_sketches(self, values):
+        return [KLL.merge_all(sketches,
+                              seed=task_seed(0, QUANTILE_KEY, column))
+                for column, sketches in zip(COLUMNS, zip(*values))]
+
+    '''
+    Merge partial summaries (or quantile sketches)
+    '''
+    def combiner(self, key, values):
+        if key == QUANTILE_KEY:
+            yield key, [s.to_list() for s in self.merge_sketches(values)]
+            return
+
+        yield key, Summary.merge_all(COLUMNS, values).to_list()
+
     def reducer(self, key, values):
-        nValues = 0
-        totalPop = 0
-        totalArea = 0
-        
-        maxPop = -1
-        maxPopName = ""
-        maxArea = -1
-        maxAreaName = ""
-        
-        minPop = np.inf
-        minPopName = ""
-        minArea = np.inf
-        minAreaName = ""
-        
-        # this for-loop goes until all mappers finish
-        for name, pop, area in values:
-            totalPop += pop
-            totalArea += area
-            nValues += 1
-            
-            if pop > maxPop:
-                maxPop = pop
-                maxPopName = name
-            if area > maxArea:
-                maxArea = area
-                maxAreaName = name
-            
-            if pop < minPop:
-                minPop = pop
-                minPopName = name
-            if area < minArea:
-                minArea = area
-                minAreaName = name
-            
-        avgPop = round(float(totalPop) / nValues, 2)
-        avgArea = round(float(totalArea) / nValues, 2)
-        
+        if self.options.emit_state:
+            for k, v in self.combiner(key, values):
+                yield k, v
+            return
+
+        if key == QUANTILE_KEY:
+            percentiles = parse_percentiles(self.options.percentiles)
+
+            d = {}
+            for label, s in zip(QUANTILE_LABELS, self.merge_sketches(values)):
+                d.update(quantile_summary(s, label, percentiles))
+
+            yield key, d
+            return
+
+        summary = Summary.merge_all(COLUMNS, values)
+
+        maxPop, maxArea = summary.max
+        maxPopName, maxAreaName = summary.argmax
+        minPop, minArea = summary.min
+        minPopName, minAreaName = summary.argmin
+
+        avgPop = round(summary.mean("pop"), 2)
+        avgArea = round(summary.mean("area"), 2)
+
         vals = [str(n) + " (" + s + ")" for n,s in zip([maxPop, minPop, maxArea, minArea], [maxPopName, minPopName, maxAreaName, minAreaName])]
         vals.insert(2, avgPop)
         vals.append(avgArea)
-        
+
         labels = "Largest Pop,Smallest Pop,Average Pop,Largest Area,Smallest Area,Average Area".split(",")
         d = dict(zip(labels, vals))
-        
+
         yield key, d
 
 
 if __name__ == '__main__':
-    MRSummarize.run()
\ No newline at end of file
+    MRSummarize.run()
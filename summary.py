@@ -0,0 +1,108 @@
+import numpy as np
+
+'''
+Mergeable summary record for a set of named numeric columns.
+
+For every column keeps the sum, the smallest and largest values, and
+the label of the observation each extreme came from (argmin / argmax).
+The count of observations is shared by all columns. Partial summaries
+built by different mappers / combiners merge exactly, so a reducer only
+has to look at one small record per map task instead of every row.
+
+Summaries travel between MapReduce steps as plain lists, see to_list()
+and from_list().
+'''
+class Summary(object):
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+        k = len(self.columns)
+
+        self.n = 0
+        self.total = [0] * k
+
+        self.min = [np.inf] * k
+        self.argmin = [""] * k
+        self.max = [-np.inf] * k
+        self.argmax = [""] * k
+
+    # Add a single observation, values in the same order as the columns
+    def add(self, label, values):
+        self.n += 1
+
+        for i, x in enumerate(values):
+            self.total[i] += x
+
+            if x < self.min[i]:
+                self.min[i] = x
+                self.argmin[i] = label
+            if x > self.max[i]:
+                self.max[i] = x
+                self.argmax[i] = label
+
+    '''
+    Add a block of observations: a list of labels and one array per
+    column. The block's sums and extremes are found with vectorized
+    operations; ties go to the first row, as with add().
+    '''
+    def add_block(self, labels, columns):
+        if len(labels) == 0:
+            return
+
+        self.n += len(labels)
+
+        for i, x in enumerate(columns):
+            self.total[i] += x.sum().item()
+
+            lo = int(np.argmin(x))
+            hi = int(np.argmax(x))
+
+            if x[lo] < self.min[i]:
+                self.min[i] = x[lo].item()
+                self.argmin[i] = labels[lo]
+            if x[hi] > self.max[i]:
+                self.max[i] = x[hi].item()
+                self.argmax[i] = labels[hi]
+
+    # Fold another summary of the same columns into this one
+    def merge(self, other):
+        self.n += other.n
+
+        for i in range(len(self.columns)):
+            self.total[i] += other.total[i]
+
+            if other.min[i] < self.min[i]:
+                self.min[i] = other.min[i]
+                self.argmin[i] = other.argmin[i]
+            if other.max[i] > self.max[i]:
+                self.max[i] = other.max[i]
+                self.argmax[i] = other.argmax[i]
+
+        return self
+
+    def mean(self, column):
+        i = self.columns.index(column)
+        return float(self.total[i]) / self.n
+
+    def to_list(self):
+        return [self.n, self.total, self.min, self.argmin,
+                self.max, self.argmax]
+
+    @classmethod
+    def from_list(cls, columns, values):
+        s = cls(columns)
+
+        s.n, s.total, s.min, s.argmin, s.max, s.argmax = values
+
+        return s
+
+    # Merge an iterable of serialized summaries into one summary
+    @classmethod
+    def merge_all(cls, columns, values):
+        total = cls(columns)
+
+        for v in values:
+            total.merge(cls.from_list(columns, v))
+
+        return total
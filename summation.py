@@ -0,0 +1,125 @@
+import math
+from fractions import Fraction
+
+'''
+Exact, mergeable summation of floats.
+
+A running float sum (total += x) rounds at every addition, so a sum of
+many values drifts, and loses everything to cancellation when it is
+later subtracted from a sum of about the same size (the sum of X^2
+minus the squared sum of X, in a one pass variance). The rounding also
+depends on the order of the additions, and the order values reach a
+reducer changes from run to run.
+
+An ExactSum instead keeps the sum exactly, as a short list of floats
+of non-overlapping magnitude whose (real) sum is the exact sum of
+every value added (Shewchuk's algorithm, the one math.fsum uses).
+Partial sums built by different mappers / combiners merge exactly by
+adding one's floats to the other, so the total, and any statistic read
+off it, is the same whatever the order or grouping of the values, and
+correctly rounded at the end. The list stays short: its floats cover
+disjoint ranges of binary exponents, so for values of similar
+magnitude it is one or two floats long.
+
+Products can be added exactly too (add_product()), as the rounded
+product and its rounding error, so a sum of squares is exact as well.
+A mapper emits a product as a sum of its own (product()), so its
+rounding error reaches the reducers.
+
+Sums travel between MapReduce steps as a float (if one is enough) or
+a list of floats, see value() and add_value(), so a value emitted by a
+mapper is itself a sum. Values must be finite.
+'''
+
+# 2^27 + 1, splits a double into two halves of 26 bits (Veltkamp)
+SPLITTER = 134217729.0
+
+
+def split(a):
+    c = SPLITTER * a
+    hi = c - (c - a)
+    return hi, a - hi
+
+'''
+The product a * b as the rounded product and its rounding error, whose
+sum is exactly a * b (Dekker).
+'''
+def two_product(a, b):
+    p = a * b
+    ah, al = split(a)
+    bh, bl = split(b)
+    e = ((ah * bh - p) + ah * bl + al * bh) + al * bl
+    return p, e
+
+
+class ExactSum(object):
+
+    def __init__(self):
+        self.partials = []
+
+    # Add a single float
+    def add(self, x):
+        partials = self.partials
+        i = 0
+
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                partials[i] = lo
+                i += 1
+            x = hi
+
+        partials[i:] = [x]
+
+    # Add a * b exactly
+    def add_product(self, a, b):
+        p, e = two_product(a, b)
+        self.add(p)
+        if e:
+            self.add(e)
+
+    # Add a sum as emitted by value(): a float, or a list of floats
+    def add_value(self, v):
+        if isinstance(v, list):
+            for x in v:
+                self.add(x)
+        else:
+            self.add(float(v))
+
+    def merge(self, other):
+        for x in other.partials:
+            self.add(x)
+
+        return self
+
+    # The sum, correctly rounded
+    def total(self):
+        return math.fsum(self.partials)
+
+    # The exact sum, as a fraction
+    def fraction(self):
+        return sum((Fraction(x) for x in self.partials), Fraction(0))
+
+    # The sum for output to the next step: one float, or the list
+    def value(self):
+        if len(self.partials) <= 1:
+            return self.partials[0] if self.partials else 0.0
+        return list(self.partials)
+
+    @classmethod
+    def from_value(cls, v):
+        s = cls()
+        s.add_value(v)
+        return s
+
+# The exact product a * b as a sum for value(), for a mapper to emit
+def product(a, b):
+    p, e = two_product(a, b)
+    return [e, p] if e else p
+
+# The correctly rounded float of a sum emitted by value()
+def total(v):
+    return ExactSum.from_value(v).total()
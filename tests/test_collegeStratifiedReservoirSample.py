@@ -0,0 +1,25 @@
+import os
+
+from conftest import ROOT
+from collegeStratifiedReservoirSample import (
+    MRCollegeStratifiedReservoirSample, stratum_order)
+
+COLLEGES = os.path.join(ROOT, "Example Data", "colleges_no_header.csv")
+
+
+def test_blank_strata_sort_last():
+    strata = [(1, None), (None, 3), (1, 2), (None, None)]
+
+    assert sorted(strata, key=stratum_order) == [
+        (1, 2), (1, None), (None, 3), (None, None)]
+
+
+def test_nullable_strata_column():
+    # ACT is blank for many colleges
+    job = MRCollegeStratifiedReservoirSample(args=[
+        '-r', 'inline', '--strata', 'ACT', '--sample-size', '10', COLLEGES])
+    with job.make_runner() as runner:
+        runner.run()
+        names = [name for _, name in job.parse_output(runner.cat_output())]
+
+    assert len(names) == 10
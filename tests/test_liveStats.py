@@ -0,0 +1,27 @@
+from liveStats import StateStats
+
+REGRESSION = "Population ~ Area"
+
+
+def add_states(stats, rows):
+    for abr, area, pop in rows:
+        stats.add_line("%s,%s,%s,%d,%d\n" % (abr, abr, abr, area, pop))
+
+
+def test_constant_population_has_no_regression():
+    stats = StateStats(10, 0)
+    add_states(stats, [("AA", 100, 5000), ("BB", 200, 5000),
+                       ("CC", 300, 5000), ("DD", 400, 5000)])
+
+    report = stats.report()
+
+    assert report["Rows"] == 4
+    assert REGRESSION not in report
+
+
+def test_regression_once_defined():
+    stats = StateStats(10, 0)
+    add_states(stats, [("AA", 100, 5000), ("BB", 200, 7000),
+                       ("CC", 300, 8000)])
+
+    assert REGRESSION in stats.report()
@@ -0,0 +1,54 @@
+import math
+import os
+
+import pytest
+
+from conftest import ROOT
+from parallelRunner import ParallelRunner, load_job_class
+
+DATA = os.path.join(ROOT, "Example Data")
+ELECTRICITY = os.path.join(DATA, "Electricity.csv")
+STATES = os.path.join(DATA, "states_clean.csv")
+COLLEGES = os.path.join(DATA, "colleges_no_header.csv")
+
+CORES = 3
+
+
+def output(job_class, runner, args):
+    job = job_class(args=args)
+    with runner as r:
+        r.run()
+        return sorted(job.parse_output(r.cat_output()), key=repr)
+
+def inline_output(job_class, args):
+    args = ['-r', 'inline', '--num-cores', str(CORES)] + args
+    return output(job_class, job_class(args=args).make_runner(), args)
+
+def parallel_output(job_class, args):
+    return output(job_class, ParallelRunner(job_class, args, CORES), args)
+
+# Equal records, floats up to rounding
+def close(a, b):
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-12)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(close(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(close(a[k], b[k]) for k in a)
+    return a == b
+
+
+@pytest.mark.parametrize("script, args", [
+    ("summarizeStates.py", [STATES]),
+    ("groupStats.py", [COLLEGES]),
+    # two steps: the join, then merging the partials
+    ("elecRegr_OnePass.py", [ELECTRICITY, STATES]),
+    ("elecRegr_OnePass.py", ["--states", STATES, ELECTRICITY]),
+])
+def test_same_records_as_inline(script, args):
+    job_class = load_job_class(os.path.join(ROOT, script))
+
+    inline = inline_output(job_class, args)
+    parallel = parallel_output(job_class, args)
+
+    assert close(inline, parallel)
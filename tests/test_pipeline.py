@@ -0,0 +1,13 @@
+import pipeline
+
+from conftest import ROOT
+
+
+def test_q4_prints_conclusion(monkeypatch, capsys):
+    monkeypatch.chdir(ROOT)
+
+    assert pipeline.main(["q4", "-r", "inline", "--no-cache"]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[-1].endswith(
+        "is a better fit to the electricity price data.")
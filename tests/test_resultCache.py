@@ -0,0 +1,50 @@
+import os
+import shutil
+
+import resultCache
+from conftest import ROOT
+from resultCache import ResultCache, cached_output, job_key
+from summarizeStates import MRSummarize
+
+STATES = os.path.join(ROOT, "Example Data", "states_clean.csv")
+
+
+def run_inline(cache, args):
+    return cached_output(cache, MRSummarize, ['-r', 'inline'] + args,
+                         lambda job, args: job.make_runner())
+
+
+def test_directory_input_is_not_cached(tmp_path, capsys):
+    data = tmp_path / "data"
+    data.mkdir()
+    shutil.copy(STATES, str(data))
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    lines, hit = run_inline(cache, [str(data)])
+
+    assert lines and not hit
+    assert cache.entries() == []
+    assert "Not caching" in capsys.readouterr().err
+
+def test_file_input_is_cached(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    lines, hit = run_inline(cache, [STATES])
+    assert not hit
+
+    assert run_inline(cache, [STATES]) == (lines, True)
+
+
+def test_only_parallel_key_has_processes(monkeypatch):
+    def keys(runner):
+        result = []
+        for cpus in (2, 8):
+            monkeypatch.setattr(resultCache.os, 'cpu_count', lambda: cpus)
+            result.append(job_key(MRSummarize, [STATES], runner)[0])
+        return result
+
+    inline = keys('inline')
+    assert inline[0] == inline[1]
+
+    parallel = keys('parallel')
+    assert parallel[0] != parallel[1]
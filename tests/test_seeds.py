@@ -0,0 +1,40 @@
+import os
+
+import seeds
+
+
+def map_task(monkeypatch, uri, start=0):
+    monkeypatch.setenv("mapreduce_task_ismap", "true")
+    monkeypatch.setenv("mapreduce_map_input_file", uri)
+    monkeypatch.setenv("mapreduce_map_input_start", str(start))
+
+
+def test_same_named_files_in_different_directories(monkeypatch, tmp_path):
+    paths = []
+    for d in ("2024-01-01", "2024-01-02"):
+        os.makedirs(str(tmp_path / d))
+        path = tmp_path / d / "part-00000"
+        path.write_text("a,1\n")
+        paths.append("file://" + str(path))
+
+    found = []
+    for uri in paths:
+        map_task(monkeypatch, uri)
+        found.append(seeds.task_seed(0))
+
+    assert found[0] != found[1]
+
+
+def test_same_split_same_seed(monkeypatch, tmp_path):
+    path = str(tmp_path / "c.csv")
+
+    map_task(monkeypatch, "file://" + path, 100)
+    first = seeds.task_seed(7)
+
+    # the same file, named by a relative path from its directory
+    monkeypatch.chdir(str(tmp_path))
+    map_task(monkeypatch, "c.csv", 100)
+    assert seeds.task_seed(7) == first
+
+    map_task(monkeypatch, "c.csv", 200)
+    assert seeds.task_seed(7) != first